@@ -11,7 +11,7 @@ echo.
 echo Iniciando aplicacion...
 echo.
 echo La aplicacion se abrira en tu navegador
-echo en unos segundos...
+echo apenas este lista...
 echo.
 echo Si no se abre automaticamente, accede a:
 echo http://localhost:8501
@@ -23,8 +23,11 @@ echo.
 
 cd /d "%~dp0"
 
-REM Abrir el navegador despues de 5 segundos
-start /min cmd /c "timeout /t 5 /nobreak && start http://localhost:8501"
+REM Abrir el navegador apenas el servidor responda (consulta /_stcore/health)
+start "" /b python\python.exe abrir_navegador.py http://localhost:8501
+
+REM Convertir bases viejas a auto_vacuum incremental antes de atender (VACUUM bloquea la base)
+python\python.exe -m licencias.mantenimiento --auto-vacuum --escuelas
 
 REM Ejecutar streamlit
 python\python.exe -m streamlit run app.py --server.headless=true --server.port=8501 --browser.gatherUsageStats=false
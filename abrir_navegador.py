@@ -0,0 +1,34 @@
+"""Abre el navegador apenas Streamlit está listo, en lugar de esperar un tiempo fijo.
+
+Consulta el endpoint de salud de Streamlit (/_stcore/health) hasta que responde "ok".
+Usa solo la biblioteca estándar para arrancar rápido con el Python embebido.
+
+Uso:
+    python abrir_navegador.py [url] [segundos_maximos]
+"""
+import sys
+import time
+import urllib.request
+import webbrowser
+
+
+def esperar_servidor(url: str, segundos_maximos: float = 60.0, intervalo: float = 0.25) -> bool:
+    """Devuelve True cuando el servidor responde, o False si se agotó el tiempo."""
+    limite = time.monotonic() + segundos_maximos
+    while time.monotonic() < limite:
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(intervalo)
+    return False
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8501"
+    segundos = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+    # Si se agota el tiempo se abre igual: la página muestra el error de conexión
+    esperar_servidor(url, segundos)
+    webbrowser.open(url)
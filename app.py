@@ -1,318 +1,326 @@
 import datetime as dt
-import os
-import sys
-from pathlib import Path
-from dateutil.relativedelta import relativedelta
-from typing import Optional, List
+import inspect
+import io
+from typing import TYPE_CHECKING, List, Optional
 
 import pandas as pd
 import streamlit as st
-from sqlmodel import SQLModel, Field, create_engine, Session, select
-from sqlalchemy import text
 
+from licencias.busqueda_en_vivo import BusquedaEnVivo, estadisticas_busqueda
+from licencias.db import (
+    BusquedaCancelada,
+    ESTADOS,
+    ESTADOS_DOCUMENTACION,
+    MSG_CONFLICTO,
+    ROLES,
+    actualizar_licencia,
+    buscar_licencias,
+    crear_licencia,
+    eliminar_licencia,
+    estadisticas_consultas,
+    get_engine,
+    init_db,
+    levantando_errores,
+    licencias_del_mes,
+    licencias_pendientes_gei,
+    marcar_cargada,
+    obtener_licencia,
+    pendientes_gei,
+    rango_mes,
+    seleccionar_engine,
+    version_datos,
+)
+from licencias.calidad import REGLAS_POR_CODIGO, revisar_calidad, validar
+from licencias.dias import dias_acumulados, licencias_de_persona
+from licencias.escuelas import crear_escuela, engines, listar_escuelas, resumen_distrito
+from licencias.historial import (
+    compactar_historial,
+    describir_cambios,
+    obtener_historial,
+    reconstruir_licencia,
+    reconstruir_tabla,
+    restaurar_licencia,
+)
+from licencias.mantenimiento import (
+    RETENCION_ANIOS,
+    RETENCION_SUGERIDA,
+    activar_auto_vacuum,
+    contar_purgables,
+    estado_base,
+    fecha_corte,
+    mantenimiento,
+)
+from licencias.metricas import ARCHIVO_METRICAS, PUERTO_METRICAS, medir, publicar
+from licencias.personas import IndicePersonas, armar_indice
+# to_df se usa en cada ejecución (Listado); el resto de los reportes y exportaciones se importa donde se usa
+from licencias.reportes import to_df
+from licencias.sincronizacion import aplicar_en_escuela, exportar_cambios
+from licencias.solapamientos import alertas_de, listar_alertas, revisar_todo
 
-# ---------- Config ----------
-def get_app_path():
-    """Obtiene el directorio de la aplicación"""
-    if getattr(sys, 'frozen', False):
-        return Path(sys.executable).parent
-    else:
-        return Path(__file__).parent
+if TYPE_CHECKING:
+    from licencias.cierres import Cierre
 
 
-def get_data_path():
-    """Obtiene el directorio de datos en AppData para evitar problemas de permisos"""
-    if sys.platform == "win32":
-        data_dir = Path(os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))) / "LicenciasEscolares"
-    else:
-        data_dir = Path.home() / ".licencias_escolares"
+@st.cache_data
+def get_roles() -> List[str]:
+    return list(ROLES)
 
-    data_dir.mkdir(parents=True, exist_ok=True)
-    return data_dir
 
+@st.cache_data
+def get_estados() -> List[str]:
+    return list(ESTADOS)
 
-DB_PATH = get_data_path() / "licencias.db"
-DB_URL = f"sqlite:///{DB_PATH}"
-engine = create_engine(DB_URL, echo=False)
 
+@st.cache_data
+def get_estados_documentacion() -> List[str]:
+    return list(ESTADOS_DOCUMENTACION)
 
-# ---------- Modelo ----------
-class Licencia(SQLModel, table=True):
-    __table_args__ = {'extend_existing': True}
 
-    id: Optional[int] = Field(default=None, primary_key=True)
-    apellido: str
-    nombre: str
-    dni: str
-    dni_familiar: Optional[str] = None
-    rol: str
-    fecha_inicio: dt.date
-    fecha_fin: Optional[dt.date] = None
-    articulo: Optional[str] = None
-    codigo_osep: Optional[str] = None
-    estado_carga: str = "Pendiente"
-    fecha_carga_gei: Optional[dt.date] = None
-    documentacion: str = "Pendiente"
-    observaciones: Optional[str] = None
-    fecha_creacion: dt.datetime = Field(default_factory=dt.datetime.now)
+@st.cache_data(ttl=dt.timedelta(days=1), show_spinner=False)
+def compactar_historial_diario(db_url: str) -> int:
+    """Compacta el historial como mucho una vez por día por base y proceso del servidor."""
+    return compactar_historial()
 
 
-def ensure_columns():
-    """Asegura que existan las columnas dni y dni_familiar si la DB es vieja."""
-    try:
-        with engine.connect() as conn:
-            # nombre de tabla por defecto en SQLModel = nombre de clase en minúscula
-            cols = {row[1] for row in conn.execute(text("PRAGMA table_info('licencia')"))}
-            if "dni" not in cols:
-                conn.execute(text("ALTER TABLE licencia ADD COLUMN dni TEXT"))
-            if "dni_familiar" not in cols:
-                conn.execute(text("ALTER TABLE licencia ADD COLUMN dni_familiar TEXT"))
-    except Exception as e:
-        st.error(f"Error asegurando columnas: {e}")
+@st.cache_data(ttl=dt.timedelta(days=1), show_spinner=False)
+def revisar_superposiciones_diario(db_url: str) -> dict:
+    """Recalcula todas las alertas una vez por día (cubre cargas masivas que no pasan por la app)."""
+    return revisar_todo()
 
 
-def init_db():
-    try:
-        SQLModel.metadata.create_all(engine)
-        ensure_columns()
-        return True
-    except Exception as e:
-        st.error(f"Error al inicializar la base de datos: {e}")
-        return False
+@st.cache_data(ttl=dt.timedelta(days=1), show_spinner=False)
+def limpiar_trabajos_diario(db_url: str) -> int:
+    """Borra las exportaciones viejas como mucho una vez por día por base y proceso del servidor."""
+    from licencias.trabajos import limpiar_trabajos
+    return limpiar_trabajos()
 
 
-@st.cache_data
-def get_roles() -> List[str]:
-    return ["Docente", "Celador"]
+@st.cache_data(ttl=dt.timedelta(days=1), show_spinner=False)
+def mantenimiento_diario(db_url: str) -> dict:
+    """Purga (si hay retención configurada), libera espacio y actualiza estadísticas una vez por día."""
+    return mantenimiento(medir=False)
 
 
-@st.cache_data
-def get_estados() -> List[str]:
-    return ["Pendiente", "Cargada"]
+# Tareas de mantenimiento que corren como mucho una vez por día por base: (qué hace, función)
+TAREAS_DIARIAS = (
+    ("compactar el historial", compactar_historial_diario),
+    ("borrar las exportaciones viejas", limpiar_trabajos_diario),
+    ("revisar las superposiciones", revisar_superposiciones_diario),
+    ("hacer el mantenimiento de la base", mantenimiento_diario),
+)
 
 
-@st.cache_data
-def get_estados_documentacion() -> List[str]:
-    return ["Pendiente", "Subida"]
-
-
-def to_df(rows: List[Licencia]) -> pd.DataFrame:
-    if not rows:
-        return pd.DataFrame()
-
-    data = [r.model_dump() for r in rows]
-    df = pd.DataFrame(data)
-
-    if 'fecha_inicio' in df.columns:
-        df['fecha_inicio'] = pd.to_datetime(df['fecha_inicio']).dt.strftime('%d/%m/%Y')
-    if 'fecha_fin' in df.columns:
-        df['fecha_fin'] = df['fecha_fin'].apply(
-            lambda x: pd.to_datetime(x).strftime('%d/%m/%Y') if pd.notna(x) else '(Sin definir)'
-        )
-    if 'fecha_carga_gei' in df.columns:
-        df['fecha_carga_gei'] = df['fecha_carga_gei'].apply(
-            lambda x: pd.to_datetime(x).strftime('%d/%m/%Y') if pd.notna(x) else ''
-        )
-    if 'articulo' in df.columns:
-        df['articulo'] = df['articulo'].fillna('(Pendiente)')
-    if 'documentacion' in df.columns:
-        df['documentacion'] = df['documentacion'].fillna('Pendiente')
-
-    columnas_orden = [
-        "id", "apellido", "nombre", "dni", "dni_familiar", "rol", "fecha_inicio", "fecha_fin",
-        "articulo", "codigo_osep", "estado_carga", "fecha_carga_gei", "documentacion", "observaciones"
-    ]
-    columnas_disponibles = [col for col in columnas_orden if col in df.columns]
-    df = df[columnas_disponibles]
-
-    return df
-
-
-def df_to_html_table(df: pd.DataFrame) -> str:
-    """Genera tabla HTML para impresión con estilos inline y colores"""
-    if df.empty:
-        return "<p>No hay datos</p>"
-    
-    columnas_legibles = {
-        'id': 'ID',
-        'apellido': 'Apellido',
-        'nombre': 'Nombre',
-        'dni': 'DNI',
-        'dni_familiar': 'DNI familiar',
-        'rol': 'Rol',
-        'fecha_inicio': 'Inicio',
-        'fecha_fin': 'Fin',
-        'articulo': 'Artículo',
-        'codigo_osep': 'Código',
-        'estado_carga': 'Estado',
-        'fecha_carga_gei': 'Carga GEI',
-        'documentacion': 'Documentación',
-        'observaciones': 'Observaciones'
-    }
-    
-    html = '<table class="print-table" style="width:100%; border-collapse:collapse; font-size:9pt;">'
-    html += '<thead><tr style="background-color:#f0f0f0;">'
-    
-    for col in df.columns:
-        col_name = columnas_legibles.get(col, col)
-        html += f'<th style="border:1px solid #ddd; padding:4px 6px; text-align:left; font-weight:bold;">{col_name}</th>'
-    
-    html += '</tr></thead><tbody>'
-    
-    for _, row in df.iterrows():
-        es_cargada = (
-            row.get('estado_carga') == 'Cargada' and
-            row.get('fecha_carga_gei') not in [None, '']
-        )
-        
-        if es_cargada:
-            row_style = 'background-color:#d4edda; color:#000000;'
+def tareas_diarias():
+    """Corre las tareas diarias sin que una falla (p. ej. la base bloqueada por otra escritura) rompa la página.
+
+    Una tarea que falla solo muestra un aviso; como st.cache_data no guarda las
+    excepciones, se vuelve a intentar en la próxima ejecución.
+    """
+    db_url = str(get_engine().url)
+    for descripcion, tarea in TAREAS_DIARIAS:
+        try:
+            # Que los errores que la tarea mostraría con st.error lleguen acá
+            with levantando_errores():
+                tarea(db_url)
+        except Exception as e:
+            st.warning(f"⚠️ No se pudo {descripcion}: {e}. Se vuelve a intentar en la próxima carga.")
+
+
+@st.cache_resource(show_spinner=False)
+def publicacion_metricas():
+    """Servidor local y/o archivo de métricas (ver licencias.metricas), una sola vez por proceso."""
+    return publicar()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def pendientes_gei_cacheados(db_url: str, version: int, hoy: dt.date):
+    """Plazos GEI vencidos o por vencer; se recalculan solo si cambian los datos o el día."""
+    return pendientes_gei(hoy), licencias_pendientes_gei(hoy)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def ausencias_cacheadas(db_url: str, version: int, desde: dt.date, hasta: dt.date, hoy: dt.date) -> pd.DataFrame:
+    """Ausencias por día y rol; se recalculan solo si cambian los datos, el rango o el día."""
+    from licencias.ocupacion import ausencias_por_dia
+    return ausencias_por_dia(desde, hasta, hoy)
+
+
+@st.cache_resource(show_spinner=False, max_entries=12)
+def cierre_cacheado(db_url: str, mes: dt.date, huella: str) -> "Cierre":
+    """El cierre del mes; la huella en la clave invalida si se reabre y se vuelve a cerrar."""
+    from licencias.cierres import leer_cierre
+    return leer_cierre(mes)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def indice_personas(db_url: str, version: int) -> IndicePersonas:
+    """Índice de personas para autocompletar, compartido por las sesiones; se rearma si cambian los datos."""
+    return armar_indice()
+
+
+def completar_alta():
+    """Copia la persona elegida en las sugerencias a los campos del formulario de alta."""
+    persona = st.session_state.get("alta_sugerencia")
+    if persona is None:
+        return
+    st.session_state.alta_apellido = persona.apellido
+    st.session_state.alta_nombre = persona.nombre
+    st.session_state.alta_dni = persona.dni
+    if persona.rol in ROLES:
+        st.session_state.alta_rol = persona.rol
+    st.session_state.alta_buscar_persona = ""
+
+
+# Claves de sesión que dependen de la escuela elegida
+CLAVES_POR_ESCUELA = (
+    'licencia_cache', 'licencia_cargada_id', 'version_edicion', 'conflicto_edicion',
+    'confirmar_eliminar', 'excel_listado', 'excel_reporte', 'tabla_historial', 'archivo_cambios', 'calidad',
+    'confirmar_reabrir', 'informe_mantenimiento', 'confirmar_purga', 'confirmar_auto_vacuum',
+)
+
+
+def elegir_escuela() -> Optional[str]:
+    """Selector de escuela en la barra lateral. Sin escuelas creadas se usa la base única de siempre."""
+    with st.sidebar:
+        st.header("🏫 Escuela")
+        escuelas = listar_escuelas()
+        escuela = None
+        if escuelas:
+            pedida = st.query_params.get("escuela")
+            escuela = st.selectbox("Escuela", escuelas, index=escuelas.index(pedida) if pedida in escuelas else 0)
+            st.query_params["escuela"] = escuela
         else:
-            row_style = 'background-color:white;'
-        
-        html += f'<tr style="{row_style}">'
-        for col in df.columns:
-            val = row[col] if pd.notna(row[col]) else ''
-            html += f'<td style="border:1px solid #ddd; padding:4px 6px;">{val}</td>'
-        html += '</tr>'
-    
-    html += '</tbody></table>'
-    return html
+            st.caption("Base única. Creá una escuela para atender varias desde este servidor.")
 
+        with st.expander("➕ Nueva escuela"):
+            codigo = st.text_input("Código", help="Minúsculas, números, '-' y '_'", key="codigo_escuela_nueva")
+            if st.button("Crear escuela", use_container_width=True):
+                success, msg = crear_escuela(codigo.strip().lower())
+                if success:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+    return escuela
+
+
+def sincronizacion_distrito(escuela: Optional[str]):
+    """Barra lateral: en la escuela, archivo con los cambios desde el último envío; en el distrito, aplicarlo."""
+    with st.sidebar, st.expander("🔄 Sincronizar con el distrito"):
+        st.caption("**Escuela:** generá el archivo con las altas, modificaciones y bajas desde el último envío "
+                   "y mandalo al distrito.")
+        origen = st.text_input("Código de esta escuela en el distrito", value=escuela or "", key="sinc_origen")
+        completo = st.checkbox("Incluir todas las licencias", key="sinc_completo",
+                               help="Para el primer envío, o si un archivo anterior no llegó")
+        if st.button("⚙️ Generar archivo de cambios", use_container_width=True):
+            salida = io.BytesIO()
+            try:
+                resumen = exportar_cambios(salida, origen.strip().lower(), completo)
+                st.session_state.archivo_cambios = (origen.strip().lower(), salida.getvalue(), resumen)
+            except Exception as e:
+                st.error(f"Error al generar el archivo: {e}")
 
-def crear_licencia(**kwargs):
-    try:
-        with Session(engine) as s:
-            lic = Licencia(**kwargs)
-            s.add(lic)
-            s.commit()
-            s.refresh(lic)
-            return lic, None
-    except Exception as e:
-        return None, str(e)
+        if st.session_state.get('archivo_cambios'):
+            codigo, contenido, resumen = st.session_state.archivo_cambios
+            st.caption(f"{resumen['licencias']} licencias y {resumen['bajas']} bajas")
+            st.download_button(
+                "📥 Descargar cambios",
+                contenido,
+                file_name=f"cambios_{codigo}_{dt.datetime.now():%Y%m%d_%H%M}.jsonl.gz",
+                mime="application/gzip",
+                use_container_width=True,
+            )
 
+        st.caption("**Distrito:** aplicá el archivo que mandó una escuela sobre su base en este servidor. "
+                   "Aplicar dos veces el mismo archivo no cambia nada.")
+        archivo = st.file_uploader("Archivo de cambios", type=["gz"], key="sinc_archivo")
+        if archivo is not None and st.button("📤 Aplicar cambios", use_container_width=True):
+            try:
+                resumen = aplicar_en_escuela(archivo)
+                st.success(f"Escuela '{resumen['origen']}': {resumen['altas']} altas, "
+                           f"{resumen['modificaciones']} modificaciones, {resumen['bajas']} bajas, "
+                           f"{resumen['sin_cambios']} ya estaban al día")
+            except Exception as e:
+                st.error(f"Error al aplicar el archivo: {e}")
 
-def actualizar_licencia(id_: int, **kwargs):
-    try:
-        with Session(engine) as s:
-            lic = s.get(Licencia, id_)
-            if not lic:
-                return False, "Licencia no encontrada"
-
-            for key, value in kwargs.items():
-                if hasattr(lic, key):
-                    setattr(lic, key, value)
-
-            s.add(lic)
-            s.commit()
-            return True, "Licencia actualizada correctamente"
-    except Exception as e:
-        return False, str(e)
 
+def obtener_licencia_cacheada(id_: int):
+    """Devuelve la licencia guardada en la sesión mientras no cambien los datos (clave: id y versión)."""
+    clave = (id_, version_datos())
+    cache = st.session_state.get('licencia_cache')
+    if cache and cache[0] == clave:
+        return cache[1]
+    lic = obtener_licencia(id_)
+    st.session_state.licencia_cache = (clave, lic)
+    return lic
 
-def eliminar_licencia(id_: int):
-    try:
-        with Session(engine) as s:
-            lic = s.get(Licencia, id_)
-            if not lic:
-                return False, "Licencia no encontrada"
-            s.delete(lic)
-            s.commit()
-            return True, "Licencia eliminada correctamente"
-    except Exception as e:
-        return False, str(e)
-
-
-def buscar_licencias(
-        apellido: str = "",
-        nombre: str = "",
-        rol: Optional[str] = None,
-        estado: Optional[str] = None,
-        estado_doc: Optional[str] = None,
-        f_ini: Optional[dt.date] = None,
-        f_fin: Optional[dt.date] = None,
-        articulo: str = "",
-):
-    try:
-        with Session(engine) as s:
-            q = select(Licencia)
-            if apellido:
-                q = q.where(Licencia.apellido.ilike(f"%{apellido}%"))
-            if nombre:
-                q = q.where(Licencia.nombre.ilike(f"%{nombre}%"))
-            if rol and rol != "Todos":
-                q = q.where(Licencia.rol == rol)
-            if estado and estado != "Todos":
-                q = q.where(Licencia.estado_carga == estado)
-            if estado_doc and estado_doc != "Todos":
-                q = q.where(Licencia.documentacion == estado_doc)
-            if articulo:
-                q = q.where(Licencia.articulo.ilike(f"%{articulo}%"))
-            if f_ini:
-                q = q.where(Licencia.fecha_inicio >= f_ini)
-            if f_fin:
-                q = q.where(Licencia.fecha_fin <= f_fin)
-            q = q.order_by(Licencia.id.desc())
-            return s.exec(q).all()
-    except Exception as e:
-        st.error(f"Error al buscar licencias: {e}")
-        return []
 
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-def marcar_cargada(id_: int, fecha_carga: Optional[dt.date] = None):
-    """Marca una licencia como cargada con la fecha especificada"""
-    if fecha_carga is None:
-        fecha_carga = dt.date.today()
-    
-    try:
-        with Session(engine) as s:
-            lic = s.get(Licencia, id_)
-            if not lic:
-                return False, "No se encontró la licencia"
-            
-            if fecha_carga < lic.fecha_inicio:
-                return False, f"La fecha de carga GEI ({fecha_carga:%d/%m/%Y}) no puede ser anterior a la fecha de inicio de la licencia ({lic.fecha_inicio:%d/%m/%Y})"
-    except Exception as e:
-        return False, f"Error al validar: {e}"
-    
-    return actualizar_licencia(
-        id_,
-        estado_carga="Cargada",
-        fecha_carga_gei=fecha_carga
-    )
+# Pausa al escribir antes de enviar el texto (debounce en el navegador), si esta versión de Streamlit lo permite
+PAUSA_BUSQUEDA_EN_VIVO = "300ms"
+TEXTO_EN_VIVO = "live" in inspect.signature(st.text_input).parameters
+# Las versiones nuevas de st.download_button aceptan una función en `data` y la llaman recién al hacer clic
+DESCARGA_DIFERIDA = "passing a callable" in (st.download_button.__doc__ or "")
+
+
+def mostrar_alertas(id_: int):
+    """Avisa si la licencia se superpone con otra del mismo DNI o parece cargada dos veces."""
+    for alerta in alertas_de(id_):
+        otra = alerta.otra_id if alerta.licencia_id == id_ else alerta.licencia_id
+        if alerta.tipo == "duplicado":
+            st.warning(f"⚠️ Posible duplicado de la licencia #{otra} (mismo nombre y fechas)")
+        else:
+            st.warning(f"⚠️ Se superpone con la licencia #{otra} del mismo DNI ({alerta.dni})")
+
+
+def exportacion_en_segundo_plano(key: str, tipo: str, parametros: dict, etiqueta: str, file_name: str, mime: str,
+                                  texto_generar: str = "⚙️ Generar Excel"):
+    """Encola la exportación como trabajo en segundo plano, muestra su avance y al terminar ofrece la descarga.
+
+    El trabajo queda en la sesión asociado a su clave (tipo + parámetros + versión de
+    datos): si cambian los filtros o los datos, se vuelve a ofrecer el botón de generar.
+    """
+    from licencias.trabajos import archivo_resultado, clave_trabajo, enviar_trabajo, obtener_trabajo
+
+    clave = clave_trabajo(tipo, parametros)
+    guardado = st.session_state.get(key)
+    trabajo = obtener_trabajo(guardado[1]) if guardado and guardado[0] == clave else None
+
+    if trabajo is None:
+        if st.button(texto_generar, key=f"{key}_generar", use_container_width=True):
+            st.session_state[key] = (clave, enviar_trabajo(tipo, parametros).id)
+            st.rerun()
+    elif trabajo.estado == "Terminado" and (ruta := archivo_resultado(trabajo)) is not None:
+        # El archivo se lee solo cuando se descarga, no en cada ejecución de la página
+        if DESCARGA_DIFERIDA:
+            st.download_button(etiqueta, ruta.read_bytes, file_name=file_name, mime=mime, use_container_width=True)
+        elif st.button("📥 Preparar descarga", key=f"{key}_preparar", use_container_width=True):
+            st.download_button(etiqueta, ruta.read_bytes(), file_name=file_name, mime=mime,
+                               use_container_width=True)
+    elif trabajo.estado in ("Pendiente", "En curso"):
+        avance_trabajo(key, trabajo.id)
+    else:
+        st.error(f"Error al generar el archivo: {trabajo.error or 'el archivo ya no está disponible'}")
+        if st.button("🔁 Reintentar", key=f"{key}_reintentar", use_container_width=True):
+            st.session_state[key] = (clave, enviar_trabajo(tipo, parametros).id)
+            st.rerun()
 
 
-def marcar_documentacion_subida(id_: int):
-    """Marca la documentación como subida"""
-    return actualizar_licencia(id_, documentacion="Subida")
+def avance_trabajo(key: str, trabajo_id: int):
+    """Barra de progreso de un trabajo; cuando termina, vuelve a dibujar la página para ofrecer la descarga."""
+    from licencias.trabajos import obtener_trabajo
+    trabajo = obtener_trabajo(trabajo_id)
+    if trabajo is None or trabajo.estado not in ("Pendiente", "En curso"):
+        st.rerun()
+    st.progress(trabajo.progreso / 100, text=f"⏳ Generando… {trabajo.progreso}%")
+    if not hasattr(st, "fragment"):
+        st.button("🔄 Actualizar", key=f"{key}_actualizar", use_container_width=True)
 
 
-def obtener_licencia(id_: int):
-    try:
-        with Session(engine) as s:
-            lic = s.get(Licencia, id_)
-            if lic:
-                return Licencia(
-                    id=lic.id,
-                    apellido=lic.apellido,
-                    nombre=lic.nombre,
-                    dni=lic.dni,
-                    dni_familiar=lic.dni_familiar,
-                    rol=lic.rol,
-                    fecha_inicio=lic.fecha_inicio,
-                    fecha_fin=lic.fecha_fin,
-                    articulo=lic.articulo,
-                    codigo_osep=lic.codigo_osep,
-                    estado_carga=lic.estado_carga,
-                    fecha_carga_gei=lic.fecha_carga_gei,
-                    documentacion=lic.documentacion,
-                    observaciones=lic.observaciones,
-                    fecha_creacion=lic.fecha_creacion
-                )
-            return None
-    except Exception as e:
-        st.error(f"Error al obtener licencia: {e}")
-        return None
+# Con fragmentos (Streamlit >= 1.37) solo la barra se consulta cada segundo, sin rerun de toda la página
+if hasattr(st, "fragment"):
+    avance_trabajo = st.fragment(run_every=1)(avance_trabajo)
 
 
 # ---------- UI ----------
@@ -393,33 +401,168 @@ st.markdown("""
 
 st.title("🗂️ Licencias – Secretaría Escolar (Mendoza)")
 
+escuela_actual = elegir_escuela()
+seleccionar_engine(engines.obtener(escuela_actual) if escuela_actual else None)
+if st.session_state.get('escuela_actual', escuela_actual) != escuela_actual:
+    for clave in CLAVES_POR_ESCUELA:
+        st.session_state.pop(clave, None)
+st.session_state.escuela_actual = escuela_actual
+
 if not init_db():
     st.stop()
 
+sincronizacion_distrito(escuela_actual)
+
+tareas_diarias()
+publicacion_metricas()
+
 with st.expander("ℹ️ Información del sistema"):
-    st.info(f"**Base de datos:** `{DB_PATH}`")
+    if escuela_actual:
+        st.info(f"**Escuela:** `{escuela_actual}` — **Base de datos:** `{get_engine().url.database}`")
+    else:
+        st.info(f"**Base de datos:** `{get_engine().url.database}`")
     st.caption("Los datos se guardan automáticamente y persisten entre sesiones.")
 
-tab1, tab2, tab3, tab4 = st.tabs([
+with st.expander("⏱️ Rendimiento de consultas"):
+    cache = estadisticas_consultas()
+    r1, r2, r3 = st.columns(3)
+    r1.metric("Formas de búsqueda armadas", cache["formas_busqueda"],
+              help="Combinaciones de filtros distintas; cada una se arma una sola vez")
+    r2.metric("Búsquedas con forma reutilizada", cache["formas_aciertos"])
+    compiladas = cache["compilacion_aciertos"] + cache["compilacion_fallos"]
+    r3.metric("Compilaciones reutilizadas",
+              f"{cache['compilacion_aciertos'] / compiladas:.0%}" if compiladas else "-",
+              help="Consultas que SQLAlchemy ejecutó sin volver a compilar el SQL")
+    en_vivo = estadisticas_busqueda()
+    st.caption(f"Cache de compilación: {cache['compilacion_aciertos']} aciertos, "
+               f"{cache['compilacion_fallos']} compilaciones, {cache['compilacion_sin_cache']} sentencias sin cache "
+               f"(SQL de texto y mantenimiento). Búsquedas en vivo: {en_vivo['lanzadas']} lanzadas, "
+               f"{en_vivo['canceladas']} canceladas por una más nueva. "
+               "Valores del proceso del servidor desde que arrancó.")
+    if PUERTO_METRICAS or ARCHIVO_METRICAS:
+        destinos = ([f"http://127.0.0.1:{PUERTO_METRICAS}/metrics"] if PUERTO_METRICAS else []) \
+            + ([f"`{ARCHIVO_METRICAS}`"] if ARCHIVO_METRICAS else [])
+        st.caption(f"Métricas en formato Prometheus: {' y '.join(destinos)}")
+
+with st.expander("🧰 Mantenimiento de la base"):
+    estado = estado_base()
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Tamaño en disco", f"{(estado['archivo'] + estado['wal']) / 1e6:.1f} MB",
+              help="Archivo de la base más el WAL (cambios que todavía no pasaron al archivo)")
+    m2.metric("Espacio libre", f"{estado['libres'] * estado['tamanio_pagina'] / 1e6:.1f} MB",
+              help="Páginas vacías que el mantenimiento devuelve al disco")
+    m3.metric("Licencias", estado["licencias"])
+    if estado["auto_vacuum"] != 2:
+        st.warning("La base no tiene auto_vacuum incremental: el espacio libre solo se recupera con VACUUM. "
+                   "Se convierte sola al iniciar la app con INICIAR.bat, run.bat o run.sh, o desde acá.")
+        if st.button("🔧 Convertir ahora", key="convertir_auto_vacuum",
+                     help="Reescribe la base con VACUUM: mientras tanto las demás sesiones no pueden guardar"):
+            if not st.session_state.get('confirmar_auto_vacuum'):
+                st.session_state.confirmar_auto_vacuum = True
+                st.warning("⚠️ Hacé clic nuevamente para confirmar: la base queda bloqueada para los "
+                           "demás mientras se reescribe (unos segundos en una base grande)")
+            else:
+                st.session_state.pop('confirmar_auto_vacuum', None)
+                try:
+                    with st.spinner("Convirtiendo la base..."):
+                        activar_auto_vacuum()
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"No se pudo convertir la base: {e}")
+    st.caption("El mantenimiento corre solo una vez por día"
+               + (f", con retención de {RETENCION_ANIOS} años" if RETENCION_ANIOS else " (sin retención configurada)")
+               + ": libera el espacio libre y actualiza las estadísticas de los índices.")
+
+    purgar = st.checkbox("Purgar licencias viejas", key="mantenimiento_purgar")
+    anios = st.number_input("Terminadas hace más de (años)", min_value=1, max_value=50, step=1,
+                            value=RETENCION_ANIOS or RETENCION_SUGERIDA, key="mantenimiento_anios",
+                            disabled=not purgar)
+    if purgar:
+        purgables = contar_purgables(int(anios))
+        st.caption(f"{purgables} licencia(s) terminaron antes del {fecha_corte(int(anios)):%d/%m/%Y}. "
+                   "Se borran con su historial y no se pueden restaurar; la copia del distrito no cambia.")
+
+    if st.button("🧹 Hacer mantenimiento ahora", key="hacer_mantenimiento"):
+        if purgar and purgables and st.session_state.get('confirmar_purga') != int(anios):
+            st.session_state.confirmar_purga = int(anios)
+            st.warning(f"⚠️ Hacé clic nuevamente para confirmar: se borran {purgables} licencia(s)")
+        else:
+            st.session_state.pop('confirmar_purga', None)
+            with st.spinner("Haciendo mantenimiento..."):
+                st.session_state.informe_mantenimiento = mantenimiento(int(anios) if purgar else None)
+            st.rerun()
+
+    informe = st.session_state.get('informe_mantenimiento')
+    if informe:
+        antes, despues = informe["antes"], informe["despues"]
+        st.success(f"Mantenimiento del {informe['hecho']:%d/%m/%Y %H:%M}: {informe['purgadas']} licencia(s) "
+                   f"purgadas, {informe['paginas_liberadas']} página(s) devueltas al disco")
+        filas = [{"": "Tamaño en disco",
+                  "Antes": f"{(antes['archivo'] + antes['wal']) / 1e6:.1f} MB",
+                  "Después": f"{(despues['archivo'] + despues['wal']) / 1e6:.1f} MB"},
+                 {"": "Licencias", "Antes": str(antes["licencias"]), "Después": str(despues["licencias"])}]
+        filas += [{"": consulta, "Antes": f"{ms:.1f} ms", "Después": f"{despues['tiempos'][consulta]:.1f} ms"}
+                  for consulta, ms in antes["tiempos"].items()]
+        st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+
+meses_gei, licencias_gei = pendientes_gei_cacheados(str(get_engine().url), version_datos(), dt.date.today())
+if meses_gei:
+    vencidas = sum(m["pendientes"] for m in meses_gei if m["dias_restantes"] < 0)
+    por_vencer = sum(m["pendientes"] for m in meses_gei) - vencidas
+    with st.expander(f"⏰ Carga en GEI: {vencidas} licencia(s) con el plazo vencido y {por_vencer} por vencer"):
+        st.dataframe(pd.DataFrame([{
+            "Mes": f"{m['mes']:%m/%Y}",
+            "Plazo": f"{m['plazo']:%d/%m/%Y}",
+            "Pendientes": m["pendientes"],
+            "Estado": (f"Vencido hace {-m['dias_restantes']} día(s)" if m["dias_restantes"] < 0
+                       else f"Vence en {m['dias_restantes']} día(s)"),
+        } for m in meses_gei]), use_container_width=True, hide_index=True)
+        st.caption(f"Licencias pendientes (las {len(licencias_gei)} más antiguas). "
+                   "Se marcan como cargadas desde 🔎 Listado.")
+        st.dataframe(pd.DataFrame([{
+            "ID": lic.id, "Apellido": lic.apellido, "Nombre": lic.nombre, "DNI": lic.dni,
+            "Inicio": f"{lic.fecha_inicio:%d/%m/%Y}", "Artículo": lic.articulo or "(Pendiente)",
+        } for lic in licencias_gei]), use_container_width=True, hide_index=True)
+
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "➕ Nueva licencia",
     "🔎 Listado / Gestión",
     "✏️ Editar / Eliminar",
-    "📅 Reporte mensual"
+    "📅 Reporte mensual",
+    "📊 Ocupación"
 ])
 
 # --- Tab 1: Alta ---
-with tab1:
+with tab1, medir("licencias_pestania_segundos", pestania="alta"):
     st.subheader("Cargar nueva licencia")
 
+    ac1, ac2 = st.columns([1, 2])
+    with ac1:
+        texto_persona = st.text_input("🔎 Persona ya cargada", placeholder="Apellido o DNI", key="alta_buscar_persona",
+                                      help="Escribí al menos 2 letras o números para completar el formulario")
+    with ac2:
+        sugerencias = indice_personas(str(get_engine().url), version_datos()).buscar(texto_persona)
+        if sugerencias:
+            st.selectbox(
+                "Sugerencias",
+                options=[None] + sugerencias,
+                format_func=lambda p: "Elegí una persona…" if p is None else
+                f"{p.apellido}, {p.nombre} – DNI {p.dni} ({p.rol})",
+                key="alta_sugerencia",
+                on_change=completar_alta,
+            )
+        elif texto_persona.strip():
+            st.caption("Sin coincidencias")
+
     with st.form("form_nueva_licencia", clear_on_submit=True):
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            apellido = st.text_input("Apellido*", max_chars=80)
-            nombre = st.text_input("Nombre*", max_chars=80)
-            dni = st.text_input("DNI*", max_chars=15)
+            apellido = st.text_input("Apellido*", max_chars=80, key="alta_apellido")
+            nombre = st.text_input("Nombre*", max_chars=80, key="alta_nombre")
+            dni = st.text_input("DNI*", max_chars=15, key="alta_dni")
             dni_familiar = st.text_input("DNI familiar", max_chars=15, help="Solo si corresponde")
-            rol = st.selectbox("Rol*", options=get_roles())
+            rol = st.selectbox("Rol*", options=get_roles(), key="alta_rol")
 
         with col2:
             f_ini = st.date_input("Fecha inicio*", value=dt.date.today())
@@ -434,22 +577,8 @@ with tab1:
         submitted = st.form_submit_button("💾 Guardar licencia", type="primary", use_container_width=True)
 
         if submitted:
-            errores = []
-            if not apellido or not apellido.strip():
-                errores.append("El apellido es obligatorio")
-            if not nombre or not nombre.strip():
-                errores.append("El nombre es obligatorio")
-            # Validación DNI obligatorio y numérico
-            if not dni or not dni.strip():
-                errores.append("El DNI es obligatorio")
-            elif not dni.strip().isdigit():
-                errores.append("El DNI debe tener solo números")
-            # DNI familiar opcional pero numérico si se brinda
-            if dni_familiar and dni_familiar.strip() and not dni_familiar.strip().isdigit():
-                errores.append("El DNI familiar debe tener solo números")
-
-            if f_fin and f_fin < f_ini:
-                errores.append("La fecha de fin no puede ser anterior a la de inicio")
+            errores = validar(dict(apellido=apellido, nombre=nombre, dni=dni, dni_familiar=dni_familiar,
+                                   rol=rol, fecha_inicio=f_ini, fecha_fin=f_fin, documentacion=documentacion))
 
             if errores:
                 for error in errores:
@@ -471,32 +600,42 @@ with tab1:
                 if lic:
                     st.success(f"✅ Licencia #{lic.id} guardada correctamente")
                     st.balloons()
+                    mostrar_alertas(lic.id)
                 else:
                     st.error(f"❌ Error al guardar: {error}")
 
 # --- Tab 2: Listado / Gestión ---
-with tab2:
+with tab2, medir("licencias_pestania_segundos", pestania="listado"):
     st.subheader("Buscar y gestionar licencias")
 
-    with st.form("form_busqueda"):
+    en_vivo = st.toggle("⚡ Buscar mientras escribo", key="busqueda_en_vivo",
+                        help="Cada cambio en los filtros vuelve a buscar; una búsqueda vieja que todavía "
+                             "corre se cancela")
+    # Con la búsqueda en vivo los campos de texto se envían mientras se escribe, después de una pausa;
+    # en versiones de Streamlit sin `live`, al presionar Enter o salir del campo
+    texto_en_vivo = {"live": PAUSA_BUSQUEDA_EN_VIVO} if en_vivo and TEXTO_EN_VIVO else {}
+
+    with st.container() if en_vivo else st.form("form_busqueda"):
         fc1, fc2, fc3 = st.columns(3)
         with fc1:
-            f_ap = st.text_input("Apellido contiene")
-            f_nom = st.text_input("Nombre contiene")
+            f_ap = st.text_input("Apellido empieza con", help="Sin importar acentos ni mayúsculas", **texto_en_vivo)
+            f_nom = st.text_input("Nombre empieza con", **texto_en_vivo)
         with fc2:
             f_rol = st.selectbox("Rol", options=["Todos"] + get_roles())
             f_estado = st.selectbox("Estado", options=["Todos"] + get_estados())
         with fc3:
-            f_articulo = st.text_input("Artículo contiene")
+            f_articulo = st.text_input("Artículo empieza con", help="Ej: 40 o Art. 40", **texto_en_vivo)
+            f_dni = st.text_input("DNI empieza con", **texto_en_vivo)
+
+        fc4, fc5 = st.columns(2)
+        with fc4:
+            f_ini = st.date_input("Desde (inicio)", value=None, key="busq_ini")
+        with fc5:
+            f_fin = st.date_input("Hasta (fin)", value=None, key="busq_fin")
+        if not en_vivo:
             buscar = st.form_submit_button("🔍 Buscar", use_container_width=True)
 
-    fc4, fc5 = st.columns(2)
-    with fc4:
-        f_ini = st.date_input("Desde (inicio)", value=None, key="busq_ini")
-    with fc5:
-        f_fin = st.date_input("Hasta (fin)", value=None, key="busq_fin")
-
-    rows = buscar_licencias(
+    filtros_busqueda = dict(
         apellido=f_ap.strip(),
         nombre=f_nom.strip(),
         rol=f_rol,
@@ -505,7 +644,22 @@ with tab2:
         f_ini=f_ini if isinstance(f_ini, dt.date) else None,
         f_fin=f_fin if isinstance(f_fin, dt.date) else None,
         articulo=f_articulo.strip(),
+        dni=f_dni.strip(),
     )
+    if en_vivo:
+        # La consulta corre aparte; mientras tanto cada actualización del aviso le da a Streamlit la
+        # oportunidad de cortar esta ejecución si llegó un cambio nuevo, y entonces la consulta se cancela
+        aviso_busqueda = st.empty()
+        if 'busqueda_sesion' not in st.session_state:
+            st.session_state.busqueda_sesion = BusquedaEnVivo()
+        try:
+            rows = st.session_state.busqueda_sesion.buscar(
+                get_engine(), filtros_busqueda, espera=lambda: aviso_busqueda.caption("🔎 Buscando…"))
+        except BusquedaCancelada:
+            st.stop()
+        aviso_busqueda.empty()
+    else:
+        rows = buscar_licencias(**filtros_busqueda)
 
     df = to_df(rows)
 
@@ -538,6 +692,7 @@ with tab2:
         df_styled = df.style.apply(highlight_complete_rows, axis=1)
         st.dataframe(df_styled, use_container_width=True, hide_index=True)
         
+        from licencias.reportes import df_to_html_table
         html_table = df_to_html_table(df)
         docentes = len([r for r in rows if r.rol == "Docente"])
         celadores = len([r for r in rows if r.rol == "Celador"])
@@ -572,40 +727,104 @@ with tab2:
                 else:
                     st.error(msg)
 
+        filtros_listado = {k: v for k, v in filtros_busqueda.items() if k != "estado_doc"}
+
         with col_acc2:
-            csv = df.to_csv(index=False).encode("utf-8-sig")
-            st.download_button(
+            # El CSV se escribe en lotes desde la base (ver reportes.escribir_csv), sin armar el texto entero en memoria
+            exportacion_en_segundo_plano(
+                "csv_listado",
+                "csv_listado",
+                filtros_listado,
                 "📥 Descargar CSV",
-                csv,
-                file_name=f"licencias_{dt.date.today():%Y%m%d}.csv",
-                mime="text/csv",
-                use_container_width=True
+                f"licencias_{dt.date.today():%Y%m%d}.csv",
+                "text/csv",
+                texto_generar="⚙️ Generar CSV",
             )
 
         with col_acc3:
-            try:
-                excel_name = f"temp_{dt.date.today():%Y%m%d}.xlsx"
-                with pd.ExcelWriter(excel_name, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Licencias')
-
-                with open(excel_name, 'rb') as f:
-                    excel_data = f.read()
-
-                st.download_button(
-                    "📊 Descargar Excel",
-                    excel_data,
-                    file_name=f"licencias_{dt.date.today():%Y%m%d}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+            exportacion_en_segundo_plano(
+                "excel_listado",
+                "excel_listado",
+                filtros_listado,
+                "📊 Descargar Excel",
+                f"licencias_{dt.date.today():%Y%m%d}.xlsx",
+                MIME_EXCEL,
+            )
 
-                if os.path.exists(excel_name):
-                    os.remove(excel_name)
-            except Exception as e:
-                st.error(f"Error al generar Excel: {e}")
+    with st.expander("👤 Historial y días por persona"):
+        pc1, pc2 = st.columns([2, 1])
+        with pc1:
+            dni_persona = st.text_input("DNI de la persona", key="dni_persona").strip()
+        with pc2:
+            periodo = st.radio("Contar por año", ["calendario", "escolar"], horizontal=True, key="periodo_persona",
+                               format_func=lambda p: "Calendario" if p == "calendario" else "Escolar (desde marzo)")
+        if dni_persona:
+            licencias_persona = licencias_de_persona(dni_persona)
+            if not licencias_persona:
+                st.info("No hay licencias para ese DNI")
+            else:
+                reciente = licencias_persona[0]
+                st.markdown(f"**{reciente.apellido}, {reciente.nombre}** – {len(licencias_persona)} licencia(s)")
+                acumulados = pd.DataFrame(dias_acumulados(dni_persona, periodo))
+                if not acumulados.empty:
+                    tabla_dias = acumulados.pivot_table(index="anio", columns="articulo", values="dias",
+                                                        aggfunc="sum", fill_value=0)
+                    tabla_dias["Total"] = tabla_dias.sum(axis=1)
+                    tabla_dias.index.name = "Año" if periodo == "calendario" else "Ciclo lectivo"
+                    st.caption("Días corridos por artículo. Las licencias sin fecha de fin se cuentan hasta hoy.")
+                    st.dataframe(tabla_dias.sort_index(ascending=False), use_container_width=True)
+                st.dataframe(to_df(licencias_persona), use_container_width=True, hide_index=True)
+
+    with st.expander("⚠️ Superposiciones y posibles duplicados"):
+        st.caption("Licencias del mismo DNI con fechas superpuestas, y licencias con el mismo nombre y "
+                   "fechas (aunque cambie el DNI o el código). Se revisan al guardar cada licencia.")
+        if st.button("🔄 Revisar toda la base", key="revisar_superposiciones"):
+            with st.spinner("Revisando..."):
+                totales = revisar_todo()
+            st.success(f"✅ {totales['solapamientos']} superposición(es) y {totales['duplicados']} posible(s) duplicado(s)")
+        alertas = listar_alertas(limite=500)
+        if alertas:
+            df_alertas = pd.DataFrame(alertas)
+            df_alertas["tipo"] = df_alertas["tipo"].map({"solapamiento": "Superposición", "duplicado": "Posible duplicado"})
+            st.dataframe(df_alertas, use_container_width=True, hide_index=True)
+        else:
+            st.info("No hay superposiciones ni duplicados")
+
+    with st.expander("🧹 Calidad de datos"):
+        st.caption("Revisa todas las licencias con las mismas reglas que los formularios (apellido, nombre y DNI "
+                   "obligatorios, DNI numérico, fechas de fin y de carga GEI no anteriores al inicio, rol, estado "
+                   "y documentación válidos). Sirve para encontrar filas viejas o cargadas por otros medios.")
+        if st.button("🔍 Revisar calidad de datos", key="revisar_calidad"):
+            with st.spinner("Revisando..."):
+                st.session_state.calidad = (version_datos(), revisar_calidad())
+
+        if st.session_state.get('calidad'):
+            version_revisada, calidad = st.session_state.calidad
+            if version_revisada != version_datos():
+                st.caption("ℹ️ Hubo cambios después de esta revisión; volvé a revisar para actualizarla.")
+            q1, q2 = st.columns(2)
+            q1.metric("Licencias revisadas", calidad["revisadas"])
+            q2.metric("Con problemas", calidad["con_problemas"])
+            if not calidad["con_problemas"]:
+                st.success("✅ Todas las licencias cumplen las reglas")
+            else:
+                por_problema = {REGLAS_POR_CODIGO[codigo].mensaje: cantidad
+                                for codigo, cantidad in calidad["por_regla"].items() if cantidad}
+                st.dataframe(pd.DataFrame({"Problema": list(por_problema),
+                                           "Licencias": list(por_problema.values())}),
+                             use_container_width=True, hide_index=True)
+                df_calidad = pd.DataFrame(calidad["problemas"])
+                problema = st.selectbox("Ver", ["Todos"] + list(por_problema), key="calidad_problema")
+                if problema != "Todos":
+                    df_calidad = df_calidad[df_calidad["problema"] == problema]
+                df_calidad["fecha_inicio"] = pd.to_datetime(df_calidad["fecha_inicio"]).dt.strftime('%d/%m/%Y')
+                st.dataframe(df_calidad.drop(columns="regla"), use_container_width=True, hide_index=True)
+                if len(calidad["problemas"]) < sum(calidad["por_regla"].values()):
+                    st.caption(f"Se muestran los primeros {len(calidad['problemas'])} problemas.")
+                st.caption("Para corregir una licencia, abrila por su ID en ✏️ Editar.")
 
 # --- Tab 3: Editar / Eliminar ---
-with tab3:
+with tab3, medir("licencias_pestania_segundos", pestania="editar"):
     st.subheader("Editar o eliminar licencia")
 
     id_editar = st.number_input("ID de licencia a editar", min_value=1, step=1, key="edit_id")
@@ -627,18 +846,26 @@ with tab3:
                 del st.session_state.confirmar_eliminar
                 if 'licencia_cargada_id' in st.session_state:
                     del st.session_state.licencia_cargada_id
+                st.session_state.pop('version_edicion', None)
                 st.rerun()
             else:
                 st.error(msg)
 
     if cargar_btn or st.session_state.get('licencia_cargada_id') == id_editar:
         st.session_state.licencia_cargada_id = id_editar
-        lic = obtener_licencia(int(id_editar))
+        lic = obtener_licencia_cacheada(int(id_editar))
 
         if not lic:
             st.error("❌ No se encontró la licencia con ese ID")
         else:
-            st.info(f"Editando licencia #{lic.id}")
+            # Versión que se está editando: se fija al cargar y no cambia con los reruns,
+            # así se detecta si otra persona guardó cambios mientras tanto.
+            if cargar_btn or st.session_state.get('version_edicion', (None,))[0] != lic.id:
+                st.session_state.version_edicion = (lic.id, lic.version)
+            version_edicion = st.session_state.version_edicion[1]
+
+            st.info(f"Editando licencia #{lic.id} (versión {version_edicion})")
+            mostrar_alertas(lic.id)
 
             with st.form("form_editar_licencia"):
                 col1, col2, col3 = st.columns(3)
@@ -666,19 +893,11 @@ with tab3:
                 actualizar = st.form_submit_button("💾 Actualizar licencia", type="primary", use_container_width=True)
 
                 if actualizar:
-                    errores = []
-                    if not apellido_e or not apellido_e.strip():
-                        errores.append("El apellido es obligatorio")
-                    if not nombre_e or not nombre_e.strip():
-                        errores.append("El nombre es obligatorio")
-                    # DNI obligatorio y numérico
-                    if not dni_e or not dni_e.strip().isdigit():
-                        errores.append("El DNI es obligatorio y debe tener solo números")
-                    # DNI familiar opcional pero numérico si se brinda
-                    if dni_familiar_e and dni_familiar_e.strip() and not dni_familiar_e.strip().isdigit():
-                        errores.append("El DNI familiar debe tener solo números")
-                    if f_fin_e and f_fin_e < f_ini_e:
-                        errores.append("La fecha de fin no puede ser anterior a la de inicio")
+                    errores = validar(dict(
+                        apellido=apellido_e, nombre=nombre_e, dni=dni_e, dni_familiar=dni_familiar_e, rol=rol_e,
+                        fecha_inicio=f_ini_e, fecha_fin=f_fin_e, fecha_carga_gei=lic.fecha_carga_gei,
+                        estado_carga=estado_e, documentacion=documentacion_e,
+                    ))
 
                     if errores:
                         for error in errores:
@@ -687,8 +906,7 @@ with tab3:
                         codigo_osep_valor = codigo_osep_e.strip() if codigo_osep_e and codigo_osep_e.strip() else None
                         articulo_valor = articulo_e.strip() if articulo_e and articulo_e.strip() else None
                         
-                        success, msg = actualizar_licencia(
-                            int(id_editar),
+                        nuevos_valores = dict(
                             apellido=apellido_e.strip().upper(),
                             nombre=nombre_e.strip().title(),
                             dni=dni_e.strip(),
@@ -702,15 +920,83 @@ with tab3:
                             documentacion=documentacion_e,
                             observaciones=observ_e.strip() if observ_e and observ_e.strip() else None,
                         )
+                        # Solo se escriben las columnas que cambiaron respecto de lo cargado
+                        cambios = {k: v for k, v in nuevos_valores.items() if getattr(lic, k) != v}
+
+                        success, msg = actualizar_licencia(
+                            int(id_editar),
+                            version_esperada=version_edicion,
+                            **cambios,
+                        )
 
                         if success:
+                            st.session_state.pop('version_edicion', None)
                             st.success(f"✅ {msg}")
                             st.rerun()
+                        elif msg == MSG_CONFLICTO:
+                            st.session_state.conflicto_edicion = lic.id
                         else:
                             st.error(f"❌ Error: {msg}")
 
+            if st.session_state.get('conflicto_edicion') == lic.id:
+                st.error(
+                    f"⚠️ **{MSG_CONFLICTO}.** Tus cambios NO se guardaron. "
+                    f"Recargá los datos actuales (versión {lic.version}) y volvé a aplicarlos."
+                )
+                if st.button("🔄 Recargar datos actuales", key="recargar_conflicto"):
+                    st.session_state.version_edicion = (lic.id, lic.version)
+                    del st.session_state.conflicto_edicion
+                    st.rerun()
+
+    with st.expander(f"🕓 Historial de la licencia #{int(id_editar)}"):
+        historial = obtener_historial(int(id_editar))
+        if not historial:
+            st.info("No hay cambios registrados para esta licencia")
+        else:
+            st.dataframe(
+                pd.DataFrame([{
+                    "Fecha": c.fecha.strftime('%d/%m/%Y %H:%M'),
+                    "Operación": c.operacion.capitalize(),
+                    "Cambios": describir_cambios(c),
+                } for c in reversed(historial)]),
+                use_container_width=True,
+                hide_index=True,
+            )
+
+            fecha_hist = st.date_input("Ver estado al", value=dt.date.today(), key="fecha_historial")
+            lic_hist = reconstruir_licencia(int(id_editar), fecha_hist)
+            if lic_hist is None:
+                st.warning(f"La licencia no existía el {fecha_hist:%d/%m/%Y}")
+            else:
+                st.dataframe(to_df([lic_hist]), use_container_width=True, hide_index=True)
+                if st.button("↩️ Restaurar esta versión", key="restaurar_version"):
+                    success, msg = restaurar_licencia(int(id_editar), fecha_hist)
+                    if success:
+                        st.success(f"✅ {msg}")
+                        st.rerun()
+                    else:
+                        st.error(f"❌ Error: {msg}")
+
+        st.caption("Tabla completa tal como estaba en una fecha anterior:")
+        fecha_tabla = st.date_input("Fecha", value=dt.date.today(), key="fecha_tabla_historial")
+        if st.button("🗃️ Reconstruir tabla", key="reconstruir_tabla"):
+            df_hist = to_df(reconstruir_tabla(fecha_tabla))
+            st.session_state.tabla_historial = (fecha_tabla, df_hist.to_csv(index=False).encode("utf-8-sig"))
+
+        if st.session_state.get('tabla_historial'):
+            fecha_csv, csv_hist = st.session_state.tabla_historial
+            st.download_button(
+                f"📥 Descargar tabla al {fecha_csv:%d/%m/%Y} (CSV)",
+                csv_hist,
+                file_name=f"licencias_al_{fecha_csv:%Y%m%d}.csv",
+                mime="text/csv",
+            )
+
 # --- Tab 4: Reporte mensual ---
-with tab4:
+with tab4, medir("licencias_pestania_segundos", pestania="reporte"):
+    from licencias.cierres import cerrar_mes, info_cierre, reabrir_mes
+    from licencias.reportes import conteos as conteos_reporte
+
     st.subheader("Reporte mensual para imprimir")
 
     hoy = dt.date.today()
@@ -720,30 +1006,56 @@ with tab4:
         key="mes_reporte"
     )
 
-    primer_dia = dt.date(mes_base.year, mes_base.month, 1)
-    proximo_mes = primer_dia + relativedelta(months=1)
-    ultimo_dia = proximo_mes - dt.timedelta(days=1)
+    primer_dia, ultimo_dia = rango_mes(mes_base)
+
+    if len(listar_escuelas()) > 1:
+        with st.expander("🏛️ Resumen del distrito (todas las escuelas)"):
+            if st.button("Calcular resumen del distrito", key="calcular_distrito"):
+                distrito = resumen_distrito(mes_base)
+                filas = [{"Escuela": codigo, **{k: v for k, v in r.items() if k not in ("desde", "hasta")}}
+                         for codigo, r in distrito["por_escuela"].items()]
+                filas.append({"Escuela": "TOTAL", **{k: v for k, v in distrito["total"].items()
+                                                     if k not in ("desde", "hasta")}})
+                st.dataframe(pd.DataFrame(filas), use_container_width=True, hide_index=True)
+                for codigo, error in distrito["errores"].items():
+                    st.error(f"❌ {codigo}: {error}")
 
     try:
-        with Session(engine) as s:
-            q = select(Licencia)
-            q = q.where(Licencia.fecha_inicio >= primer_dia)
-            q = q.where(Licencia.fecha_inicio <= ultimo_dia)
-            q = q.order_by(Licencia.fecha_inicio, Licencia.apellido, Licencia.nombre)
-            rows_mes = s.exec(q).all()
+        info_mes = info_cierre(primer_dia)
     except Exception as e:
-        st.error(f"Error al buscar licencias: {e}")
-        rows_mes = []
-    
-    df_mes = to_df(rows_mes)
+        st.error(f"Error al consultar el cierre del mes: {e}")
+        info_mes = None
+
+    cierre = None
+    if info_mes is not None:
+        col_cierre, col_actual = st.columns([3, 1])
+        with col_cierre:
+            st.info(f"🔒 Mes cerrado el {info_mes.cerrado:%d/%m/%Y %H:%M}: el reporte se muestra tal como quedó "
+                    f"al cerrarlo (huella `{info_mes.hash[:16]}`)")
+        with col_actual:
+            ver_actual = st.toggle("Ver datos actuales", key="ver_mes_actual")
+        if not ver_actual:
+            try:
+                cierre = cierre_cacheado(str(get_engine().url), info_mes.mes, info_mes.hash)
+                df_mes, totales_mes = cierre.tabla, cierre.resumen
+            except Exception as e:
+                st.error(f"No se pudo leer el cierre del mes: {e}")
+
+    if cierre is None:
+        try:
+            rows_mes = licencias_del_mes(mes_base)
+        except Exception as e:
+            st.error(f"Error al buscar licencias: {e}")
+            rows_mes = []
+
+        df_mes, totales_mes = to_df(rows_mes), conteos_reporte(rows_mes)
+    parametros_mes = {"mes": primer_dia, "cierre": cierre.hash} if cierre else {"mes": primer_dia}
 
     if df_mes.empty:
         st.warning("⚠️ No hay licencias registradas en ese mes")
     else:
-        pendientes = len([r for r in rows_mes if r.estado_carga == "Pendiente"])
-        cargadas = len([r for r in rows_mes if r.estado_carga == "Cargada"])
-        docentes = len([r for r in rows_mes if r.rol == "Docente"])
-        celadores = len([r for r in rows_mes if r.rol == "Celador"])
+        pendientes, cargadas = totales_mes["pendientes"], totales_mes["cargadas"]
+        docentes, celadores = totales_mes["docentes"], totales_mes["celadores"]
 
         st.markdown(f"""
         ### 📋 Reporte de Licencias
@@ -788,7 +1100,7 @@ with tab4:
 
         st.divider()
         
-        col_exp1, col_exp2, col_exp3 = st.columns(3)
+        col_exp1, col_exp2, col_exp3, col_exp4 = st.columns(4)
 
         with col_exp1:
             csv = df_mes.to_csv(index=False).encode("utf-8-sig")
@@ -801,130 +1113,130 @@ with tab4:
             )
 
         with col_exp2:
-            try:
-                excel_name = f"reporte_{primer_dia:%Y_%m}.xlsx"
-                with pd.ExcelWriter(excel_name, engine='openpyxl') as writer:
-                    df_mes.to_excel(writer, index=False, sheet_name='Licencias')
-
-                    resumen = pd.DataFrame({
-                        'Concepto': ['Total', 'Cargadas', 'Pendientes', 'Docentes', 'Celadores'],
-                        'Cantidad': [len(df_mes), cargadas, pendientes, docentes, celadores]
-                    })
-                    resumen.to_excel(writer, index=False, sheet_name='Resumen')
+            exportacion_en_segundo_plano(
+                "excel_reporte",
+                "excel_reporte",
+                parametros_mes,
+                "📊 Descargar Excel completo",
+                f"reporte_licencias_{primer_dia:%Y_%m}.xlsx",
+                MIME_EXCEL,
+            )
 
-                with open(excel_name, 'rb') as f:
-                    excel_data = f.read()
+        with col_exp3:
+            exportacion_en_segundo_plano(
+                "pdf_reporte",
+                "pdf_reporte",
+                parametros_mes,
+                "📄 Descargar PDF",
+                f"reporte_licencias_{primer_dia:%Y_%m}.pdf",
+                "application/pdf",
+                texto_generar="⚙️ Generar PDF",
+            )
 
+        with col_exp4:
+            if cierre:
+                # Ya quedó armada al cerrar el mes
                 st.download_button(
-                    "📊 Descargar Excel completo",
-                    excel_data,
-                    file_name=f"reporte_licencias_{primer_dia:%Y_%m}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    "🖨️ Descargar vista de impresión",
+                    cierre.html,
+                    file_name=f"reporte_licencias_{primer_dia:%Y_%m}.html",
+                    mime="text/html",
                     use_container_width=True
                 )
-
-                if os.path.exists(excel_name):
-                    os.remove(excel_name)
-            except Exception as e:
-                st.error(f"Error al generar Excel: {e}")
-
-        with col_exp3:
-            html_table_print = df_to_html_table(df_mes)
-            
-            print_content = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Reporte de Licencias</title>
-    <style>
-        @page {{ size: landscape; margin: 1cm; }}
-        body {{
-            font-family: Arial, sans-serif;
-            margin: 20px;
-        }}
-        .title {{
-            font-size: 20pt;
-            font-weight: bold;
-            margin-bottom: 10px;
-            text-align: center;
-        }}
-        .subtitle {{
-            font-size: 14pt;
-            margin-bottom: 15px;
-            text-align: center;
-        }}
-        .metrics {{
-            display: flex;
-            justify-content: space-around;
-            margin: 20px 0;
-            padding: 10px;
-            background-color: #f5f5f5;
-            border: 1px solid #ddd;
-        }}
-        .metric {{
-            text-align: center;
-            font-size: 11pt;
-        }}
-        table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin: 20px 0;
-            font-size: 9pt;
-        }}
-        th {{
-            border: 1px solid #000;
-            padding: 6px 8px;
-            text-align: left;
-            font-weight: bold;
-            background-color: #e0e0e0;
-        }}
-        td {{
-            border: 1px solid #000;
-            padding: 5px 8px;
-        }}
-        @media print {{
-            button {{ display: none; }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="title">📋 Reporte de Licencias - Secretaría Escolar Mendoza</div>
-    <div class="subtitle">Período: {primer_dia:%d/%m/%Y} – {ultimo_dia:%d/%m/%Y}</div>
-    
-    <div class="metrics">
-        <div class="metric"><strong>Total:</strong> {len(df_mes)}</div>
-        <div class="metric"><strong>Cargadas:</strong> {cargadas} ({cargadas / len(df_mes) * 100:.0f}%)</div>
-        <div class="metric"><strong>Pendientes:</strong> {pendientes} ({pendientes / len(df_mes) * 100:.0f}%)</div>
-        <div class="metric"><strong>Docentes:</strong> {docentes} | <strong>Celadores:</strong> {celadores}</div>
-    </div>
-    
-    {html_table_print}
-    
-    <div style="text-align: center; margin-top: 20px;">
-        <button onclick="window.print()" style="padding: 10px 20px; font-size: 14px; background-color: #ff4b4b; color: white; border: none; border-radius: 5px; cursor: pointer;">
-            🖨️ Imprimir este reporte
-        </button>
-    </div>
-</body>
-</html>"""
-            
-            st.download_button(
-                label="🖨️ Descargar vista de impresión",
-                data=print_content,
-                file_name=f"reporte_licencias_{primer_dia:%Y_%m}.html",
-                mime="text/html",
-                use_container_width=True,
-                help="Descarga el reporte en HTML. Luego ábrelo y presiona Ctrl+P para imprimir"
-            )
+            else:
+                exportacion_en_segundo_plano(
+                    "impresion_reporte",
+                    "impresion_reporte",
+                    parametros_mes,
+                    "🖨️ Descargar vista de impresión",
+                    f"reporte_licencias_{primer_dia:%Y_%m}.html",
+                    "text/html",
+                    texto_generar="⚙️ Generar vista de impresión",
+                )
 
         st.caption("""
         💡 **Para imprimir:**
-        1. Haz clic en "🖨️ Descargar vista de impresión"
-        2. Abre el archivo HTML descargado en tu navegador
-        3. Presiona Ctrl+P o haz clic en el botón "Imprimir"
-        4. Selecciona tu impresora o "Guardar como PDF"
+        1. Haz clic en "⚙️ Generar PDF" y, cuando termine, en "📄 Descargar PDF"
+        2. Abre el PDF descargado e imprímelo (ya viene en hoja A4 apaisada)
+        3. La vista de impresión en HTML sigue disponible: ábrela en el navegador y presiona Ctrl+P
         """)
 
+    st.divider()
+    if info_mes is None:
+        if hoy > ultimo_dia and not df_mes.empty:
+            if st.button("🔒 Cerrar mes", key="cerrar_mes"):
+                ok, msg = cerrar_mes(primer_dia)
+                if ok:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+            st.caption("Al cerrar el mes, el reporte queda congelado tal como está hoy: los cambios posteriores "
+                       "en estas licencias no lo modifican. Se puede reabrir si hace falta corregirlo.")
+    elif st.button("🔓 Reabrir mes", key="reabrir_mes"):
+        if st.session_state.get('confirmar_reabrir') != primer_dia:
+            st.session_state.confirmar_reabrir = primer_dia
+            st.warning("⚠️ Hacé clic nuevamente para confirmar: el reporte congelado se descarta")
+        else:
+            ok, msg = reabrir_mes(primer_dia)
+            del st.session_state.confirmar_reabrir
+            if ok:
+                st.success(msg)
+                st.rerun()
+            else:
+                st.error(msg)
+
+# --- Tab 5: Ausencias simultáneas por día ---
+with tab5, medir("licencias_pestania_segundos", pestania="ocupacion"):
+    st.subheader("Personal de licencia por día")
+
+    hoy = dt.date.today()
+    oc1, oc2 = st.columns(2)
+    with oc1:
+        desde_ocupacion = st.date_input("Desde", value=dt.date(hoy.year, 1, 1), key="ocupacion_desde")
+    with oc2:
+        hasta_ocupacion = st.date_input("Hasta", value=dt.date(hoy.year, 12, 31), key="ocupacion_hasta")
+
+    if hasta_ocupacion < desde_ocupacion:
+        st.warning("⚠️ La fecha 'Hasta' debe ser posterior a 'Desde'")
+    else:
+        try:
+            df_ocupacion = ausencias_cacheadas(str(get_engine().url), version_datos(),
+                                               desde_ocupacion, hasta_ocupacion, hoy)
+        except Exception as e:
+            st.error(f"Error al calcular la ocupación: {e}")
+            df_ocupacion = pd.DataFrame()
+
+        if df_ocupacion.empty or df_ocupacion.columns.empty:
+            st.info("No hay licencias en ese rango")
+        else:
+            roles_ocupacion = st.multiselect("Roles", options=list(df_ocupacion.columns),
+                                             default=list(df_ocupacion.columns), key="ocupacion_roles")
+            df_roles = df_ocupacion[roles_ocupacion]
+            total_dia = df_roles.sum(axis=1)
+
+            m1, m2, m3 = st.columns(3)
+            m1.metric("Máximo en un día", int(total_dia.max()) if len(total_dia) else 0)
+            m2.metric("Día con más ausencias", f"{total_dia.idxmax():%d/%m/%Y}" if total_dia.any() else "-")
+            m3.metric("Promedio diario", f"{total_dia.mean():.1f}" if len(total_dia) else "0")
+
+            if roles_ocupacion:
+                import altair as alt  # ~0.4 s de importación: recién cuando hay un gráfico para dibujar
+
+                largo = df_roles.reset_index().melt("fecha", var_name="Rol", value_name="Ausentes")
+                largo["hasta"] = largo["fecha"] + pd.Timedelta(days=1)
+                mapa = alt.Chart(largo).mark_rect().encode(
+                    x=alt.X("fecha:T", title=None),
+                    x2="hasta:T",
+                    y=alt.Y("Rol:N", title=None),
+                    color=alt.Color("Ausentes:Q", scale=alt.Scale(scheme="orangered")),
+                    tooltip=[alt.Tooltip("fecha:T", title="Día", format="%d/%m/%Y"), "Rol:N", "Ausentes:Q"],
+                )
+                st.altair_chart(mapa, use_container_width=True)
+                st.line_chart(df_roles)
+            st.caption("Cada persona cuenta una vez por día entre inicio y fin (inclusive), aunque tenga "
+                       "licencias superpuestas. Las licencias sin fecha de fin se cuentan hasta hoy.")
+
 st.divider()
 st.caption("🗂️ Sistema de Gestión de Licencias - Secretaría Escolar Mendoza | Versión 2.1")
 st.caption("💻 Desarrollado por **Nicolas Maure** | [nicomaure.com.ar](https://nicomaure.com.ar)")
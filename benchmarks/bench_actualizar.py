@@ -0,0 +1,51 @@
+"""Actualizaciones por segundo: UPDATE directo vs. ruta ORM (cargar, setattr, commit).
+
+Uso:
+    python benchmarks/bench_actualizar.py [cantidad_de_updates]
+"""
+import sys
+
+import comun  # noqa: F401  (configura la base temporal)
+from sqlmodel import Session
+
+from licencias.db import (
+    Licencia,
+    actualizar_columnas,
+    engine,
+    marcar_documentacion_subida,
+    registrar_cambio,
+)
+
+FILAS = 10_000
+
+
+def actualizar_orm(id_: int, **kwargs):
+    """Ruta anterior: s.get() de la fila completa, setattr por campo y commit."""
+    with Session(engine) as s:
+        lic = s.get(Licencia, id_)
+        cambios = {}
+        for key, value in kwargs.items():
+            if hasattr(lic, key) and getattr(lic, key) != value:
+                setattr(lic, key, value)
+                cambios[key] = value
+        registrar_cambio(s, id_, "modificacion", cambios)
+        s.add(lic)
+        s.commit()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    comun.poblar(FILAS)
+
+    orm = comun.medir(lambda i: actualizar_orm(i % FILAS + 1, observaciones=f"orm {i}"), n)
+    directo = comun.medir(lambda i: actualizar_columnas(i % FILAS + 1, {"observaciones": f"directo {i}"}), n)
+    marcar = comun.medir(lambda i: marcar_documentacion_subida(i % FILAS + 1), n)
+
+    print(f"Updates sobre {FILAS} licencias ({n} por ruta)")
+    print(f"  ORM (get + setattr + commit): {orm:10.0f} updates/s")
+    print(f"  UPDATE directo:               {directo:10.0f} updates/s  ({directo / orm:.2f}x)")
+    print(f"  marcar_documentacion_subida:  {marcar:10.0f} updates/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""buscar_licencias: sentencias armadas una vez por combinación de filtros vs. armarlas en cada llamada.
+
+Uso:
+    python benchmarks/bench_busqueda.py [filas]
+"""
+import datetime as dt
+import sys
+from unittest import mock
+
+import comun
+
+from licencias import db
+
+# Consultas selectivas (pocas filas leídas), donde el costo de armar la sentencia se nota
+CONSULTAS = [
+    dict(dni="30123"),
+    dict(dni="301", limite=50),
+    dict(limite=50),
+    dict(apellido="gomez", nombre="ana", rol="Docente", f_ini=dt.date(2024, 1, 1), limite=10),
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    comun.poblar(n)
+    repeticiones = 2000
+
+    def buscar(i):
+        db.buscar_licencias(**CONSULTAS[i % len(CONSULTAS)])
+
+    # Sin cache: la función sin decorar arma la sentencia en cada llamada
+    with mock.patch.object(db, "_consulta_busqueda", db._consulta_busqueda.__wrapped__):
+        sin_cache = comun.medir(buscar, repeticiones)
+    con_cache = comun.medir(buscar, repeticiones)
+
+    print(f"{n} licencias, {repeticiones} búsquedas de {len(CONSULTAS)} formas distintas")
+    print(f"Armando la sentencia en cada llamada: {1000 / sin_cache:.2f} ms por búsqueda")
+    print(f"Sentencias en cache:                  {1000 / con_cache:.2f} ms por búsqueda ({con_cache / sin_cache:.1f}x)")
+    print(db.estadisticas_consultas())
+
+
+if __name__ == "__main__":
+    main()
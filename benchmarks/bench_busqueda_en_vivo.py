@@ -0,0 +1,87 @@
+"""Búsqueda en vivo: cuánto tarda en aparecer el resultado de lo último que se escribió.
+
+Llena la base con `filas` licencias y simula a alguien que escribe un apellido de a
+una letra ("", "g", "go", ... "gomez"), con INTERVALO segundos entre cada envío.
+Un hilo hace de sesión de Streamlit: toma el último valor, busca y "dibuja"; si
+mientras tanto llegó otro, vuelve a empezar con ese.
+
+- antes: buscar_licencias en el hilo de la sesión. Streamlit no puede cortar una
+  consulta en curso, así que cada búsqueda vieja termina antes de atender la nueva.
+- despues: BusquedaEnVivo.buscar, con una espera que corta apenas llega otro valor
+  (como hace Streamlit en cada llamada); la consulta vieja se interrumpe en SQLite.
+
+Uso:
+    python benchmarks/bench_busqueda_en_vivo.py [filas]
+"""
+import sys
+import threading
+import time
+
+import comun
+
+from licencias import db
+from licencias.busqueda_en_vivo import BusquedaEnVivo, estadisticas_busqueda
+
+TEXTO = "gomez"
+INTERVALO = 0.15
+
+
+class ValorNuevo(Exception):
+    pass
+
+
+def sesion(modo: str) -> dict:
+    estado = {"valor": None, "fin_escritura": None}
+    cambio = threading.Event()
+
+    def escribir():
+        for i in range(len(TEXTO) + 1):
+            estado["valor"] = TEXTO[:i]
+            cambio.set()
+            if i < len(TEXTO):
+                time.sleep(INTERVALO)
+        estado["fin_escritura"] = time.perf_counter()
+
+    def espera(valor: str):
+        if estado["valor"] != valor:
+            raise ValorNuevo()
+
+    busqueda = BusquedaEnVivo()
+    escritor = threading.Thread(target=escribir)
+    escritor.start()
+    terminadas = 0
+    while True:
+        cambio.wait()
+        cambio.clear()
+        valor = estado["valor"]
+        try:
+            if modo == "antes":
+                filas = db.buscar_licencias(apellido=valor)
+            else:
+                filas = busqueda.buscar(db.engine, {"apellido": valor}, espera=lambda: espera(valor))
+            terminadas += 1
+        except ValorNuevo:
+            continue
+        if valor == TEXTO and estado["fin_escritura"] is not None:
+            break
+    escritor.join()
+    return {"espera": time.perf_counter() - estado["fin_escritura"], "terminadas": terminadas, "filas": len(filas)}
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    comun.poblar(n)
+    inicio = time.perf_counter()
+    total = len(db.buscar_licencias())
+    print(f"{total} licencias; búsqueda sin filtros: {time.perf_counter() - inicio:.2f} s")
+
+    for modo in ("antes", "despues"):
+        antes = estadisticas_busqueda()["canceladas"]
+        r = sesion(modo)
+        canceladas = estadisticas_busqueda()["canceladas"] - antes
+        print(f"{modo:>8}: resultado de '{TEXTO}' ({r['filas']} filas) {r['espera']:.2f} s después de la última "
+              f"letra; {r['terminadas']} búsquedas completas, {canceladas} canceladas")
+
+
+if __name__ == "__main__":
+    main()
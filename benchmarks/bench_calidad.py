@@ -0,0 +1,81 @@
+"""Revisión de calidad de datos de toda la tabla: una lectura con todas las reglas en SQL.
+
+Carga `filas` licencias sintéticas, rompe a propósito una de cada 200 (DNI con
+letras, fin antes del inicio, carga GEI antes del inicio, apellido vacío, rol
+inexistente), corre calidad.revisar_calidad() y compara los conteos con las mismas
+reglas escritas en pandas sobre la tabla completa en memoria.
+
+Uso:
+    python benchmarks/bench_calidad.py [filas]
+"""
+import sys
+import time
+
+import comun
+import pandas as pd
+from sqlalchemy import text
+
+from licencias import db
+from licencias.calidad import revisar_calidad
+
+ROTURAS = [
+    "UPDATE licencia SET dni = dni || 'X' WHERE id % 1000 = 1",
+    "UPDATE licencia SET fecha_fin = date(fecha_inicio, '-3 days') WHERE id % 1000 = 201",
+    "UPDATE licencia SET estado_carga = 'Cargada', fecha_carga_gei = date(fecha_inicio, '-1 day') WHERE id % 1000 = 401",
+    "UPDATE licencia SET apellido = '  ' WHERE id % 1000 = 601",
+    "UPDATE licencia SET rol = 'Portero' WHERE id % 1000 = 801",
+]
+
+
+def con_pandas() -> dict:
+    """Las mismas reglas, vectorizadas en pandas (hay que traer toda la tabla a memoria)."""
+    with db.engine.connect() as conn:
+        df = pd.read_sql("SELECT apellido, nombre, dni, dni_familiar, rol, fecha_inicio, fecha_fin, "
+                         "fecha_carga_gei, estado_carga, documentacion FROM licencia", conn)
+
+    def vacio(serie):
+        return serie.fillna("").str.strip() == ""
+
+    def no_numerico(serie):
+        return serie.str.strip().str.contains(r"[^0-9]", na=False)
+
+    return {
+        "apellido_vacio": vacio(df.apellido).sum(),
+        "nombre_vacio": vacio(df.nombre).sum(),
+        "dni_vacio": vacio(df.dni).sum(),
+        "dni_no_numerico": no_numerico(df.dni).sum(),
+        "dni_familiar_no_numerico": no_numerico(df.dni_familiar).sum(),
+        "rol_invalido": (~df.rol.isin(db.ROLES)).sum(),
+        "inicio_vacio": df.fecha_inicio.isna().sum(),
+        "fin_antes_de_inicio": (df.fecha_fin < df.fecha_inicio).sum(),
+        "carga_gei_antes_de_inicio": (df.fecha_carga_gei < df.fecha_inicio).sum(),
+        "estado_invalido": (~df.estado_carga.isin(db.ESTADOS)).sum(),
+        "documentacion_invalida": (~df.documentacion.isin(db.ESTADOS_DOCUMENTACION)).sum(),
+    }
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    comun.poblar(n)
+    with db.engine.begin() as conn:
+        for sentencia in ROTURAS:
+            conn.execute(text(sentencia))
+
+    inicio = time.perf_counter()
+    resultado = revisar_calidad()
+    segundos = time.perf_counter() - inicio
+    print(f"{resultado['revisadas']} licencias revisadas en {segundos:.2f} s: "
+          f"{resultado['con_problemas']} con problemas")
+    for codigo, cantidad in resultado["por_regla"].items():
+        if cantidad:
+            print(f"  {codigo}: {cantidad}")
+
+    inicio = time.perf_counter()
+    esperado = con_pandas()
+    print(f"mismas reglas en pandas (tabla completa en memoria): {time.perf_counter() - inicio:.2f} s")
+    distintos = {c: (resultado["por_regla"][c], int(v)) for c, v in esperado.items() if resultado["por_regla"][c] != v}
+    print("conteos iguales" if not distintos else f"conteos distintos: {distintos}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Reporte de un mes cerrado (desde el cierre congelado) vs. armado en vivo.
+
+Llena la base con `filas` licencias repartidas en cinco años, cierra el mes
+pasado y compara:
+
+- en vivo: licencias_del_mes + to_df + conteos + html_reporte_mensual (lo que
+  hace la pestaña del reporte más la vista de impresión),
+- desde el cierre: cierres.leer_cierre (verifica la huella, lee la tabla ya
+  formateada del Parquet y descomprime el HTML).
+
+En la app el cierre además queda en cache (st.cache_resource) por su huella, así
+que a partir de la segunda vista ni siquiera se lee de la base.
+
+Uso:
+    python benchmarks/bench_cierre.py [filas]
+"""
+import datetime as dt
+import sys
+import time
+
+import comun
+
+from licencias import cierres, db
+from licencias.reportes import conteos, html_reporte_mensual, to_df
+
+REPETICIONES = 10
+
+
+def en_vivo(mes: dt.date):
+    primer_dia, ultimo_dia = db.rango_mes(mes)
+    rows = db.licencias_del_mes(primer_dia)
+    df_mes = to_df(rows)
+    html_reporte_mensual(df_mes, primer_dia, ultimo_dia, {"total": len(rows), **conteos(rows)})
+
+
+def desde_cierre(mes: dt.date):
+    cierres.leer_cierre(mes)
+
+
+def promedio_ms(func, mes: dt.date) -> float:
+    inicio = time.perf_counter()
+    for _ in range(REPETICIONES):
+        func(mes)
+    return (time.perf_counter() - inicio) / REPETICIONES * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 120_000
+    comun.poblar(n)
+    hoy = dt.date.today()
+    mes, _ = db.rango_mes(hoy.replace(day=1) - dt.timedelta(days=1))
+
+    inicio = time.perf_counter()
+    ok, msg = cierres.cerrar_mes(mes)
+    print(f"{msg} en {time.perf_counter() - inicio:.2f} s" if ok else msg)
+    if not ok:
+        return
+    info = cierres.info_cierre(mes)
+    with db.engine.connect() as conn:
+        parquet, html, = conn.execute(db.text(
+            "SELECT length(parquet), length(html) FROM cierremes WHERE mes = :mes"), {"mes": mes}).one()
+    html_crudo = len(cierres.leer_cierre(mes).html.encode("utf-8"))
+    print(f"  {info.filas} licencias: Parquet {parquet / 1e3:.0f} KB, HTML {html / 1e3:.0f} KB "
+          f"comprimido ({html_crudo / 1e3:.0f} KB sin comprimir)")
+
+    vivo = promedio_ms(en_vivo, mes)
+    congelado = promedio_ms(desde_cierre, mes)
+    print(f"en vivo:       {vivo:7.1f} ms por vista")
+    print(f"desde cierre:  {congelado:7.1f} ms por vista ({vivo / congelado:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
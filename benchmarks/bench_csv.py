@@ -0,0 +1,69 @@
+"""Memoria máxima (RSS) al exportar el listado completo a CSV según la cantidad de filas.
+
+- antes: buscar_licencias -> to_df -> to_csv -> encode("utf-8-sig"), todo en memoria.
+- despues: reportes.escribir_csv sobre db.lotes_busqueda (fetchmany, un lote por vez).
+
+La base se llena en un proceso y cada exportación corre en otro proceso nuevo, así
+el pico de memoria (ru_maxrss) de cada una no arrastra el de las demás.
+
+Uso:
+    python benchmarks/bench_csv.py [filas ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import comun
+
+MODOS = ["antes", "despues"]
+
+
+def _pico_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def poblar(n: int):
+    comun.poblar(n)
+
+
+def exportar(modo: str):
+    from licencias import db
+    from licencias.reportes import escribir_csv, to_df
+
+    db.init_db()
+    base = _pico_mb()
+    inicio = time.perf_counter()
+    with open(os.devnull, "wb") as salida:
+        if modo == "antes":
+            salida.write(to_df(db.buscar_licencias()).to_csv(index=False).encode("utf-8-sig"))
+        else:
+            escribir_csv(salida, db.lotes_busqueda())
+    print(f"{base:.0f} {_pico_mb():.0f} {time.perf_counter() - inicio:.2f}")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--poblar":
+        poblar(int(sys.argv[2]))
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == "--exportar":
+        exportar(sys.argv[2])
+        return
+
+    tamanios = [int(a) for a in sys.argv[1:]] or [10_000, 50_000, 200_000]
+    print(f"{'filas':>8} {'modo':>8} {'RSS antes':>10} {'RSS pico':>9} {'aumento':>8} {'tiempo':>7}")
+    for n in tamanios:
+        entorno = dict(os.environ, LICENCIAS_DATA_DIR=tempfile.mkdtemp(prefix="bench_csv_"))
+        subprocess.run([sys.executable, __file__, "--poblar", str(n)], env=entorno, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for modo in MODOS:
+            salida = subprocess.run([sys.executable, __file__, "--exportar", modo], env=entorno, check=True,
+                                    capture_output=True, text=True).stdout.split()
+            base, pico, segundos = float(salida[0]), float(salida[1]), float(salida[2])
+            print(f"{n:>8} {modo:>8} {base:>7.0f} MB {pico:>6.0f} MB {pico - base:>5.0f} MB {segundos:>6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
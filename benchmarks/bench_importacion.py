@@ -0,0 +1,51 @@
+"""Perfil de tiempo de importación (python -X importtime) de los módulos de la app.
+
+Para cada módulo muestra el tiempo total de importación y los paquetes que más
+aportan (tiempo propio sumado por paquete de primer nivel). Cada import corre
+en un proceso nuevo, así que los tiempos son de arranque en frío.
+
+Uso:
+    python benchmarks/bench_importacion.py [modulo ...]
+"""
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+import comun
+
+MODULOS = ["licencias.db", "licencias.historial", "pandas", "sqlmodel", "streamlit", "openpyxl"]
+TOP = 8
+
+
+def perfil_importacion(modulo: str):
+    """Devuelve (total_us, {paquete: tiempo_propio_us}) para `import modulo`."""
+    env = dict(os.environ, PYTHONPATH=str(comun.Path(comun.__file__).resolve().parent.parent))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    por_paquete = defaultdict(int)
+    total = 0
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        paquete = nombre.strip().split(".")[0]
+        por_paquete[paquete] += int(propio)
+        if nombre.strip() == modulo:
+            total = int(acumulado)
+    return total, por_paquete
+
+
+def main():
+    modulos = sys.argv[1:] or MODULOS
+    for modulo in modulos:
+        total, por_paquete = perfil_importacion(modulo)
+        print(f"import {modulo}: {total / 1000:8.1f} ms")
+        for paquete, us in sorted(por_paquete.items(), key=lambda x: -x[1])[:TOP]:
+            print(f"    {paquete:<24} {us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
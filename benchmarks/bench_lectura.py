@@ -0,0 +1,106 @@
+"""Latencia de las altas mientras corre una exportación grande, antes y después del engine de lectura.
+
+- antes: base en modo rollback journal y reportes por el mismo engine que las escrituras.
+- despues: base en WAL y búsquedas/reportes por get_engine_lectura() (mode=ro, query_only).
+
+Cada modo corre en un proceso aparte con su propia base temporal, con todas las
+licencias en el mes actual. Mientras un hilo genera el PDF del reporte de ese mes
+(lee las filas en lotes, así que mantiene abierta la lectura hasta el final), otro
+da altas cada 20 ms y mide cuánto tarda cada una.
+
+Uso:
+    python benchmarks/bench_lectura.py [filas]
+"""
+import io
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+MODOS = ["antes", "despues"]
+
+
+def correr_modo(modo: str, n: int):
+    import comun
+    from sqlalchemy import insert, text
+
+    from licencias import db
+    from licencias.trabajos import TIPOS
+
+    hoy = comun.dt.date.today()
+    primer_dia = hoy.replace(day=1)
+    db.init_db()
+    with db.engine.begin() as conn:
+        conn.execute(insert(db.Licencia), [
+            dict(fila, fecha_inicio=primer_dia + comun.dt.timedelta(days=i % 28), fecha_fin=None)
+            for i, fila in enumerate(comun.filas_sinteticas(n))
+        ])
+    db.init_db()
+    if modo == "antes":
+        with db.engine.connect() as conn:
+            conn.execute(text("PRAGMA journal_mode = DELETE"))
+        db.get_engine_lectura = db.get_engine
+
+    altas = iter(range(1, 10 ** 6))
+
+    def alta():
+        # DNI y nombre distintos en cada alta: no generan superposiciones ni duplicados entre sí
+        numero = next(altas)
+        inicio = time.perf_counter()
+        lic, error = db.crear_licencia(apellido="BENCH", nombre=f"Alta {numero}", dni=str(numero),
+                                       rol="Docente", fecha_inicio=hoy)
+        return time.perf_counter() - inicio, error
+
+    base = [alta()[0] for _ in range(20)]
+
+    exportando = threading.Event()
+    duracion = {}
+
+    def exportar():
+        exportando.set()
+        inicio = time.perf_counter()
+        try:
+            generar, _ = TIPOS["pdf_reporte"]
+            generar({"mes": primer_dia.isoformat()}, lambda porcentaje: None, io.BytesIO())
+        finally:
+            duracion["exportacion"] = time.perf_counter() - inicio
+            exportando.clear()
+
+    hilo = threading.Thread(target=exportar)
+    hilo.start()
+    exportando.wait()
+    latencias, errores = [], 0
+    while exportando.is_set():
+        segundos, error = alta()
+        latencias.append(segundos)
+        errores += error is not None
+        time.sleep(0.02)
+    hilo.join()
+
+    def ms(valor):
+        return f"{valor * 1000:.1f} ms"
+
+    print(f"[{modo}] {n} licencias en el mes; PDF del reporte en {duracion['exportacion']:.1f} s")
+    print(f"[{modo}]   alta sin exportación: mediana {ms(statistics.median(base))}")
+    if latencias:
+        latencias.sort()
+        print(f"[{modo}]   alta durante la exportación ({len(latencias)} altas): "
+              f"mediana {ms(statistics.median(latencias))}, p95 {ms(latencias[int(len(latencias) * 0.95)])}, "
+              f"máxima {ms(latencias[-1])}, errores {errores}")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--modo":
+        correr_modo(sys.argv[2], int(sys.argv[3]))
+        return
+    n = sys.argv[1] if len(sys.argv) > 1 else "30000"
+    # Sin LICENCIAS_DATA_DIR: cada proceso crea su propia base temporal (ver comun)
+    entorno = {k: v for k, v in os.environ.items() if k != "LICENCIAS_DATA_DIR"}
+    for modo in MODOS:
+        subprocess.run([sys.executable, __file__, "--modo", modo, n], env=entorno, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Mantenimiento: tamaño en disco y tiempos de consulta antes y después de purgar.
+
+Llena la base con `filas` licencias repartidas en cinco años (la base nueva ya usa
+auto_vacuum=INCREMENTAL) y corre mantenimiento(retencion): purga las licencias
+terminadas hace más de `retencion` años, compacta con VACUUM (o, si la purga fue
+chica, devuelve las páginas libres con incremental_vacuum) y corre ANALYZE.
+Verifica que version_datos suba con la purga y muestra el tamaño en disco y la
+mediana de las consultas de referencia antes y después, y cuánto tarda el
+mantenimiento diario cuando no hay nada para purgar.
+
+Uso:
+    python benchmarks/bench_mantenimiento.py [filas] [años de retención]
+"""
+import sys
+import time
+
+import comun
+
+from licencias import db, mantenimiento
+
+
+def mb(estado: dict) -> str:
+    return f"{(estado['archivo'] + estado['wal']) / 1e6:6.1f} MB"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    anios = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    comun.poblar(n)
+    mantenimiento.liberar_espacio()  # checkpoint: que el WAL de la carga no cuente como tamaño de la base
+
+    version = db.version_datos()
+    inicio = time.perf_counter()
+    r = mantenimiento.mantenimiento(anios)
+    segundos = time.perf_counter() - inicio
+    # Los caches y las exportaciones guardadas se indexan por version_datos: una purga tiene que hacerla subir
+    if r["purgadas"] and db.version_datos() <= version:
+        sys.exit(f"version_datos no subió con la purga: {version} -> {db.version_datos()}")
+    antes, despues = r["antes"], r["despues"]
+    print(f"{r['purgadas']} de {antes['licencias']} licencias purgadas (retención de {anios} años) "
+          f"en {segundos:.1f} s; {r['paginas_liberadas']} páginas devueltas al disco; "
+          f"version_datos {version} -> {db.version_datos()}")
+    print(f"{'':28} {'antes':>10} {'después':>10}")
+    print(f"{'Tamaño en disco':28} {mb(antes):>10} {mb(despues):>10}")
+    for consulta, ms in antes["tiempos"].items():
+        print(f"{consulta:28} {ms:7.1f} ms {despues['tiempos'][consulta]:7.1f} ms")
+
+    # Un mantenimiento diario sin nada para purgar: solo incremental_vacuum y PRAGMA optimize
+    inicio = time.perf_counter()
+    mantenimiento.mantenimiento(anios, medir=False)
+    print(f"mantenimiento diario sin purga: {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
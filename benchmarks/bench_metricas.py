@@ -0,0 +1,54 @@
+"""Métricas: cuánto cuestan al lado de las consultas que miden.
+
+Llena la base con `filas` licencias, hace búsquedas con distintas combinaciones de
+filtros (cada una queda en licencias_consulta_segundos con su forma) y compara:
+
+- el costo de registrar una observación (metricas.observar),
+- la búsqueda más rápida de las medidas,
+- lo que tarda armar el texto de Prometheus (lo que paga cada lectura del endpoint).
+
+Uso:
+    python benchmarks/bench_metricas.py [filas]
+"""
+import sys
+import time
+
+import comun
+
+from licencias import db, metricas
+
+OBSERVACIONES = 100_000
+BUSQUEDAS = [
+    {"apellido": "go"}, {"apellido": "go", "rol": "Docente"}, {"nombre": "a", "limite": 50},
+    {"estado": "Pendiente", "limite": 200}, {"dni": "3"}, {"articulo": "40", "limite": 100},
+]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    comun.poblar(n)
+
+    mas_rapida = float("inf")
+    for _ in range(5):
+        for filtros in BUSQUEDAS:
+            inicio = time.perf_counter()
+            db.buscar_licencias(**filtros)
+            mas_rapida = min(mas_rapida, time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    for i in range(OBSERVACIONES):
+        metricas.observar("licencias_consulta_segundos", i / OBSERVACIONES, consulta="bench", forma="")
+    por_observacion = (time.perf_counter() - inicio) / OBSERVACIONES
+
+    metricas.texto()  # la primera vez importa los módulos que consulta; en la app ya están cargados
+    inicio = time.perf_counter()
+    texto = metricas.texto()
+    armado = time.perf_counter() - inicio
+
+    print(f"observar: {por_observacion * 1e6:.2f} µs por observación "
+          f"({por_observacion / mas_rapida:.3%} de la búsqueda más rápida, {mas_rapida * 1000:.1f} ms)")
+    print(f"texto de Prometheus: {len(texto.splitlines())} líneas, {len(texto) / 1e3:.0f} KB en {armado * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Ausencias simultáneas por día y rol: consulta + barrido con arreglo de diferencias.
+
+Uso:
+    python benchmarks/bench_ocupacion.py [filas]
+"""
+import datetime as dt
+import sys
+import time
+
+import comun
+import numpy as np
+
+from licencias.ocupacion import ausencias_por_dia, contar_ausencias
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    comun.poblar(n)
+    hoy = dt.date.today()
+    desde, hasta = hoy - dt.timedelta(days=364), hoy
+
+    repeticiones = 10
+    por_segundo = comun.medir(lambda i: ausencias_por_dia(desde, hasta, hoy), repeticiones)
+    print(f"{n} licencias, un año: consulta + barrido en {1000 / por_segundo:.1f} ms promedio")
+
+    rnd = np.random.default_rng(1)
+    roles = rnd.integers(0, 2, n)
+    inicios = rnd.integers(-30, 365, n)
+    fines = inicios + rnd.integers(0, 31, n)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        contar_ausencias(roles, inicios, fines, 365)
+    print(f"Solo el barrido (np.cumsum): {(time.perf_counter() - inicio) * 1000 / repeticiones:.2f} ms promedio")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Tamaño y tiempo de la sincronización escuela -> distrito: envío completo vs. diferencial.
+
+Llena la base de una escuela con `filas` licencias, hace el primer envío completo
+al distrito (otra base SQLite), modifica el 1% y borra el 0,1%, y compara el
+archivo diferencial con uno completo (sin el MARGEN de repetición, porque todo
+pasa en pocos segundos). También mide volver a aplicar el mismo
+archivo (no debe cambiar nada).
+
+Uso:
+    python benchmarks/bench_sincronizacion.py [filas]
+"""
+import datetime as dt
+import io
+import random
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import comun
+from sqlmodel import create_engine
+
+from licencias import db, sincronizacion
+from licencias.sincronizacion import aplicar_cambios, exportar_cambios
+
+
+def exportar(completo: bool):
+    salida = io.BytesIO()
+    inicio = time.perf_counter()
+    resumen = exportar_cambios(salida, "escuela", completo)
+    return salida.getvalue(), resumen, time.perf_counter() - inicio
+
+
+def aplicar(distrito, datos: bytes):
+    inicio = time.perf_counter()
+    with db.usando_engine(distrito):
+        resumen = aplicar_cambios(io.BytesIO(datos))
+    return resumen, time.perf_counter() - inicio
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    comun.poblar(n)
+    distrito = create_engine(f"sqlite:///{tempfile.mkdtemp()}/distrito.db")
+    with db.usando_engine(distrito):
+        db.init_db()
+
+    completo, resumen, segundos = exportar(completo=True)
+    print(f"envío completo: {resumen['licencias']} licencias, {len(completo) / 1e6:.1f} MB, {segundos:.1f} s")
+    resultado, segundos = aplicar(distrito, completo)
+    print(f"  aplicado en el distrito: {resultado['altas']} altas en {segundos:.1f} s")
+
+    ids = random.Random(1).sample(range(1, n + 1), n // 100 + n // 1000)
+    for id_ in ids[: n // 100]:
+        db.actualizar_licencia(id_, observaciones="modificada")
+    for id_ in ids[n // 100:]:
+        db.eliminar_licencia(id_)
+
+    diferencial, resumen, segundos = exportar(completo=False)
+    otro_completo, _, segundos_completo = exportar(completo=True)
+    print(f"envío diferencial: {resumen['licencias']} licencias y {resumen['bajas']} bajas, "
+          f"{len(diferencial) / 1e3:.0f} KB en {segundos * 1000:.0f} ms "
+          f"(completo: {len(otro_completo) / 1e6:.1f} MB en {segundos_completo:.1f} s)")
+    resultado, segundos = aplicar(distrito, diferencial)
+    print(f"  aplicado: {resultado['modificaciones']} modificaciones, {resultado['bajas']} bajas en {segundos:.2f} s")
+    resultado, segundos = aplicar(distrito, diferencial)
+    print(f"  aplicado otra vez: {resultado['sin_cambios']} sin cambios, "
+          f"{resultado['modificaciones'] + resultado['altas'] + resultado['bajas']} escrituras en {segundos:.2f} s")
+
+
+if __name__ == "__main__":
+    # Todo pasa en segundos: sin margen, el envío diferencial no repite las filas del completo
+    with mock.patch.object(sincronizacion, "MARGEN", dt.timedelta(0)):
+        main()
@@ -0,0 +1,58 @@
+"""Detección de superposiciones y duplicados: revisión completa vs. incremental.
+
+Las licencias sintéticas se reparten entre filas/8 personas (DNI), así cada una
+tiene varias y aparecen superposiciones.
+
+Uso:
+    python benchmarks/bench_solapamientos.py [filas]
+"""
+import random
+import resource
+import sys
+import time
+
+import comun
+from sqlalchemy import func, insert, select
+
+from licencias.db import Licencia, engine, init_db
+from licencias.solapamientos import revisar_licencia, revisar_todo
+
+LOTE = 50_000
+
+
+def poblar_con_personas(n: int):
+    init_db()
+    rnd = random.Random(2)
+    dnis = [str(10_000_000 + i) for i in range(max(n // 8, 1))]
+    filas = comun.filas_sinteticas(n)
+    with engine.begin() as conn:
+        for _ in range(0, n, LOTE):
+            lote = [dict(f, dni=rnd.choice(dnis)) for f, _ in zip(filas, range(LOTE))]
+            conn.execute(insert(Licencia), lote)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    inicio = time.perf_counter()
+    poblar_con_personas(n)
+    print(f"{n} licencias insertadas en {time.perf_counter() - inicio:.1f} s")
+
+    inicio = time.perf_counter()
+    totales = revisar_todo()
+    completa = time.perf_counter() - inicio
+    pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    with engine.connect() as conn:
+        max_id = conn.execute(select(func.max(Licencia.id))).scalar()
+    muestras = 500
+    rnd = random.Random(3)
+    incremental = 1 / comun.medir(lambda i: revisar_licencia(rnd.randint(1, max_id)), muestras)
+
+    print(f"Revisión completa: {completa:.2f} s ({n / completa:,.0f} filas/s), "
+          f"{totales['solapamientos']} superposiciones, {totales['duplicados']} duplicados")
+    print(f"Memoria máxima del proceso: {pico_mb:.0f} MB")
+    print(f"Revisión incremental (una licencia): {incremental * 1000:.2f} ms promedio en {muestras} muestras")
+
+
+if __name__ == "__main__":
+    main()
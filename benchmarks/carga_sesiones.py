@@ -0,0 +1,202 @@
+"""Prueba de carga: N sesiones simuladas de la app sobre una misma base sintética.
+
+Cada sesión es un proceso que maneja app.py con el framework AppTest de Streamlit
+(alta de licencias, búsquedas, "Marcar CARGADA" y vista del reporte mensual), así
+que cada acción mide un rerun completo del script. AppTest no admite varias
+sesiones en un mismo proceso; por eso se usan procesos, que compiten por la base
+SQLite igual que los hilos del servidor.
+
+Informa throughput, latencias p50/p95/p99 por acción y esperas por locks de
+SQLite: escrituras o commits que tardaron más que el umbral, y errores
+"database is locked".
+
+Uso:
+    python benchmarks/carga_sesiones.py [--sesiones 4] [--acciones 25] [--filas 5000] [--umbral-ms 50]
+"""
+import argparse
+import datetime as dt
+import logging
+import multiprocessing
+import random
+import sqlite3
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import comun
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+PESOS = {"crear": 3, "buscar": 4, "marcar": 2, "reporte": 2}
+_ESCRITURAS = ("INSERT", "UPDATE", "DELETE", "BEGIN", "CREATE", "ALTER")
+
+
+class EstadisticasLocks:
+    umbral = 0.05
+    esperas = 0
+    segundos_espera = 0.0
+    bloqueos = 0
+
+    @classmethod
+    def medir(cls, inicio: float):
+        transcurrido = time.perf_counter() - inicio
+        if transcurrido > cls.umbral:
+            cls.esperas += 1
+            cls.segundos_espera += transcurrido
+
+    @classmethod
+    def error(cls, e: sqlite3.OperationalError):
+        if "locked" in str(e):
+            cls.bloqueos += 1
+
+
+class CursorMedido(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        if not sql.lstrip().upper().startswith(_ESCRITURAS):
+            return super().execute(sql, *args)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        except sqlite3.OperationalError as e:
+            EstadisticasLocks.error(e)
+            raise
+        finally:
+            EstadisticasLocks.medir(inicio)
+
+    def executemany(self, sql, *args):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        except sqlite3.OperationalError as e:
+            EstadisticasLocks.error(e)
+            raise
+        finally:
+            EstadisticasLocks.medir(inicio)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión que cuenta cuánto esperan las escrituras y los commits (ahí se esperan los locks)."""
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return super().commit()
+        except sqlite3.OperationalError as e:
+            EstadisticasLocks.error(e)
+            raise
+        finally:
+            EstadisticasLocks.medir(inicio)
+
+
+def _boton(at, texto):
+    return next(b for b in at.button if texto in b.label)
+
+
+def _text_input(at, etiqueta):
+    return next(t for t in at.text_input if t.label == etiqueta)
+
+
+def _accion(at, nombre, rnd, max_id):
+    if nombre == "crear":
+        fila = next(comun.filas_sinteticas(1, rnd.randint(0, 10**9)))
+        _text_input(at, "Apellido*").set_value(fila["apellido"])
+        _text_input(at, "Nombre*").set_value(fila["nombre"])
+        _text_input(at, "DNI*").set_value(fila["dni"])
+        _boton(at, "Guardar licencia").click()
+    elif nombre == "buscar":
+        _text_input(at, "Apellido empieza con").set_value(rnd.choice(comun.APELLIDOS)[:3])
+        _boton(at, "Buscar").click()
+    elif nombre == "marcar":
+        at.number_input(key="marcar_id").set_value(rnd.randint(1, max_id))
+        _boton(at, "Marcar CARGADA").click()
+    elif nombre == "reporte":
+        hoy = dt.date.today()
+        at.date_input(key="mes_reporte").set_value(dt.date(hoy.year - rnd.randint(0, 3), rnd.randint(1, 12), 1))
+    inicio = time.perf_counter()
+    at.run()
+    return time.perf_counter() - inicio
+
+
+def sesion(args):
+    """Corre una sesión simulada (en su propio proceso) y devuelve sus mediciones."""
+    semilla, acciones, max_id, umbral = args
+    logging.disable(logging.WARNING)
+    from sqlmodel import create_engine
+    from streamlit.testing.v1 import AppTest
+    from licencias import db
+
+    EstadisticasLocks.umbral = umbral
+    db.engine = create_engine(db.DB_URL, echo=False, connect_args={"factory": ConexionMedida})
+
+    rnd = random.Random(semilla)
+    at = AppTest.from_file(APP, default_timeout=300)
+    at.run()
+
+    latencias = defaultdict(list)
+    errores = incompletas = 0
+    for _ in range(acciones):
+        nombre = rnd.choices(list(PESOS), weights=list(PESOS.values()))[0]
+        try:
+            latencias[nombre].append(_accion(at, nombre, rnd, max_id))
+            # st.error también se usa para avisos (plazo GEI vencido): se cuentan solo los errores reales
+            errores += len(at.exception) + sum("Error" in e.value for e in at.error)
+        except (StopIteration, KeyError):
+            # El widget no está en pantalla: búsqueda sin resultados o un rerun que se cortó
+            # (p. ej. st.stop() tras un error de base). Se vuelve a dibujar la página.
+            incompletas += 1
+            at.run()
+    return dict(latencias), (errores, incompletas), (EstadisticasLocks.esperas, EstadisticasLocks.segundos_espera,
+                                                     EstadisticasLocks.bloqueos)
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=4)
+    parser.add_argument("--acciones", type=int, default=25, help="acciones por sesión")
+    parser.add_argument("--filas", type=int, default=5000, help="licencias sintéticas iniciales")
+    parser.add_argument("--umbral-ms", type=float, default=50, help="escrituras más lentas cuentan como espera de lock")
+    args = parser.parse_args()
+
+    comun.poblar(args.filas)
+    tareas = [(i, args.acciones, args.filas, args.umbral_ms / 1000) for i in range(args.sesiones)]
+
+    inicio = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(args.sesiones) as pool:
+        resultados = pool.map(sesion, tareas)
+    duracion = time.perf_counter() - inicio
+
+    latencias = defaultdict(list)
+    errores = incompletas = esperas = bloqueos = 0
+    segundos_espera = 0.0
+    for lat, (err, inc), (esp, seg, bloq) in resultados:
+        for nombre, valores in lat.items():
+            latencias[nombre].extend(valores)
+        errores += err
+        incompletas += inc
+        esperas += esp
+        segundos_espera += seg
+        bloqueos += bloq
+
+    total = sum(len(v) for v in latencias.values())
+    print(f"{args.sesiones} sesiones x {args.acciones} acciones sobre {args.filas} licencias")
+    print(f"Throughput: {total / duracion:.2f} acciones/s ({total} en {duracion:.1f} s)")
+    print(f"Errores mostrados en pantalla: {errores}, vistas incompletas: {incompletas}")
+    print(f"{'acción':<10}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for nombre in PESOS:
+        valores = latencias.get(nombre)
+        if valores:
+            print(f"{nombre:<10}{len(valores):>6}" + "".join(
+                f"{percentil(valores, p) * 1000:>10.0f}" for p in (50, 95, 99)))
+    print(f"Esperas por lock de SQLite (> {args.umbral_ms:.0f} ms): {esperas} "
+          f"({segundos_espera * 1000:.0f} ms en total), errores 'database is locked': {bloqueos}")
+
+
+if __name__ == "__main__":
+    main()
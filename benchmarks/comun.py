@@ -0,0 +1,58 @@
+"""Utilidades compartidas por los benchmarks.
+
+Importar este módulo antes que `licencias` hace que la base de datos se cree en
+una carpeta temporal (vía LICENCIAS_DATA_DIR) y no toque los datos reales.
+"""
+import datetime as dt
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("LICENCIAS_DATA_DIR", tempfile.mkdtemp(prefix="bench_licencias_"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+APELLIDOS = ["GOMEZ", "PEREZ", "MUÑOZ", "FERNANDEZ", "LOPEZ", "DIAZ", "MARTINEZ", "SOSA", "ROMERO", "ALVAREZ"]
+NOMBRES = ["Ana", "Juan", "María", "José", "Lucía", "Carlos", "Sofía", "Miguel", "Laura", "Pedro"]
+ARTICULOS = ["Art. 40 inc. A", "Art. 41", "Art. 44 inc. B", "Art. 48", None]
+
+
+def filas_sinteticas(n: int, semilla: int = 1):
+    """Genera `n` dicts con columnas de Licencia, repartidos en los últimos años."""
+    rnd = random.Random(semilla)
+    hoy = dt.date.today()
+    for _ in range(n):
+        inicio = hoy - dt.timedelta(days=rnd.randint(0, 5 * 365))
+        yield dict(
+            apellido=rnd.choice(APELLIDOS),
+            nombre=rnd.choice(NOMBRES),
+            dni=str(rnd.randint(10_000_000, 45_000_000)),
+            rol=rnd.choice(["Docente", "Celador"]),
+            fecha_inicio=inicio,
+            fecha_fin=inicio + dt.timedelta(days=rnd.randint(0, 30)) if rnd.random() < 0.9 else None,
+            articulo=rnd.choice(ARTICULOS),
+            estado_carga=rnd.choice(["Pendiente", "Cargada"]),
+            documentacion=rnd.choice(["Pendiente", "Subida"]),
+            fecha_creacion=dt.datetime.combine(inicio, dt.time(9)),
+        )
+
+
+def poblar(n: int, semilla: int = 1):
+    """Inicializa la base temporal y le inserta `n` licencias sintéticas en un solo lote (con su historial base)."""
+    from sqlalchemy import insert
+    from licencias.db import Licencia, engine, init_db
+
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(insert(Licencia), list(filas_sinteticas(n, semilla)))
+    init_db()
+
+
+def medir(func, repeticiones: int):
+    """Ejecuta `func(i)` `repeticiones` veces y devuelve las operaciones por segundo."""
+    inicio = time.perf_counter()
+    for i in range(repeticiones):
+        func(i)
+    return repeticiones / (time.perf_counter() - inicio)
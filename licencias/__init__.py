@@ -0,0 +1 @@
+"""Capa de datos del sistema de licencias (modelo, base de datos e historial)."""
@@ -0,0 +1,306 @@
+"""API HTTP (JSON) para integraciones, sobre el mismo modelo y consultas que la app.
+
+Las respuestas GET llevan un ETag basado en version_datos(): si el cliente manda
+If-None-Match con el último ETag y nada cambió, se responde 304 sin consultar.
+
+Sin parámetros se usa la base principal; con `?escuela=<codigo>`, la base de esa
+escuela (como en la app). Un error de la base se responde con 500, nunca como
+una respuesta vacía.
+
+Ejecutar:
+    python -m licencias.api [puerto]
+o   uvicorn licencias.api:app --port 8502
+"""
+import datetime as dt
+import json
+import sys
+from contextlib import asynccontextmanager
+
+from sqlalchemy import create_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from licencias import db, metricas
+from licencias.calidad import validar
+from licencias.dias import PERIODOS, dias_acumulados
+from licencias.escuelas import EscuelaInexistente, engines
+from licencias.solapamientos import alertas_de
+
+# Pool propio: las conexiones de la API no compiten con las de la app Streamlit
+api_engine = create_engine(db.DB_URL, echo=False, pool_size=5, max_overflow=10)
+
+POR_PAGINA = 50
+POR_PAGINA_MAX = 500
+
+
+class RespuestaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            default=lambda v: v.isoformat() if isinstance(v, (dt.date, dt.datetime)) else str(v),
+        ).encode("utf-8")
+
+
+def _error(status: int, *mensajes: str) -> RespuestaJSON:
+    return RespuestaJSON({"errores": list(mensajes)}, status_code=status)
+
+
+def _engine_de(request: Request):
+    """Engine de la escuela pedida con ?escuela=, o el pool de la API para la base principal."""
+    codigo = request.query_params.get("escuela")
+    if not codigo:
+        return api_engine
+    try:
+        return engines.obtener(codigo)
+    except ValueError:
+        # Código con caracteres no permitidos: tampoco existe
+        raise EscuelaInexistente(codigo)
+
+
+async def _en_db(request: Request, func, *args, **kwargs):
+    """Ejecuta una función de licencias.db en un hilo, sobre la base del pedido.
+
+    Los errores de la base se levantan (ver db.levantando_errores) en lugar de
+    volver como una lista vacía o None, y terminan en una respuesta 500.
+    """
+    def llamar():
+        with db.usando_engine(_engine_de(request)), db.levantando_errores():
+            return func(*args, **kwargs)
+    return await run_in_threadpool(llamar)
+
+
+async def _con_etag(request: Request, armar, extra: str = ""):
+    """Responde 304 si el ETag del cliente coincide con la versión de datos; si no, arma la respuesta.
+
+    `extra` se agrega al ETag cuando la respuesta depende de algo más que los datos (p. ej. la fecha).
+    """
+    etag = f'"{await _en_db(request, db.version_datos)}{"-" + extra if extra else ""}"'
+    pedidos = [e.strip() for e in request.headers.get("if-none-match", "").split(",")]
+    if etag in pedidos or "*" in pedidos:
+        return Response(status_code=304, headers={"ETag": etag})
+    respuesta = await armar()
+    respuesta.headers["ETag"] = etag
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+
+def _fecha(valor, campo: str):
+    if valor in (None, ""):
+        return None
+    try:
+        return dt.date.fromisoformat(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo}: fecha inválida, usar AAAA-MM-DD")
+
+
+def _texto(datos: dict, campo: str):
+    valor = datos.get(campo)
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+
+def _validar_alta(datos: dict):
+    """Aplica las mismas reglas y normalización que el formulario de alta. Devuelve (valores, errores)."""
+    valores = dict(
+        apellido=_texto(datos, "apellido"),
+        nombre=_texto(datos, "nombre"),
+        dni=_texto(datos, "dni"),
+        dni_familiar=_texto(datos, "dni_familiar"),
+        rol=_texto(datos, "rol"),
+        documentacion=_texto(datos, "documentacion") or "Pendiente",
+    )
+    errores = []
+    try:
+        valores["fecha_inicio"] = _fecha(datos.get("fecha_inicio"), "fecha_inicio")
+        valores["fecha_fin"] = _fecha(datos.get("fecha_fin"), "fecha_fin")
+    except ValueError as e:
+        errores.append(str(e))
+    # Con una fecha inválida, validar() omite las reglas de fechas
+    errores = validar(valores) + errores
+
+    if errores:
+        return None, errores
+    return dict(
+        valores,
+        apellido=valores["apellido"].upper(),
+        nombre=valores["nombre"].title(),
+        articulo=_texto(datos, "articulo"),
+        codigo_osep=_texto(datos, "codigo_osep"),
+        observaciones=_texto(datos, "observaciones"),
+    ), []
+
+
+async def listar_licencias(request: Request):
+    """GET /licencias?apellido=&nombre=&rol=&estado=&estado_doc=&articulo=&desde=&hasta=&pagina=&por_pagina="""
+    p = request.query_params
+    try:
+        pagina = max(int(p.get("pagina", 1)), 1)
+        por_pagina = min(max(int(p.get("por_pagina", POR_PAGINA)), 1), POR_PAGINA_MAX)
+        desde, hasta = _fecha(p.get("desde"), "desde"), _fecha(p.get("hasta"), "hasta")
+    except ValueError as e:
+        return _error(400, str(e))
+
+    async def armar():
+        # Se pide una fila de más para saber si hay otra página sin hacer un COUNT
+        filas = await _en_db(
+            request,
+            db.buscar_licencias,
+            apellido=p.get("apellido", "").strip(),
+            nombre=p.get("nombre", "").strip(),
+            rol=p.get("rol"),
+            estado=p.get("estado"),
+            estado_doc=p.get("estado_doc"),
+            f_ini=desde,
+            f_fin=hasta,
+            articulo=p.get("articulo", "").strip(),
+            dni=p.get("dni", "").strip(),
+            limite=por_pagina + 1,
+            desplazamiento=(pagina - 1) * por_pagina,
+        )
+        return RespuestaJSON({
+            "pagina": pagina,
+            "por_pagina": por_pagina,
+            "hay_mas": len(filas) > por_pagina,
+            "items": [f.model_dump() for f in filas[:por_pagina]],
+        })
+
+    return await _con_etag(request, armar)
+
+
+async def obtener_licencia(request: Request):
+    """GET /licencias/{id}"""
+    id_ = request.path_params["id"]
+
+    async def armar():
+        lic = await _en_db(request, db.obtener_licencia, id_)
+        if lic is None:
+            return _error(404, "Licencia no encontrada")
+        return RespuestaJSON(lic._asdict())
+
+    return await _con_etag(request, armar)
+
+
+async def crear_licencia(request: Request):
+    """POST /licencias con los campos del formulario de alta (fechas en AAAA-MM-DD).
+
+    La respuesta incluye `alertas`: licencias del mismo DNI que se superponen o posibles duplicados.
+    """
+    try:
+        datos = await request.json()
+    except ValueError:
+        return _error(400, "El cuerpo debe ser JSON")
+    if not isinstance(datos, dict):
+        return _error(400, "El cuerpo debe ser un objeto JSON")
+
+    valores, errores = _validar_alta(datos)
+    if errores:
+        return _error(422, *errores)
+
+    lic, error = await _en_db(request, db.crear_licencia, **valores)
+    if lic is None:
+        return _error(500, error)
+    alertas = await _en_db(request, alertas_de, lic.id)
+    cuerpo = dict(lic.model_dump(), alertas=[
+        {"tipo": a.tipo, "licencia_id": a.otra_id if a.licencia_id == lic.id else a.licencia_id} for a in alertas
+    ])
+    return RespuestaJSON(cuerpo, status_code=201, headers={"Location": f"/licencias/{lic.id}"})
+
+
+async def actualizar_estados(request: Request):
+    """POST /licencias/estado con {"ids": [...], "estado_carga": "Cargada", "fecha_carga_gei": "AAAA-MM-DD"}"""
+    try:
+        datos = await request.json()
+        ids = [int(i) for i in datos["ids"]]
+        estado = datos["estado_carga"]
+        fecha = _fecha(datos.get("fecha_carga_gei"), "fecha_carga_gei")
+    except (ValueError, KeyError, TypeError) as e:
+        return _error(400, f"Cuerpo inválido: {e}")
+    if estado not in db.ESTADOS:
+        return _error(422, f"estado_carga debe ser uno de: {', '.join(db.ESTADOS)}")
+
+    actualizados = await _en_db(request, db.actualizar_estado_lote, ids, estado, fecha)
+    return RespuestaJSON({
+        "actualizados": actualizados,
+        "omitidos": sorted(set(ids) - set(actualizados)),
+    })
+
+
+async def resumen_mensual(request: Request):
+    """GET /resumen/{anio}/{mes}"""
+    try:
+        fecha = dt.date(request.path_params["anio"], request.path_params["mes"], 1)
+    except ValueError as e:
+        return _error(400, str(e))
+
+    async def armar():
+        return RespuestaJSON(await _en_db(request, db.resumen_mensual, fecha))
+
+    return await _con_etag(request, armar)
+
+
+async def dias_de_persona(request: Request):
+    """GET /personas/{dni}/dias?periodo=calendario|escolar"""
+    dni = request.path_params["dni"]
+    periodo = request.query_params.get("periodo", "calendario")
+    if periodo not in PERIODOS:
+        return _error(400, f"periodo debe ser uno de: {', '.join(PERIODOS)}")
+
+    async def armar():
+        items = await _en_db(request, dias_acumulados, dni, periodo)
+        return RespuestaJSON({"dni": dni, "periodo": periodo, "items": items})
+
+    # Las licencias sin fecha de fin suman un día por día: el ETag cambia con la fecha
+    return await _con_etag(request, armar, extra=dt.date.today().isoformat())
+
+
+async def exportar_metricas(request: Request):
+    """GET /metrics: métricas de este proceso en formato Prometheus (ver licencias.metricas)."""
+    return Response(await run_in_threadpool(metricas.texto), media_type=metricas.TIPO_CONTENIDO)
+
+
+async def _escuela_inexistente(request: Request, exc: EscuelaInexistente):
+    return _error(404, f"No existe la escuela {exc}")
+
+
+async def _error_interno(request: Request, exc: Exception):
+    # El detalle (con el SQL) queda en el log del servidor, no en la respuesta
+    return _error(500, "Error interno al consultar la base de datos")
+
+
+def _iniciar():
+    with db.usando_engine(api_engine):
+        db.init_db()
+
+
+@asynccontextmanager
+async def _ciclo_de_vida(app):
+    await run_in_threadpool(_iniciar)
+    yield
+    api_engine.dispose()
+
+
+app = Starlette(lifespan=_ciclo_de_vida, exception_handlers={
+    EscuelaInexistente: _escuela_inexistente,
+    Exception: _error_interno,
+}, routes=[
+    Route("/licencias", listar_licencias, methods=["GET"]),
+    Route("/licencias", crear_licencia, methods=["POST"]),
+    Route("/licencias/estado", actualizar_estados, methods=["POST"]),
+    Route("/licencias/{id:int}", obtener_licencia, methods=["GET"]),
+    Route("/resumen/{anio:int}/{mes:int}", resumen_mensual, methods=["GET"]),
+    Route("/personas/{dni}/dias", dias_de_persona, methods=["GET"]),
+    Route("/metrics", exportar_metricas, methods=["GET"]),
+])
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else 8502
+    uvicorn.run(app, host="127.0.0.1", port=puerto)
@@ -0,0 +1,80 @@
+"""Búsqueda en vivo del listado: en cada sesión solo cuenta la última consulta.
+
+Con la búsqueda en vivo, cada cambio en los filtros vuelve a buscar mientras se
+escribe. La consulta corre en un hilo aparte y la sesión la espera revisando cada
+INTERVALO_ESPERA segundos si llegó un cambio nuevo (`espera()`: en la app, una
+llamada a Streamlit, que corta la ejecución cuando hay otra pendiente). Si llegó, o
+si la misma sesión lanzó otra búsqueda, la consulta vieja se cancela: su conexión
+tiene un progress handler de SQLite (ver db.buscar_licencias) que la interrumpe en
+el momento, así escribir rápido no acumula recorridos de la tabla.
+"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, List, Optional
+
+from sqlalchemy import Engine
+
+from licencias.db import BusquedaCancelada, Licencia, buscar_licencias, usando_engine
+
+INTERVALO_ESPERA = 0.05
+HILOS_BUSQUEDA = 4
+
+_pool = ThreadPoolExecutor(max_workers=HILOS_BUSQUEDA, thread_name_prefix="busqueda")
+# Búsquedas lanzadas y canceladas (todas las sesiones del proceso)
+_contadores = Counter()
+
+
+def _buscar(engine: Engine, filtros: dict, cancelada: threading.Event) -> List[Licencia]:
+    if cancelada.is_set():
+        raise BusquedaCancelada()
+    with usando_engine(engine):
+        return buscar_licencias(**filtros, cancelada=cancelada.is_set)
+
+
+class BusquedaEnVivo:
+    """Búsquedas de una sesión: cada una nueva cancela la anterior si todavía corre."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actual: Optional[threading.Event] = None
+
+    @staticmethod
+    def _cancelar(cancelada: threading.Event):
+        if not cancelada.is_set():
+            cancelada.set()
+            _contadores["canceladas"] += 1
+
+    def buscar(self, engine: Engine, filtros: dict, espera: Callable[[], None] = lambda: None) -> List[Licencia]:
+        """Resultado de buscar_licencias(**filtros) sobre `engine`.
+
+        Levanta BusquedaCancelada si otra búsqueda de la sesión la reemplazó. Si
+        `espera()` levanta una excepción (la sesión tiene algo más nuevo que hacer),
+        la consulta se cancela y la excepción sigue su camino.
+        """
+        cancelada = threading.Event()
+        with self._lock:
+            if self._actual is not None:
+                self._cancelar(self._actual)
+            self._actual = cancelada
+        _contadores["lanzadas"] += 1
+        futuro = _pool.submit(_buscar, engine, filtros, cancelada)
+        try:
+            while True:
+                try:
+                    return futuro.result(timeout=INTERVALO_ESPERA)
+                except TimeoutError:
+                    espera()
+        except BaseException:
+            with self._lock:
+                self._cancelar(cancelada)
+            raise
+        finally:
+            with self._lock:
+                if self._actual is cancelada:
+                    self._actual = None
+
+
+def estadisticas_busqueda() -> dict:
+    """Búsquedas en vivo lanzadas y canceladas por otra más nueva desde que arrancó el proceso."""
+    return {"lanzadas": _contadores["lanzadas"], "canceladas": _contadores["canceladas"]}
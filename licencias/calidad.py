@@ -0,0 +1,139 @@
+"""Reglas de validación de una licencia y revisión de toda la tabla con esas mismas reglas.
+
+Cada regla se escribe una sola vez como una expresión SQL en función de las
+columnas (`incumple(columnas)`), y se usa de tres maneras:
+
+- validar(): sobre los valores de un formulario o de la API, evaluando las
+  expresiones con parámetros en una base SQLite en memoria (sin leer datos).
+- condicion(): en el WHERE de un UPDATE, con algunas columnas reemplazadas por
+  valores (ver db.marcar_cargada).
+- revisar_calidad(): sobre toda la tabla en una sola lectura, con todas las reglas
+  como columnas de la misma consulta y solo las filas que incumplen alguna.
+"""
+import datetime as dt
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, create_engine, func, literal, not_, or_
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import select
+
+from licencias import metricas
+from licencias.db import ESTADOS, ESTADOS_DOCUMENTACION, ROLES, Licencia, get_engine_lectura
+
+FILAS_POR_LOTE = 5000
+MAX_FILAS_LISTADO = 5000
+
+# Base vacía en memoria: solo evalúa expresiones, nunca toca los datos
+_evaluador = create_engine("sqlite://")
+
+
+class Regla(NamedTuple):
+    codigo: str
+    mensaje: str
+    campos: Tuple[str, ...]
+    incumple: Callable[[Dict[str, ColumnElement]], ColumnElement]
+
+
+def _vacio(columna) -> ColumnElement:
+    return func.coalesce(func.trim(columna), "") == ""
+
+
+def _no_numerico(columna) -> ColumnElement:
+    # NULL (dato opcional sin cargar) no incumple
+    return func.trim(columna).op("GLOB")("*[^0-9]*")
+
+
+def _fuera_de(columna, opciones: List[str]) -> ColumnElement:
+    return func.coalesce(columna, "").not_in(opciones)
+
+
+REGLAS: List[Regla] = [
+    Regla("apellido_vacio", "El apellido es obligatorio", ("apellido",), lambda c: _vacio(c["apellido"])),
+    Regla("nombre_vacio", "El nombre es obligatorio", ("nombre",), lambda c: _vacio(c["nombre"])),
+    Regla("dni_vacio", "El DNI es obligatorio", ("dni",), lambda c: _vacio(c["dni"])),
+    Regla("dni_no_numerico", "El DNI debe tener solo números", ("dni",), lambda c: _no_numerico(c["dni"])),
+    Regla("dni_familiar_no_numerico", "El DNI familiar debe tener solo números", ("dni_familiar",),
+          lambda c: _no_numerico(c["dni_familiar"])),
+    Regla("rol_invalido", f"El rol debe ser uno de: {', '.join(ROLES)}", ("rol",),
+          lambda c: _fuera_de(c["rol"], ROLES)),
+    Regla("inicio_vacio", "La fecha de inicio es obligatoria", ("fecha_inicio",),
+          lambda c: c["fecha_inicio"].is_(None)),
+    Regla("fin_antes_de_inicio", "La fecha de fin no puede ser anterior a la de inicio",
+          ("fecha_inicio", "fecha_fin"), lambda c: c["fecha_fin"] < c["fecha_inicio"]),
+    Regla("carga_gei_antes_de_inicio", "La fecha de carga GEI no puede ser anterior a la de inicio",
+          ("fecha_inicio", "fecha_carga_gei"), lambda c: c["fecha_carga_gei"] < c["fecha_inicio"]),
+    Regla("estado_invalido", f"El estado debe ser uno de: {', '.join(ESTADOS)}", ("estado_carga",),
+          lambda c: _fuera_de(c["estado_carga"], ESTADOS)),
+    Regla("documentacion_invalida", f"La documentación debe ser uno de: {', '.join(ESTADOS_DOCUMENTACION)}",
+          ("documentacion",), lambda c: _fuera_de(c["documentacion"], ESTADOS_DOCUMENTACION)),
+]
+REGLAS_POR_CODIGO = {r.codigo: r for r in REGLAS}
+
+_COLUMNAS_TABLA = {c.name: c for c in Licencia.__table__.c}
+
+
+def _valores_sql(valores: dict) -> Dict[str, ColumnElement]:
+    """Los valores como parámetros con el tipo de su columna (las fechas quedan como en la tabla)."""
+    return {campo: bindparam(f"valor_{campo}", valor, type_=_COLUMNAS_TABLA[campo].type)
+            for campo, valor in valores.items() if campo in _COLUMNAS_TABLA}
+
+
+def validar(valores: dict) -> List[str]:
+    """Mensajes de las reglas que no cumplen `valores`, en el orden de REGLAS.
+
+    Solo se evalúan las reglas cuyas columnas están todas en `valores`, así sirve
+    también para validar una modificación parcial.
+    """
+    reglas = [r for r in REGLAS if set(r.campos) <= valores.keys()]
+    if not reglas:
+        return []
+    columnas = _valores_sql(valores)
+    with _evaluador.connect() as conn:
+        fallas = conn.execute(select(*[func.coalesce(r.incumple(columnas), False) for r in reglas])).one()
+    return [r.mensaje for r, falla in zip(reglas, fallas) if falla]
+
+
+def condicion(codigo: str, **valores) -> ColumnElement:
+    """Condición para un WHERE sobre licencia: la fila cumple la regla `codigo` con las
+    columnas de `valores` reemplazadas por esos valores."""
+    columnas = {**_COLUMNAS_TABLA, **{c: literal(v, type_=_COLUMNAS_TABLA[c].type) for c, v in valores.items()}}
+    return not_(func.coalesce(REGLAS_POR_CODIGO[codigo].incumple(columnas), False))
+
+
+@metricas.consulta
+def revisar_calidad(limite: Optional[int] = MAX_FILAS_LISTADO) -> dict:
+    """Revisa todas las licencias con todas las reglas en una sola lectura de la tabla.
+
+    Devuelve {"revisadas", "con_problemas", "por_regla": {codigo: cantidad},
+    "problemas": [{id, apellido, nombre, dni, fecha_inicio, regla, problema}],
+    "revisada"}. `problemas` tiene como mucho `limite` filas; los conteos son siempre totales.
+    """
+    fallas = [func.coalesce(r.incumple(_COLUMNAS_TABLA), False).label(r.codigo) for r in REGLAS]
+    q = (
+        select(Licencia.id, Licencia.apellido, Licencia.nombre, Licencia.dni, Licencia.fecha_inicio, *fallas)
+        .where(or_(*[r.incumple(_COLUMNAS_TABLA) for r in REGLAS]))
+        .order_by(Licencia.id)
+    )
+    por_regla = dict.fromkeys(REGLAS_POR_CODIGO, 0)
+    problemas: List[dict] = []
+    con_problemas = 0
+    with get_engine_lectura().connect() as conn:
+        revisadas = conn.execute(select(func.count()).select_from(Licencia)).scalar()
+        resultado = conn.execution_options(yield_per=FILAS_POR_LOTE).execute(q)
+        for lote in resultado.partitions(FILAS_POR_LOTE):
+            for id_, apellido, nombre, dni, inicio, *marcas in lote:
+                con_problemas += 1
+                for regla, marca in zip(REGLAS, marcas):
+                    if not marca:
+                        continue
+                    por_regla[regla.codigo] += 1
+                    if limite is None or len(problemas) < limite:
+                        problemas.append({"id": id_, "apellido": apellido, "nombre": nombre, "dni": dni,
+                                          "fecha_inicio": inicio, "regla": regla.codigo, "problema": regla.mensaje})
+    return {
+        "revisadas": revisadas,
+        "con_problemas": con_problemas,
+        "por_regla": por_regla,
+        "problemas": problemas,
+        "revisada": dt.datetime.now(),
+    }
@@ -0,0 +1,172 @@
+"""Cierre mensual: el reporte de un mes se calcula una vez y queda congelado.
+
+Al cerrar un mes se leen sus licencias en una sola consulta (los totales salen de
+esas mismas filas, así que siempre coinciden) y se guarda en la tabla `cierremes`
+de la base de la escuela, junto con los datos (y por lo tanto en sus backups):
+
+- la tabla del reporte (las mismas columnas y formatos que se ven en pantalla) en
+  Parquet comprimido con zstd,
+- el resumen en JSON,
+- la vista de impresión ya armada, en HTML comprimido con gzip,
+- y una huella SHA-256 de las tres partes, que se verifica cada vez que se leen.
+
+Después, el reporte de ese mes se arma desde el cierre sin consultar las licencias
+ni volver a formatear la tabla o dibujar el HTML: aunque alguien edite una licencia
+de junio en agosto, el reporte de junio sigue siendo el que se cerró. Reabrir el
+mes borra el cierre.
+"""
+import datetime as dt
+import gzip
+import hashlib
+import io
+import json
+from typing import List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Field, Session, select
+
+from licencias.db import Licencia, get_engine, licencias_del_mes, rango_mes, version_datos
+from licencias.reportes import conteos, html_reporte_mensual, to_df
+
+INTENTOS_LECTURA = 3
+
+
+class CierreMes(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+
+    mes: dt.date = Field(primary_key=True)  # primer día del mes
+    cerrado: dt.datetime = Field(default_factory=dt.datetime.now)
+    version_datos: int
+    filas: int
+    hash: str
+    resumen: str  # JSON
+    parquet: bytes
+    html: bytes  # gzip
+
+
+class InfoCierre(NamedTuple):
+    """Datos del cierre sin el contenido: alcanza para saber si el mes está cerrado."""
+    mes: dt.date
+    cerrado: dt.datetime
+    version_datos: int
+    filas: int
+    hash: str
+
+
+class Cierre(NamedTuple):
+    mes: dt.date
+    cerrado: dt.datetime
+    hash: str
+    resumen: dict
+    tabla: pd.DataFrame
+    html: str
+
+
+def _huella(parquet: bytes, resumen: str, html: bytes) -> str:
+    h = hashlib.sha256()
+    for parte in (parquet, resumen.encode("utf-8"), html):
+        h.update(len(parte).to_bytes(8, "big"))
+        h.update(parte)
+    return h.hexdigest()
+
+
+def _leer_mes(primer_dia: dt.date) -> Tuple[int, List[Licencia]]:
+    """Las licencias del mes y la versión de datos que les corresponde.
+
+    Si algo cambió entre las dos lecturas se vuelve a leer, así la versión guardada
+    describe exactamente las filas congeladas.
+    """
+    for _ in range(INTENTOS_LECTURA):
+        version = version_datos()
+        rows = licencias_del_mes(primer_dia)
+        if version_datos() == version:
+            return version, rows
+    raise RuntimeError("Los datos cambian demasiado seguido: probá cerrar el mes en un rato")
+
+
+def cerrar_mes(fecha: dt.date) -> Tuple[bool, str]:
+    """Congela el reporte del mes de `fecha`. Solo se pueden cerrar meses terminados y con licencias."""
+    primer_dia, ultimo_dia = rango_mes(fecha)
+    if ultimo_dia >= dt.date.today():
+        desde = ultimo_dia + dt.timedelta(days=1)
+        return False, f"El mes {primer_dia:%m/%Y} todavía no terminó: se puede cerrar desde el {desde:%d/%m/%Y}"
+    if info_cierre(primer_dia) is not None:
+        return False, f"El mes {primer_dia:%m/%Y} ya está cerrado"
+
+    try:
+        version, rows = _leer_mes(primer_dia)
+        if not rows:
+            return False, f"No hay licencias en {primer_dia:%m/%Y}: no hay nada que cerrar"
+
+        cerrado = dt.datetime.now().replace(microsecond=0)
+        totales = {"total": len(rows), **conteos(rows)}
+        resumen = json.dumps({
+            "mes": primer_dia.isoformat(),
+            "desde": primer_dia.isoformat(),
+            "hasta": ultimo_dia.isoformat(),
+            **totales,
+            "version_datos": version,
+            "cerrado": cerrado.isoformat(),
+        }, ensure_ascii=False, sort_keys=True)
+        df_mes = to_df(rows)
+        html = gzip.compress(html_reporte_mensual(df_mes, primer_dia, ultimo_dia, totales).encode("utf-8"), mtime=0)
+        parquet = df_mes.to_parquet(index=False, compression="zstd")
+        cierre = CierreMes(mes=primer_dia, cerrado=cerrado, version_datos=version, filas=len(rows),
+                           hash=_huella(parquet, resumen, html), resumen=resumen, parquet=parquet, html=html)
+        with Session(get_engine()) as s:
+            s.add(cierre)
+            s.commit()
+            s.refresh(cierre)
+    except IntegrityError:
+        return False, f"El mes {primer_dia:%m/%Y} ya está cerrado"
+    except Exception as e:
+        return False, f"Error al cerrar el mes: {e}"
+    return True, f"Mes {primer_dia:%m/%Y} cerrado con {cierre.filas} licencias (huella {cierre.hash[:12]})"
+
+
+def reabrir_mes(fecha: dt.date) -> Tuple[bool, str]:
+    """Borra el cierre del mes de `fecha`: el reporte vuelve a armarse con los datos actuales."""
+    primer_dia, _ = rango_mes(fecha)
+    try:
+        with Session(get_engine()) as s:
+            cierre = s.get(CierreMes, primer_dia)
+            if cierre is None:
+                return False, f"El mes {primer_dia:%m/%Y} no está cerrado"
+            s.delete(cierre)
+            s.commit()
+        return True, f"Mes {primer_dia:%m/%Y} reabierto"
+    except Exception as e:
+        return False, f"Error al reabrir el mes: {e}"
+
+
+def info_cierre(fecha: dt.date) -> Optional[InfoCierre]:
+    """Fecha, versión, filas y huella del cierre del mes de `fecha` (sin leer su contenido), o None."""
+    primer_dia, _ = rango_mes(fecha)
+    q = select(CierreMes.mes, CierreMes.cerrado, CierreMes.version_datos, CierreMes.filas, CierreMes.hash)
+    with get_engine().connect() as conn:
+        fila = conn.execute(q.where(CierreMes.mes == primer_dia)).first()
+    return InfoCierre(*fila) if fila else None
+
+
+def leer_cierre(fecha: dt.date) -> Optional[Cierre]:
+    """El reporte congelado del mes de `fecha`, o None si no está cerrado.
+
+    Levanta ValueError si el contenido guardado no coincide con su huella.
+    """
+    primer_dia, _ = rango_mes(fecha)
+    with Session(get_engine()) as s:
+        cierre = s.get(CierreMes, primer_dia)
+        if cierre is None:
+            return None
+        s.expunge(cierre)
+    if _huella(cierre.parquet, cierre.resumen, cierre.html) != cierre.hash:
+        raise ValueError(f"El cierre de {primer_dia:%m/%Y} está dañado: su contenido no coincide con la huella")
+    return Cierre(
+        mes=cierre.mes,
+        cerrado=cierre.cerrado,
+        hash=cierre.hash,
+        resumen=json.loads(cierre.resumen),
+        tabla=pd.read_parquet(io.BytesIO(cierre.parquet)),
+        html=gzip.decompress(cierre.html).decode("utf-8"),
+    )
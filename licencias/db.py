@@ -0,0 +1,1037 @@
+import datetime as dt
+import json
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+from weakref import WeakKeyDictionary
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import Engine, Index, bindparam, case, event, func, insert, text, update
+from sqlalchemy.engine.default import CacheStats
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Field, create_engine, Session, select
+
+from licencias import metricas
+
+
+# ---------- Config ----------
+def get_app_path():
+    """Obtiene el directorio de la aplicación"""
+    if getattr(sys, 'frozen', False):
+        return Path(sys.executable).parent
+    else:
+        return Path(__file__).resolve().parent.parent
+
+
+def get_data_path():
+    """Obtiene el directorio de datos en AppData para evitar problemas de permisos.
+
+    La variable de entorno LICENCIAS_DATA_DIR permite usar otra carpeta (benchmarks, pruebas).
+    """
+    if os.environ.get('LICENCIAS_DATA_DIR'):
+        data_dir = Path(os.environ['LICENCIAS_DATA_DIR'])
+    elif sys.platform == "win32":
+        data_dir = Path(os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))) / "LicenciasEscolares"
+    else:
+        data_dir = Path.home() / ".licencias_escolares"
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
+DB_PATH = get_data_path() / "licencias.db"
+DB_URL = f"sqlite:///{DB_PATH}"
+engine = create_engine(DB_URL, echo=False)
+
+# Engine a usar en el contexto actual; por defecto, `engine`. Otros servicios (API) lo cambian con usando_engine()
+_engine_actual: ContextVar = ContextVar("engine_actual", default=None)
+
+
+def get_engine():
+    return _engine_actual.get() or engine
+
+
+def seleccionar_engine(otro_engine):
+    """Fija el engine del contexto actual sin restaurarlo (cada sesión de Streamlit corre en su propio hilo)."""
+    _engine_actual.set(otro_engine)
+
+
+@contextmanager
+def usando_engine(otro_engine):
+    """Hace que las funciones de este módulo usen `otro_engine` dentro del bloque."""
+    token = _engine_actual.set(otro_engine)
+    try:
+        yield otro_engine
+    finally:
+        _engine_actual.reset(token)
+
+
+# Con True, los errores que la app muestra con st.error se levantan (la API responde 500 en lugar de datos vacíos)
+_levantar_errores: ContextVar = ContextVar("levantar_errores", default=False)
+
+
+@contextmanager
+def levantando_errores():
+    """Dentro del bloque, mostrar_error() vuelve a levantar la excepción en lugar de mostrarla."""
+    token = _levantar_errores.set(True)
+    try:
+        yield
+    finally:
+        _levantar_errores.reset(token)
+
+
+def mostrar_error(mensaje: str):
+    """Muestra `mensaje` en la app. Se llama desde un except: en levantando_errores() relanza la excepción.
+
+    Streamlit no se importa acá: fuera de la app (API, scripts) el mensaje va a stderr.
+    """
+    if _levantar_errores.get():
+        raise
+    st = sys.modules.get("streamlit")
+    if st is None:
+        print(mensaje, file=sys.stderr)
+    else:
+        st.error(mensaje)
+
+
+# Engine de solo lectura de cada engine de escritura; se descarta junto con este
+_engines_lectura: "WeakKeyDictionary" = WeakKeyDictionary()
+_lock_lectura = threading.Lock()
+
+
+def _solo_lectura(conexion, _registro):
+    conexion.execute("PRAGMA query_only = ON")
+
+
+def get_engine_lectura():
+    """Engine de solo lectura sobre la misma base que get_engine(), con su propio pool.
+
+    Lo usan las búsquedas, los reportes y las exportaciones. Abre el archivo con
+    mode=ro y PRAGMA query_only, así una consulta larga no ocupa conexiones del pool
+    de escritura ni puede escribir por error. Con la base en WAL (ver ensure_wal) las
+    lecturas tampoco frenan los commits. Las bases en memoria usan el mismo engine.
+    """
+    escritor = get_engine()
+    ruta = escritor.url.database
+    if not ruta or ruta == ":memory:" or ruta.startswith("file:"):
+        return escritor
+    with _lock_lectura:
+        lector = _engines_lectura.get(escritor)
+        if lector is None:
+            uri = quote(Path(ruta).resolve().as_posix(), safe="/:")
+            if not uri.startswith("/"):
+                uri = "/" + uri  # Windows: file:/C:/...
+            lector = create_engine(f"sqlite:///file:{uri}?mode=ro&uri=true", echo=False)
+            event.listen(lector, "connect", _solo_lectura)
+            _engines_lectura[escritor] = lector
+    return lector
+
+
+def cerrar_engine_lectura(escritor):
+    """Cierra el pool de lectura de `escritor` (por ejemplo, al descartar el engine de una escuela)."""
+    with _lock_lectura:
+        lector = _engines_lectura.pop(escritor, None)
+    if lector is not None:
+        lector.dispose()
+
+
+# ---------- Modelo ----------
+class Licencia(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_licencia_dni_inicio", "dni", "fecha_inicio"),
+        Index("ix_licencia_fecha_inicio", "fecha_inicio"),
+        # Índice parcial: solo las pendientes, que son pocas aunque el historial sea grande.
+        # estado_carga va en el índice para que pendientes_gei() no tenga que leer la tabla.
+        Index("ix_licencia_pendientes", "fecha_inicio", "estado_carga",
+              sqlite_where=text("estado_carga = 'Pendiente'")),
+        # Búsquedas por prefijo sobre las columnas normalizadas (ver buscar_licencias)
+        Index("ix_licencia_apellido_busqueda", "apellido_busqueda", "nombre_busqueda"),
+        Index("ix_licencia_nombre_busqueda", "nombre_busqueda"),
+        Index("ix_licencia_articulo_busqueda", "articulo_busqueda"),
+        Index("ix_licencia_dni_busqueda", "dni_busqueda"),
+        # Cambios desde la última sincronización (ver licencias.sincronizacion)
+        Index("ix_licencia_modificada", "modificada"),
+        {'extend_existing': True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    apellido: str
+    nombre: str
+    dni: str
+    dni_familiar: Optional[str] = None
+    rol: str
+    fecha_inicio: dt.date
+    fecha_fin: Optional[dt.date] = None
+    articulo: Optional[str] = None
+    codigo_osep: Optional[str] = None
+    estado_carga: str = "Pendiente"
+    fecha_carga_gei: Optional[dt.date] = None
+    documentacion: str = "Pendiente"
+    observaciones: Optional[str] = None
+    fecha_creacion: dt.datetime = Field(default_factory=dt.datetime.now)
+    version: int = 1
+    # Última alta o modificación; marca de agua de la sincronización con el distrito
+    modificada: Optional[dt.datetime] = Field(default_factory=dt.datetime.now)
+    # Copias normalizadas para buscar (ver columnas_busqueda): no se muestran ni se versionan
+    apellido_busqueda: Optional[str] = Field(default=None, exclude=True)
+    nombre_busqueda: Optional[str] = Field(default=None, exclude=True)
+    articulo_busqueda: Optional[str] = Field(default=None, exclude=True)
+    dni_busqueda: Optional[str] = Field(default=None, exclude=True)
+
+
+class CambioLicencia(SQLModel, table=True):
+    """Registro append-only de cambios: una fila por escritura, solo con las columnas modificadas.
+
+    operacion: "alta" y "base" guardan la fila completa, "modificacion" solo las
+    columnas que cambiaron y "baja" la última versión antes de borrarla.
+    """
+    __table_args__ = (
+        Index("ix_cambiolicencia_licencia_fecha", "licencia_id", "fecha"),
+        {'extend_existing': True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    licencia_id: int
+    fecha: dt.datetime = Field(default_factory=dt.datetime.now, index=True)
+    operacion: str
+    cambios: str = "{}"
+
+
+class VersionDatos(SQLModel, table=True):
+    """Contador que solo sube: un trigger lo incrementa con cada entrada nueva del historial.
+
+    No se toma del id del historial porque SQLite reutiliza los ids que se borran
+    (compactar_historial, purgar_licencias) y la versión podría repetir una anterior.
+    Tiene una sola fila (id = 1); ver ensure_version_datos.
+    """
+    __table_args__ = {'extend_existing': True}
+
+    id: int = Field(default=1, primary_key=True)
+    valor: int = 0
+
+
+class BajaLicencia(SQLModel, table=True):
+    """Marca de una licencia eliminada (tombstone): hace llegar la baja a las copias sincronizadas.
+
+    Se guarda una por licencia, con la versión y el momento de la baja. Si la licencia
+    se vuelve a crear con el mismo id (restaurar), su `modificada` posterior le gana a la baja.
+    """
+    __table_args__ = {'extend_existing': True}
+
+    licencia_id: int = Field(primary_key=True)
+    version: int = 1
+    fecha: dt.datetime = Field(default_factory=dt.datetime.now, index=True)
+
+
+class MarcaSincronizacion(SQLModel, table=True):
+    """Hasta qué `modificada` se sincronizó: en la escuela, lo último exportado; en el
+    distrito, lo último recibido de esa escuela."""
+    __table_args__ = {'extend_existing': True}
+
+    clave: str = Field(primary_key=True)
+    marca: dt.datetime
+    actualizada: dt.datetime = Field(default_factory=dt.datetime.now)
+
+
+class AlertaLicencia(SQLModel, table=True):
+    """Par de licencias que se superponen (mismo DNI) o que parecen cargadas dos veces.
+
+    Cada par se guarda una vez, con licencia_id < otra_id. La mantiene licencias.solapamientos.
+    """
+    __table_args__ = {'extend_existing': True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str  # "solapamiento" o "duplicado"
+    licencia_id: int = Field(index=True)
+    otra_id: int = Field(index=True)
+    dni: Optional[str] = None
+    detectada: dt.datetime = Field(default_factory=dt.datetime.now)
+
+
+class DiasLicencia(SQLModel, table=True):
+    """Días de cada licencia cerrada repartidos por mes: agregado para sumar días por persona.
+
+    Lo mantiene licencias.dias en cada escritura; las licencias sin fecha de fin no
+    se guardan (sus días cambian cada día) y se suman al consultar.
+    """
+    __table_args__ = (
+        Index("ix_diaslicencia_dni_anio_mes", "dni", "anio", "mes"),
+        {'extend_existing': True},
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    licencia_id: int = Field(index=True)
+    dni: str
+    articulo: Optional[str] = None
+    anio: int
+    mes: int
+    dias: int
+
+
+class LicenciaVista(NamedTuple):
+    """Copia liviana y desacoplada de la sesión de una licencia, solo para lectura."""
+    id: int
+    apellido: str
+    nombre: str
+    dni: str
+    dni_familiar: Optional[str]
+    rol: str
+    fecha_inicio: dt.date
+    fecha_fin: Optional[dt.date]
+    articulo: Optional[str]
+    codigo_osep: Optional[str]
+    estado_carga: str
+    fecha_carga_gei: Optional[dt.date]
+    documentacion: str
+    observaciones: Optional[str]
+    fecha_creacion: dt.datetime
+    version: int
+
+
+_COLUMNAS_VISTA = [getattr(Licencia, c) for c in LicenciaVista._fields]
+
+# Columna normalizada de búsqueda de cada columna de texto
+COLUMNAS_BUSQUEDA = {
+    "apellido": "apellido_busqueda",
+    "nombre": "nombre_busqueda",
+    "articulo": "articulo_busqueda",
+    "dni": "dni_busqueda",
+}
+
+# Columnas de Licencia que se versionan en el historial (todas salvo el id, la versión de fila,
+# la fecha de modificación y las columnas de búsqueda, que se derivan de otras)
+CAMPOS_HISTORIAL = [c for c in Licencia.model_fields
+                    if c not in ("id", "version", "modificada") and c not in COLUMNAS_BUSQUEDA.values()]
+
+ROLES = ["Docente", "Celador"]
+ESTADOS = ["Pendiente", "Cargada"]
+ESTADOS_DOCUMENTACION = ["Pendiente", "Subida"]
+
+MSG_CONFLICTO = "Otra persona modificó la licencia mientras la editabas"
+
+# Valor de PRAGMA auto_vacuum en modo incremental (ver ensure_auto_vacuum)
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Días antes del vencimiento del plazo de carga en GEI a partir de los que se avisa
+DIAS_AVISO_GEI = 7
+
+# Columnas que, si cambian, obligan a revisar superposiciones y duplicados / recalcular días acumulados
+CAMPOS_ALERTAS = {"apellido", "nombre", "dni", "fecha_inicio", "fecha_fin"}
+CAMPOS_DIAS = {"dni", "articulo", "fecha_inicio", "fecha_fin"}
+
+
+@lru_cache(maxsize=65536)
+def normalizar_texto(texto: Optional[str]) -> str:
+    """'  Núñez  José ' -> 'nunez jose': sin acentos, en minúsculas y con espacios simples.
+
+    Los apellidos y nombres se repiten mucho: el cache evita normalizar cada fila.
+    """
+    sin_acentos = unicodedata.normalize("NFKD", texto or "")
+    sin_acentos = "".join(c for c in sin_acentos if not unicodedata.combining(c))
+    return " ".join(sin_acentos.casefold().split())
+
+
+def normalizar_dni(dni: Optional[str]) -> str:
+    """'20.123.456 ' -> '20123456': solo los dígitos."""
+    return "".join(c for c in dni or "" if c.isdigit())
+
+
+_PREFIJO_ARTICULO = re.compile(r"^art(iculo|\.)?\s*")
+
+
+def normalizar_articulo(articulo: Optional[str]) -> str:
+    """'Art. 40 inc. A' -> '40 inc. a': como normalizar_texto, sin el "art." / "artículo" inicial."""
+    return _PREFIJO_ARTICULO.sub("", normalizar_texto(articulo))
+
+
+def normalizar_busqueda(campo: str, valor: Optional[str]) -> str:
+    """Valor de la columna de búsqueda de `campo` (una clave de COLUMNAS_BUSQUEDA)."""
+    if campo == "dni":
+        return normalizar_dni(valor)
+    if campo == "articulo":
+        return normalizar_articulo(valor)
+    return normalizar_texto(valor)
+
+
+def columnas_busqueda(valores: dict) -> dict:
+    """Valores de las columnas de búsqueda que corresponden a las columnas de texto de `valores`."""
+    return {busqueda: normalizar_busqueda(campo, valores[campo])
+            for campo, busqueda in COLUMNAS_BUSQUEDA.items() if campo in valores}
+
+
+def serializar_cambios(cambios: dict) -> str:
+    """Codifica un dict de columnas como JSON, con las fechas en formato ISO."""
+    return json.dumps(
+        {k: v.isoformat() if isinstance(v, (dt.date, dt.datetime)) else v for k, v in cambios.items()},
+        ensure_ascii=False,
+    )
+
+
+def _snapshot(lic: Licencia) -> dict:
+    return {campo: getattr(lic, campo) for campo in CAMPOS_HISTORIAL}
+
+
+def registrar_cambio(s: Session, licencia_id: int, operacion: str, cambios: dict):
+    """Agrega una entrada al historial dentro de la transacción de la sesión `s`."""
+    s.add(CambioLicencia(
+        licencia_id=licencia_id,
+        operacion=operacion,
+        cambios=serializar_cambios(cambios),
+    ))
+
+
+def ensure_columns():
+    """Asegura que existan las columnas dni, dni_familiar, version, modificada y de búsqueda si la DB es vieja."""
+    try:
+        with get_engine().connect() as conn:
+            # nombre de tabla por defecto en SQLModel = nombre de clase en minúscula
+            cols = {row[1] for row in conn.execute(text("PRAGMA table_info('licencia')"))}
+            if "dni" not in cols:
+                conn.execute(text("ALTER TABLE licencia ADD COLUMN dni TEXT"))
+            if "dni_familiar" not in cols:
+                conn.execute(text("ALTER TABLE licencia ADD COLUMN dni_familiar TEXT"))
+            if "version" not in cols:
+                conn.execute(text("ALTER TABLE licencia ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+            if "modificada" not in cols:
+                # Sin otro dato, la última modificación conocida es el alta
+                conn.execute(text("ALTER TABLE licencia ADD COLUMN modificada DATETIME"))
+                conn.execute(text("UPDATE licencia SET modificada = fecha_creacion"))
+            for columna in COLUMNAS_BUSQUEDA.values():
+                if columna not in cols:
+                    conn.execute(text(f"ALTER TABLE licencia ADD COLUMN {columna} TEXT"))
+            conn.commit()
+    except Exception as e:
+        mostrar_error(f"Error asegurando columnas: {e}")
+
+
+def ensure_historial():
+    """Si el historial está vacío (DB anterior al historial), registra una versión base de cada licencia.
+
+    Como no se conoce la historia previa, la base se fecha en `fecha_creacion`. El
+    INSERT ... SELECT es una sola sentencia: si varias sesiones arrancan a la vez,
+    solo la primera inserta.
+    """
+    try:
+        with get_engine().begin() as conn:
+            if conn.execute(select(CambioLicencia.id).limit(1)).first() is not None:
+                return
+            campos = ", ".join(f"'{c}', {c}" for c in CAMPOS_HISTORIAL)
+            conn.execute(text(
+                "INSERT INTO cambiolicencia (licencia_id, fecha, operacion, cambios) "
+                f"SELECT id, fecha_creacion, 'base', json_object({campos}) FROM licencia "
+                "WHERE NOT EXISTS (SELECT 1 FROM cambiolicencia)"
+            ))
+    except Exception as e:
+        mostrar_error(f"Error inicializando historial: {e}")
+
+
+def ensure_version_datos():
+    """Crea la fila del contador de versión y el trigger que lo sube con cada entrada del historial.
+
+    En bases anteriores al contador arranca en el id más alto del historial, que era
+    la versión que se usaba, así los caches ya armados siguen siendo válidos.
+    """
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(text(
+                "INSERT OR IGNORE INTO versiondatos (id, valor) "
+                "SELECT 1, coalesce(max(id), 0) FROM cambiolicencia"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS tr_cambiolicencia_version AFTER INSERT ON cambiolicencia "
+                "BEGIN UPDATE versiondatos SET valor = valor + 1 WHERE id = 1; END"
+            ))
+    except Exception as e:
+        mostrar_error(f"Error inicializando la versión de los datos: {e}")
+
+
+def ensure_busqueda(tamanio: int = 5000) -> int:
+    """Completa las columnas de búsqueda de las filas que no las tienen (bases anteriores o
+    cargas masivas que no pasan por crear_licencia). Devuelve las filas completadas.
+
+    Avanza por lotes de id crecientes, así cada lote es una búsqueda por rango de clave
+    y la memoria no depende del tamaño de la tabla.
+    """
+    campos = [getattr(Licencia, c) for c in COLUMNAS_BUSQUEDA]
+    completar = update(Licencia).where(Licencia.id == bindparam("id_")).values(
+        {c: bindparam(f"nuevo_{c}") for c in COLUMNAS_BUSQUEDA.values()})
+    total, ultimo = 0, 0
+    try:
+        with get_engine().begin() as conn:
+            while True:
+                lote = conn.execute(
+                    select(Licencia.id, *campos)
+                    .where(Licencia.id > ultimo, Licencia.apellido_busqueda.is_(None))
+                    .order_by(Licencia.id).limit(tamanio)
+                ).all()
+                if not lote:
+                    break
+                conn.execute(completar, [
+                    {f"nuevo_{c}": v for c, v in columnas_busqueda(dict(zip(COLUMNAS_BUSQUEDA, valores))).items()}
+                    | {"id_": id_}
+                    for id_, *valores in lote
+                ])
+                total += len(lote)
+                ultimo = lote[-1][0]
+    except Exception as e:
+        mostrar_error(f"Error completando columnas de búsqueda: {e}")
+    return total
+
+
+def ensure_indices():
+    """Crea en bases viejas los índices que create_all solo agrega al crear la tabla."""
+    try:
+        with get_engine().begin() as conn:
+            for indice in Licencia.__table__.indexes:
+                indice.create(conn, checkfirst=True)
+    except Exception as e:
+        mostrar_error(f"Error creando índices: {e}")
+
+
+def ensure_wal():
+    """Pasa la base a modo WAL (queda guardado en el archivo): las lecturas largas, como
+    una exportación, no bloquean los commits y los commits no bloquean las lecturas."""
+    try:
+        with get_engine().connect() as conn:
+            if conn.execute(text("PRAGMA journal_mode")).scalar() != "wal":
+                conn.execute(text("PRAGMA journal_mode = WAL"))
+    except Exception as e:
+        mostrar_error(f"Error activando WAL: {e}")
+
+
+def ensure_auto_vacuum():
+    """Pide auto_vacuum=INCREMENTAL (queda guardado en el archivo): el espacio de lo que se
+    borra queda en una lista de páginas libres y licencias.mantenimiento lo devuelve al
+    disco con incremental_vacuum.
+
+    En una base nueva (sin tablas) alcanza con el PRAGMA, que no cuesta nada. Una base
+    vieja además necesita un VACUUM que reescribe el archivo: no se hace acá, en cada
+    carga de la página, sino una sola vez en el mantenimiento diario
+    (mantenimiento.activar_auto_vacuum).
+    """
+    try:
+        with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+    except Exception as e:
+        mostrar_error(f"Error activando auto_vacuum: {e}")
+
+
+def init_db():
+    try:
+        ensure_auto_vacuum()
+        ensure_wal()
+        # Imports diferidos: registran sus tablas (CierreMes, Trabajo) y usan este módulo
+        import licencias.cierres  # noqa: F401
+        import licencias.trabajos  # noqa: F401
+        SQLModel.metadata.create_all(get_engine())
+        ensure_columns()
+        ensure_busqueda()
+        ensure_indices()
+        ensure_version_datos()
+        ensure_historial()
+        # Import diferido: licencias.dias usa este módulo
+        from licencias.dias import ensure_dias
+        ensure_dias()
+        return True
+    except Exception as e:
+        mostrar_error(f"Error al inicializar la base de datos: {e}")
+        return False
+
+
+def crear_licencia(**kwargs):
+    try:
+        with Session(get_engine()) as s:
+            lic = Licencia(**kwargs)
+            for columna, valor in columnas_busqueda(_snapshot(lic)).items():
+                setattr(lic, columna, valor)
+            s.add(lic)
+            s.flush()
+            registrar_cambio(s, lic.id, "alta", _snapshot(lic))
+            s.commit()
+            s.refresh(lic)
+        _al_escribir(lic.id)
+        return lic, None
+    except Exception as e:
+        return None, str(e)
+
+
+def _al_escribir(id_: int, campos: Optional[set] = None):
+    """Mantiene las tablas derivadas (alertas y días acumulados) de la licencia `id_`.
+
+    `campos` son las columnas modificadas; None en altas y bajas.
+    """
+    # Imports diferidos: esos módulos usan este
+    from licencias.dias import actualizar_dias
+    from licencias.solapamientos import revisar_licencia
+    if campos is None or CAMPOS_ALERTAS & campos:
+        revisar_licencia(id_)
+    if campos is None or CAMPOS_DIAS & campos:
+        actualizar_dias(id_)
+
+
+def actualizar_columnas(id_: int, valores: dict, version_esperada: Optional[int] = None, condiciones=()) -> int:
+    """Escribe `valores` con un único UPDATE (sin cargar la fila) y devuelve las filas afectadas.
+
+    Solo se aceptan columnas de CAMPOS_HISTORIAL; cualquier otra lanza ValueError.
+    `version_esperada` y `condiciones` (expresiones extra del WHERE) hacen que el
+    UPDATE no afecte ninguna fila si no se cumplen. El cambio queda en el historial
+    dentro de la misma transacción.
+    """
+    no_permitidas = set(valores) - set(CAMPOS_HISTORIAL)
+    if no_permitidas:
+        raise ValueError(f"Columnas no permitidas: {', '.join(sorted(no_permitidas))}")
+
+    q = update(Licencia).where(Licencia.id == id_, *condiciones)
+    if version_esperada is not None:
+        q = q.where(Licencia.version == version_esperada)
+
+    with get_engine().begin() as conn:
+        filas = conn.execute(q.values(**valores, **columnas_busqueda(valores), version=Licencia.version + 1,
+                                      modificada=dt.datetime.now())).rowcount
+        if filas:
+            conn.execute(insert(CambioLicencia).values(
+                licencia_id=id_,
+                fecha=dt.datetime.now(),
+                operacion="modificacion",
+                cambios=serializar_cambios(valores),
+            ))
+    return filas
+
+
+def _version_actual(id_: int) -> Optional[int]:
+    with get_engine().connect() as conn:
+        return conn.execute(select(Licencia.version).where(Licencia.id == id_)).scalar()
+
+
+def actualizar_licencia(id_: int, version_esperada: Optional[int] = None, **kwargs):
+    """Actualiza las columnas indicadas con control de concurrencia optimista.
+
+    Si se pasa `version_esperada` (la versión que tenía la licencia al abrirla para
+    editar) y otra persona la modificó después, no se guarda nada y se devuelve
+    `MSG_CONFLICTO`. No se mantiene ningún lock entre interacciones.
+    """
+    try:
+        valores = {k: v for k, v in kwargs.items() if k in CAMPOS_HISTORIAL}
+        if valores and actualizar_columnas(id_, valores, version_esperada):
+            _al_escribir(id_, set(valores))
+            return True, "Licencia actualizada correctamente"
+
+        version = _version_actual(id_)
+        if version is None:
+            return False, "Licencia no encontrada"
+        if version_esperada is not None and version != version_esperada:
+            return False, MSG_CONFLICTO
+        return True, "Licencia actualizada correctamente"
+    except Exception as e:
+        return False, str(e)
+
+
+def eliminar_licencia(id_: int):
+    try:
+        with Session(get_engine()) as s:
+            lic = s.get(Licencia, id_)
+            if not lic:
+                return False, "Licencia no encontrada"
+            registrar_cambio(s, id_, "baja", _snapshot(lic))
+            s.merge(BajaLicencia(licencia_id=id_, version=lic.version))
+            s.delete(lic)
+            s.commit()
+        _al_escribir(id_)
+        return True, "Licencia eliminada correctamente"
+    except Exception as e:
+        return False, str(e)
+
+
+# Filtros de buscar_licencias; el bit i de la máscara indica si FILTROS_BUSQUEDA[i] está activo
+FILTROS_BUSQUEDA = ("apellido", "nombre", "dni", "articulo", "rol", "estado", "estado_doc", "f_ini", "f_fin", "limite")
+
+# Instrucciones de SQLite entre cada consulta a `cancelada` en una búsqueda cancelable,
+# y filas que se convierten en objetos entre una consulta y otra
+PASOS_CANCELACION = 10_000
+FILAS_CANCELACION = 2000
+
+# Aciertos y fallos del cache de sentencias compiladas de SQLAlchemy (todos los engines del proceso)
+_cache_compilacion = Counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _contar_cache_compilacion(conn, cursor, sentencia, parametros, contexto, varias):
+    if contexto is not None:
+        _cache_compilacion[contexto.cache_hit] += 1
+
+
+@lru_cache(maxsize=None)
+def _forma_busqueda(mascara: int) -> str:
+    """Filtros activos en una máscara, como etiqueta de las métricas ("apellido+rol")."""
+    return "+".join(f for i, f in enumerate(FILTROS_BUSQUEDA) if mascara & (1 << i)) or "sin_filtros"
+
+
+@lru_cache(maxsize=None)
+def _consulta_busqueda(mascara: int):
+    """Sentencia parametrizada de buscar_licencias para una combinación de filtros.
+
+    Hay como mucho 2**len(FILTROS_BUSQUEDA) formas y cada una se arma una sola vez;
+    los valores van como parámetros, así SQLAlchemy reutiliza también la compilación.
+    Los prefijos se comparan como rango [desde, hasta) para que SQLite use el índice
+    (LIKE no lo usa: compara sin distinguir mayúsculas).
+    """
+    activos = {f for i, f in enumerate(FILTROS_BUSQUEDA) if mascara & (1 << i)}
+    q = select(Licencia)
+    for campo, busqueda in COLUMNAS_BUSQUEDA.items():
+        if campo in activos:
+            columna = getattr(Licencia, busqueda)
+            q = q.where(columna >= bindparam(f"{campo}_desde"), columna < bindparam(f"{campo}_hasta"))
+    if "rol" in activos:
+        q = q.where(Licencia.rol == bindparam("rol"))
+    if "estado" in activos:
+        q = q.where(Licencia.estado_carga == bindparam("estado"))
+    if "estado_doc" in activos:
+        q = q.where(Licencia.documentacion == bindparam("estado_doc"))
+    if "f_ini" in activos:
+        q = q.where(Licencia.fecha_inicio >= bindparam("f_ini"))
+    if "f_fin" in activos:
+        q = q.where(Licencia.fecha_fin <= bindparam("f_fin"))
+    q = q.order_by(Licencia.id.desc())
+    if "limite" in activos:
+        q = q.limit(bindparam("limite")).offset(bindparam("desplazamiento"))
+    return q
+
+
+def estadisticas_consultas() -> dict:
+    """Uso de los caches de consultas: formas de búsqueda armadas y compilaciones reutilizadas."""
+    formas = _consulta_busqueda.cache_info()
+    return {
+        "formas_busqueda": formas.currsize,
+        "formas_aciertos": formas.hits,
+        "formas_fallos": formas.misses,
+        "compilacion_aciertos": _cache_compilacion[CacheStats.CACHE_HIT],
+        "compilacion_fallos": _cache_compilacion[CacheStats.CACHE_MISS],
+        "compilacion_sin_cache": (_cache_compilacion[CacheStats.CACHING_DISABLED]
+                                  + _cache_compilacion[CacheStats.NO_CACHE_KEY]
+                                  + _cache_compilacion[CacheStats.NO_DIALECT_SUPPORT]),
+    }
+
+
+def _parametros_busqueda(
+        apellido: str = "",
+        nombre: str = "",
+        rol: Optional[str] = None,
+        estado: Optional[str] = None,
+        estado_doc: Optional[str] = None,
+        f_ini: Optional[dt.date] = None,
+        f_fin: Optional[dt.date] = None,
+        articulo: str = "",
+        limite: Optional[int] = None,
+        desplazamiento: int = 0,
+        dni: str = "",
+) -> Tuple[int, dict]:
+    """Máscara de filtros activos (ver _consulta_busqueda) y valores de sus parámetros."""
+    activos, parametros = set(), {}
+    for campo, valor in (("apellido", apellido), ("nombre", nombre), ("dni", dni), ("articulo", articulo)):
+        prefijo = normalizar_busqueda(campo, valor)
+        if prefijo:
+            activos.add(campo)
+            parametros[f"{campo}_desde"], parametros[f"{campo}_hasta"] = prefijo, prefijo + "\U0010ffff"
+    for campo, valor in (("rol", rol), ("estado", estado), ("estado_doc", estado_doc)):
+        if valor and valor != "Todos":
+            activos.add(campo)
+            parametros[campo] = valor
+    for campo, valor in (("f_ini", f_ini), ("f_fin", f_fin)):
+        if valor:
+            activos.add(campo)
+            parametros[campo] = valor
+    if limite is not None:
+        activos.add("limite")
+        parametros["limite"], parametros["desplazamiento"] = limite, desplazamiento
+    return sum(1 << i for i, f in enumerate(FILTROS_BUSQUEDA) if f in activos), parametros
+
+
+class BusquedaCancelada(Exception):
+    """La búsqueda se interrumpió porque `cancelada()` pasó a ser verdadera (ver buscar_licencias)."""
+
+
+@contextmanager
+def _cancelable(s: Session, cancelada: Optional[Callable[[], bool]]):
+    """Interrumpe la consulta en curso de `s` apenas `cancelada()` devuelve verdadero.
+
+    SQLite llama al progress handler cada PASOS_CANCELACION instrucciones mientras
+    ejecuta; si devuelve verdadero, corta la consulta con "interrupted". El handler se
+    quita al salir porque la conexión vuelve al pool. Si se cancela cuando SQLite ya
+    terminó, igual se levanta BusquedaCancelada al salir.
+    """
+    if cancelada is None:
+        yield
+        return
+    crudo = s.connection().connection.dbapi_connection
+    crudo.set_progress_handler(cancelada, PASOS_CANCELACION)
+    try:
+        yield
+    except OperationalError as e:
+        if cancelada():
+            raise BusquedaCancelada() from e
+        raise
+    finally:
+        crudo.set_progress_handler(None, PASOS_CANCELACION)
+    if cancelada():
+        raise BusquedaCancelada()
+
+
+def buscar_licencias(
+        apellido: str = "",
+        nombre: str = "",
+        rol: Optional[str] = None,
+        estado: Optional[str] = None,
+        estado_doc: Optional[str] = None,
+        f_ini: Optional[dt.date] = None,
+        f_fin: Optional[dt.date] = None,
+        articulo: str = "",
+        limite: Optional[int] = None,
+        desplazamiento: int = 0,
+        dni: str = "",
+        cancelada: Optional[Callable[[], bool]] = None,
+):
+    """Licencias que cumplen todos los filtros, de la más nueva a la más vieja.
+
+    Apellido, nombre, DNI y artículo se comparan por prefijo contra las columnas de
+    búsqueda, sin acentos ni mayúsculas ("munoz" encuentra "MUÑOZ", "40" encuentra
+    "Art. 40 inc. A"; en el DNI solo cuentan los dígitos).
+
+    Si se pasa `cancelada`, la consulta se interrumpe en cuanto devuelva verdadero y
+    se levanta BusquedaCancelada (ver licencias.busqueda_en_vivo).
+    """
+    mascara, parametros = _parametros_busqueda(
+        apellido, nombre, rol, estado, estado_doc, f_ini, f_fin, articulo, limite, desplazamiento, dni)
+    inicio = time.perf_counter()
+    try:
+        with Session(get_engine_lectura()) as s:
+            if cancelada is None:
+                filas = s.exec(_consulta_busqueda(mascara), params=parametros).all()
+            else:
+                with _cancelable(s, cancelada):
+                    # De a lotes: armar los objetos también lleva tiempo y se corta entre un lote y otro
+                    resultado = s.exec(_consulta_busqueda(mascara), params=parametros,
+                                       execution_options={"yield_per": FILAS_CANCELACION})
+                    filas = []
+                    for lote in resultado.partitions():
+                        if cancelada():
+                            raise BusquedaCancelada()
+                        filas.extend(lote)
+    except BusquedaCancelada:
+        raise
+    except Exception as e:
+        mostrar_error(f"Error al buscar licencias: {e}")
+        return []
+    metricas.observar_consulta("buscar_licencias", time.perf_counter() - inicio, len(filas),
+                               forma=_forma_busqueda(mascara))
+    return filas
+
+
+def lotes_busqueda(tamanio: int = 1000, **filtros) -> Iterator[list]:
+    """Resultado de buscar_licencias(**filtros) de a `tamanio` filas, sin cargarlo entero.
+
+    Devuelve filas de columnas (no objetos Licencia): el cursor de SQLite se lee con
+    fetchmany a medida que se consumen los lotes, así la memoria no crece con el
+    resultado. La lectura queda abierta hasta terminar de recorrerlo.
+    """
+    mascara, parametros = _parametros_busqueda(**filtros)
+    with get_engine_lectura().connect() as conn:
+        resultado = conn.execution_options(yield_per=tamanio).execute(_consulta_busqueda(mascara), parametros)
+        while lote := resultado.fetchmany(tamanio):
+            yield lote
+
+
+def marcar_cargada(id_: int, fecha_carga: Optional[dt.date] = None):
+    """Marca una licencia como cargada con la fecha especificada"""
+    # Import diferido: licencias.calidad usa este módulo
+    from licencias.calidad import condicion
+    if fecha_carga is None:
+        fecha_carga = dt.date.today()
+
+    try:
+        # La validación de fechas va en el WHERE: un solo UPDATE en el caso normal
+        if actualizar_columnas(
+            id_,
+            {"estado_carga": "Cargada", "fecha_carga_gei": fecha_carga},
+            condiciones=(condicion("carga_gei_antes_de_inicio", fecha_carga_gei=fecha_carga),),
+        ):
+            return True, "Licencia actualizada correctamente"
+
+        with Session(get_engine()) as s:
+            lic = s.get(Licencia, id_)
+            if not lic:
+                return False, "No se encontró la licencia"
+            return False, f"La fecha de carga GEI ({fecha_carga:%d/%m/%Y}) no puede ser anterior a la fecha de inicio de la licencia ({lic.fecha_inicio:%d/%m/%Y})"
+    except Exception as e:
+        return False, f"Error al marcar como cargada: {e}"
+
+
+def actualizar_estado_lote(ids: List[int], estado: str, fecha_carga: Optional[dt.date] = None) -> List[int]:
+    """Cambia el estado de carga de varias licencias en una sola transacción.
+
+    Para "Cargada" se aplica la misma regla que en marcar_cargada (la fecha de carga
+    no puede ser anterior al inicio); las que no la cumplen o no existen se omiten.
+    Devuelve los ids efectivamente actualizados.
+    """
+    from licencias.calidad import condicion
+    if estado == "Cargada":
+        valores = {"estado_carga": "Cargada", "fecha_carga_gei": fecha_carga or dt.date.today()}
+        condiciones = (condicion("carga_gei_antes_de_inicio", fecha_carga_gei=valores["fecha_carga_gei"]),)
+    else:
+        valores = {"estado_carga": estado, "fecha_carga_gei": None}
+        condiciones = ()
+
+    with get_engine().begin() as conn:
+        actualizados = conn.execute(
+            update(Licencia)
+            .where(Licencia.id.in_(ids), *condiciones)
+            .values(**valores, version=Licencia.version + 1, modificada=dt.datetime.now())
+            .returning(Licencia.id)
+        ).scalars().all()
+        if actualizados:
+            ahora = dt.datetime.now()
+            conn.execute(insert(CambioLicencia), [
+                {"licencia_id": id_, "fecha": ahora, "operacion": "modificacion",
+                 "cambios": serializar_cambios(valores)}
+                for id_ in actualizados
+            ])
+    return sorted(actualizados)
+
+
+def marcar_documentacion_subida(id_: int):
+    """Marca la documentación como subida"""
+    try:
+        if actualizar_columnas(id_, {"documentacion": "Subida"}):
+            return True, "Licencia actualizada correctamente"
+        return False, "Licencia no encontrada"
+    except Exception as e:
+        return False, str(e)
+
+
+def obtener_licencia(id_: int) -> Optional[LicenciaVista]:
+    try:
+        with get_engine().connect() as conn:
+            fila = conn.execute(select(*_COLUMNAS_VISTA).where(Licencia.id == id_)).first()
+            return LicenciaVista(*fila) if fila else None
+    except Exception as e:
+        mostrar_error(f"Error al obtener licencia: {e}")
+        return None
+
+
+def rango_mes(fecha: dt.date):
+    """Devuelve (primer_dia, ultimo_dia) del mes de `fecha`."""
+    primer_dia = dt.date(fecha.year, fecha.month, 1)
+    proximo_mes = primer_dia + relativedelta(months=1)
+    return primer_dia, proximo_mes - dt.timedelta(days=1)
+
+
+def _consulta_mes(fecha: dt.date):
+    primer_dia, ultimo_dia = rango_mes(fecha)
+    q = select(Licencia)
+    q = q.where(Licencia.fecha_inicio >= primer_dia)
+    q = q.where(Licencia.fecha_inicio <= ultimo_dia)
+    return q.order_by(Licencia.fecha_inicio, Licencia.apellido, Licencia.nombre)
+
+
+@metricas.consulta
+def licencias_del_mes(fecha: dt.date) -> List[Licencia]:
+    """Licencias que empiezan en el mes de `fecha`, en el orden del reporte mensual."""
+    with Session(get_engine_lectura()) as s:
+        return s.exec(_consulta_mes(fecha)).all()
+
+
+def lotes_del_mes(fecha: dt.date, tamanio: int = 500) -> Iterator[List[Licencia]]:
+    """Igual que licencias_del_mes, pero de a `tamanio` filas: la memoria no crece con el mes."""
+    with Session(get_engine_lectura()) as s:
+        resultado = s.exec(_consulta_mes(fecha).execution_options(yield_per=tamanio))
+        for lote in resultado.partitions(tamanio):
+            yield list(lote)
+
+
+@metricas.consulta
+def resumen_mensual(fecha: dt.date) -> dict:
+    """Totales del reporte mensual calculados en SQL, sin traer las filas."""
+    primer_dia, ultimo_dia = rango_mes(fecha)
+    q = select(
+        func.count(),
+        func.sum(case((Licencia.estado_carga == "Cargada", 1), else_=0)),
+        func.sum(case((Licencia.estado_carga == "Pendiente", 1), else_=0)),
+        func.sum(case((Licencia.rol == "Docente", 1), else_=0)),
+        func.sum(case((Licencia.rol == "Celador", 1), else_=0)),
+    ).where(Licencia.fecha_inicio >= primer_dia, Licencia.fecha_inicio <= ultimo_dia)
+    with get_engine_lectura().connect() as conn:
+        total, cargadas, pendientes, docentes, celadores = conn.execute(q).one()
+    return {
+        "desde": primer_dia,
+        "hasta": ultimo_dia,
+        "total": total,
+        "cargadas": cargadas or 0,
+        "pendientes": pendientes or 0,
+        "docentes": docentes or 0,
+        "celadores": celadores or 0,
+    }
+
+
+def _limite_aviso_gei(hoy: dt.date, dias_aviso: int) -> dt.date:
+    """Último día del último mes cuyo plazo (su último día) ya venció o vence en `dias_aviso` días."""
+    primer_dia, ultimo_dia = rango_mes(hoy + dt.timedelta(days=dias_aviso))
+    return ultimo_dia if ultimo_dia <= hoy + dt.timedelta(days=dias_aviso) else primer_dia - dt.timedelta(days=1)
+
+
+@metricas.consulta
+def pendientes_gei(hoy: Optional[dt.date] = None, dias_aviso: int = DIAS_AVISO_GEI) -> List[dict]:
+    """Meses con licencias pendientes de cargar en GEI cuyo plazo venció o está por vencer.
+
+    El plazo de una licencia es el último día del mes en que empieza. Lee solo el
+    índice parcial de pendientes (fecha_inicio WHERE estado_carga = 'Pendiente'), sin
+    tocar la tabla. Devuelve dicts {mes, plazo, pendientes, dias_restantes} del más
+    viejo al más nuevo; dias_restantes es negativo si el plazo ya venció.
+    """
+    hoy = hoy or dt.date.today()
+    q = (
+        select(Licencia.fecha_inicio)
+        .where(text("estado_carga = 'Pendiente'"), Licencia.fecha_inicio <= _limite_aviso_gei(hoy, dias_aviso))
+        .order_by(Licencia.fecha_inicio)
+    )
+    meses: List[dict] = []
+    with get_engine().connect() as conn:
+        for (inicio,) in conn.execute(q):
+            mes = dt.date(inicio.year, inicio.month, 1)
+            if not meses or meses[-1]["mes"] != mes:
+                plazo = rango_mes(mes)[1]
+                meses.append({"mes": mes, "plazo": plazo, "pendientes": 0, "dias_restantes": (plazo - hoy).days})
+            meses[-1]["pendientes"] += 1
+    return meses
+
+
+@metricas.consulta
+def licencias_pendientes_gei(hoy: Optional[dt.date] = None, dias_aviso: int = DIAS_AVISO_GEI,
+                             limite: int = 200) -> List[LicenciaVista]:
+    """Las licencias de pendientes_gei(), de la más vieja a la más nueva (como mucho `limite`)."""
+    hoy = hoy or dt.date.today()
+    q = (
+        select(*_COLUMNAS_VISTA)
+        .where(text("estado_carga = 'Pendiente'"), Licencia.fecha_inicio <= _limite_aviso_gei(hoy, dias_aviso))
+        .order_by(Licencia.fecha_inicio)
+        .limit(limite)
+    )
+    with get_engine().connect() as conn:
+        return [LicenciaVista(*fila) for fila in conn.execute(q)]
+
+
+def version_datos() -> int:
+    """Número que crece con cada alta, modificación o baja (ver VersionDatos); nunca vuelve atrás.
+
+    Sirve como clave de cache: si no cambió, ningún dato de licencias cambió.
+    """
+    with get_engine().connect() as conn:
+        return conn.execute(select(VersionDatos.valor).where(VersionDatos.id == 1)).scalar() or 0
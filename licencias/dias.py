@@ -0,0 +1,139 @@
+"""Días de licencia acumulados por persona (DNI), por artículo y por año calendario o escolar.
+
+Los días de cada licencia cerrada se guardan repartidos por mes en la tabla
+`diaslicencia`, que se actualiza en cada alta, modificación o baja (licencias.db
+llama a actualizar_dias). Así, sumar los días de una persona lee unas pocas filas
+ya calculadas en lugar de recorrer sus licencias. Las licencias sin fecha de fin
+no se guardan: se cuentan hasta hoy al momento de consultar.
+
+Los días son corridos e incluyen el primero y el último.
+"""
+import datetime as dt
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import case, delete, func, insert
+from sqlmodel import Session, select
+
+from licencias.db import DiasLicencia, Licencia, get_engine, mostrar_error
+
+# El ciclo lectivo se cuenta desde el 1° de marzo: el año escolar 2024 va de 03/2024 a 02/2025
+MES_INICIO_CICLO_LECTIVO = 3
+PERIODOS = ["calendario", "escolar"]
+SIN_ARTICULO = "(Sin artículo)"
+FILAS_POR_LOTE = 5000
+
+
+def dias_por_mes(inicio: dt.date, fin: dt.date) -> Iterator[Tuple[int, int, int]]:
+    """Reparte [inicio, fin] en (anio, mes, dias) para cada mes que toca."""
+    desde = inicio
+    while desde <= fin:
+        fin_de_mes = dt.date(desde.year, desde.month, 1) + relativedelta(months=1) - dt.timedelta(days=1)
+        hasta = min(fin, fin_de_mes)
+        yield desde.year, desde.month, (hasta - desde).days + 1
+        desde = hasta + dt.timedelta(days=1)
+
+
+def _filas(id_: int, dni: Optional[str], articulo: Optional[str], inicio: dt.date,
+           fin: Optional[dt.date]) -> List[dict]:
+    if not dni or fin is None:
+        return []
+    return [{"licencia_id": id_, "dni": dni, "articulo": articulo, "anio": anio, "mes": mes, "dias": dias}
+            for anio, mes, dias in dias_por_mes(inicio, fin)]
+
+
+_COLUMNAS = (Licencia.id, Licencia.dni, Licencia.articulo, Licencia.fecha_inicio, Licencia.fecha_fin)
+
+
+def actualizar_dias(id_: int):
+    """Recalcula las filas del agregado de una licencia (o las borra si ya no existe)."""
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(delete(DiasLicencia).where(DiasLicencia.licencia_id == id_))
+            lic = conn.execute(select(*_COLUMNAS).where(Licencia.id == id_)).first()
+            filas = _filas(*lic) if lic else []
+            if filas:
+                conn.execute(insert(DiasLicencia), filas)
+    except Exception as e:
+        mostrar_error(f"Error actualizando días acumulados: {e}")
+
+
+def reconstruir_dias() -> int:
+    """Vuelve a armar todo el agregado desde las licencias. Devuelve las filas generadas."""
+    total = 0
+    with get_engine().begin() as conn:
+        conn.execute(delete(DiasLicencia))
+        resultado = conn.execution_options(yield_per=FILAS_POR_LOTE).execute(
+            select(*_COLUMNAS).where(Licencia.fecha_fin.is_not(None))
+        )
+        for lote in resultado.partitions(FILAS_POR_LOTE):
+            filas = [f for lic in lote for f in _filas(*lic)]
+            if filas:
+                conn.execute(insert(DiasLicencia), filas)
+                total += len(filas)
+    return total
+
+
+def ensure_dias():
+    """Arma el agregado si está vacío y hay licencias cerradas (base anterior a esta tabla)."""
+    try:
+        with get_engine().connect() as conn:
+            if conn.execute(select(DiasLicencia.id).limit(1)).first() is not None:
+                return
+            if conn.execute(select(Licencia.id).where(Licencia.fecha_fin.is_not(None)).limit(1)).first() is None:
+                return
+        reconstruir_dias()
+    except Exception as e:
+        mostrar_error(f"Error inicializando días acumulados: {e}")
+
+
+def _anio_del_periodo(anio: int, mes: int, periodo: str) -> int:
+    if periodo == "escolar" and mes < MES_INICIO_CICLO_LECTIVO:
+        return anio - 1
+    return anio
+
+
+def dias_acumulados(dni: str, periodo: str = "calendario", hoy: Optional[dt.date] = None) -> List[dict]:
+    """Días de licencia de una persona por año (calendario o escolar) y artículo.
+
+    Devuelve dicts {anio, articulo, dias} ordenados por año y artículo. Las licencias
+    sin fecha de fin se cuentan hasta `hoy` (por defecto, la fecha actual).
+    """
+    if periodo not in PERIODOS:
+        raise ValueError(f"periodo debe ser uno de: {', '.join(PERIODOS)}")
+    hoy = hoy or dt.date.today()
+
+    if periodo == "escolar":
+        anio = case((DiasLicencia.mes < MES_INICIO_CICLO_LECTIVO, DiasLicencia.anio - 1), else_=DiasLicencia.anio)
+    else:
+        anio = DiasLicencia.anio
+    totales: Dict[Tuple[int, Optional[str]], int] = {}
+    with get_engine().connect() as conn:
+        q = (
+            select(anio, DiasLicencia.articulo, func.sum(DiasLicencia.dias))
+            .where(DiasLicencia.dni == dni)
+            .group_by(anio, DiasLicencia.articulo)
+        )
+        for anio_periodo, articulo, dias in conn.execute(q):
+            totales[(anio_periodo, articulo)] = dias
+
+        abiertas = conn.execute(
+            select(Licencia.articulo, Licencia.fecha_inicio)
+            .where(Licencia.dni == dni, Licencia.fecha_fin.is_(None), Licencia.fecha_inicio <= hoy)
+        )
+        for articulo, inicio in abiertas:
+            for anio_mes, mes, dias in dias_por_mes(inicio, hoy):
+                clave = (_anio_del_periodo(anio_mes, mes, periodo), articulo)
+                totales[clave] = totales.get(clave, 0) + dias
+
+    return [
+        {"anio": anio_periodo, "articulo": articulo or SIN_ARTICULO, "dias": dias}
+        for (anio_periodo, articulo), dias in sorted(totales.items(), key=lambda t: (t[0][0], t[0][1] or ""))
+    ]
+
+
+def licencias_de_persona(dni: str) -> List[Licencia]:
+    """Todas las licencias de un DNI, de la más reciente a la más antigua (usa el índice por DNI)."""
+    with Session(get_engine()) as s:
+        q = select(Licencia).where(Licencia.dni == dni).order_by(Licencia.fecha_inicio.desc())
+        return s.exec(q).all()
@@ -0,0 +1,139 @@
+"""Varias escuelas en un mismo servidor: una base SQLite por escuela y un resumen por distrito."""
+import datetime as dt
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from sqlmodel import create_engine
+
+from licencias import db
+
+DIR_ESCUELAS = db.get_data_path() / "escuelas"
+
+# Máximo de engines (y pools de conexiones) abiertos a la vez
+MAX_ENGINES_ABIERTOS = 32
+
+_CODIGO_VALIDO = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+
+
+def ruta_escuela(codigo: str):
+    if not _CODIGO_VALIDO.match(codigo):
+        raise ValueError("El código de escuela solo puede tener minúsculas, números, '-' y '_' (hasta 40)")
+    return DIR_ESCUELAS / f"{codigo}.db"
+
+
+class EscuelaInexistente(LookupError):
+    """Se pidió una escuela que no tiene base en este servidor (y no se pidió crearla)."""
+
+
+def listar_escuelas() -> List[str]:
+    if not DIR_ESCUELAS.exists():
+        return []
+    return sorted(p.stem for p in DIR_ESCUELAS.glob("*.db"))
+
+
+class CacheEngines:
+    """Engines por escuela con tope LRU: al pasar `maximo` se cierra el pool del menos usado.
+
+    Un engine se guarda recién después de correr init_db sobre su base: mientras se
+    inicializa, los demás pedidos de la misma escuela esperan en el lock de esa
+    escuela (los de otras escuelas siguen de largo).
+
+    Solo crea el archivo de una escuela nueva con `crear=True`; si no, una escuela
+    sin base lanza EscuelaInexistente (un código mal escrito no deja una base vacía).
+    """
+
+    def __init__(self, maximo: int = MAX_ENGINES_ABIERTOS):
+        self.maximo = maximo
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+        self._iniciando: Dict[str, threading.Lock] = {}
+
+    def _en_cache(self, codigo: str):
+        with self._lock:
+            engine = self._engines.get(codigo)
+            if engine is not None:
+                self._engines.move_to_end(codigo)
+            return engine
+
+    def obtener(self, codigo: str, crear: bool = False):
+        ruta = ruta_escuela(codigo)
+        engine = self._en_cache(codigo)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            iniciando = self._iniciando.setdefault(codigo, threading.Lock())
+        with iniciando:
+            # Otro pedido pudo haberla inicializado mientras se esperaba el lock
+            engine = self._en_cache(codigo)
+            if engine is not None:
+                return engine
+            if not crear and not ruta.is_file():
+                raise EscuelaInexistente(codigo)
+            engine = create_engine(f"sqlite:///{ruta}", echo=False)
+            with db.usando_engine(engine):
+                if not db.init_db():
+                    # Sin guardarlo: el próximo pedido vuelve a intentar la inicialización
+                    return engine
+            with self._lock:
+                self._engines[codigo] = engine
+                while len(self._engines) > self.maximo:
+                    _, descartado = self._engines.popitem(last=False)
+                    # Las conexiones en uso siguen funcionando; el pool se rearma si se vuelve a usar
+                    descartado.dispose()
+                    db.cerrar_engine_lectura(descartado)
+        return engine
+
+    def __len__(self):
+        return len(self._engines)
+
+
+engines = CacheEngines()
+
+
+def crear_escuela(codigo: str):
+    """Crea la base vacía de una escuela nueva."""
+    try:
+        ruta = ruta_escuela(codigo)
+    except ValueError as e:
+        return False, str(e)
+    if ruta.exists():
+        return False, f"La escuela '{codigo}' ya existe"
+    DIR_ESCUELAS.mkdir(parents=True, exist_ok=True)
+    engines.obtener(codigo, crear=True)
+    return True, f"Escuela '{codigo}' creada"
+
+
+def _resumen_escuela(codigo: str, fecha: dt.date) -> dict:
+    with db.usando_engine(engines.obtener(codigo)):
+        return db.resumen_mensual(fecha)
+
+
+def resumen_distrito(fecha: dt.date, hilos: int = 8) -> dict:
+    """Corre resumen_mensual en todas las escuelas en paralelo y suma los resultados.
+
+    Devuelve {"total": {...}, "por_escuela": {codigo: {...}}, "errores": {codigo: mensaje}}.
+    """
+    escuelas = listar_escuelas()
+    primer_dia, ultimo_dia = db.rango_mes(fecha)
+    total = {"desde": primer_dia, "hasta": ultimo_dia,
+             "total": 0, "cargadas": 0, "pendientes": 0, "docentes": 0, "celadores": 0}
+    por_escuela: Dict[str, dict] = {}
+    errores: Dict[str, str] = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(hilos, len(escuelas)))) as pool:
+        futuros = {codigo: pool.submit(_resumen_escuela, codigo, fecha) for codigo in escuelas}
+        for codigo, futuro in futuros.items():
+            try:
+                resumen = futuro.result()
+            except Exception as e:
+                errores[codigo] = str(e)
+                continue
+            por_escuela[codigo] = resumen
+            for clave in ("total", "cargadas", "pendientes", "docentes", "celadores"):
+                total[clave] += resumen[clave]
+
+    return {"total": total, "por_escuela": por_escuela, "errores": errores}
@@ -0,0 +1,162 @@
+"""Consultas sobre el historial de cambios: reconstrucción a una fecha, restauración y compactación."""
+import datetime as dt
+import json
+from typing import Dict, List, Optional, Union
+
+from sqlmodel import Session, select, delete
+
+from licencias.db import (
+    CAMPOS_HISTORIAL,
+    CambioLicencia,
+    Licencia,
+    actualizar_licencia,
+    crear_licencia,
+    get_engine,
+    serializar_cambios,
+)
+
+# Antigüedad a partir de la cual los cambios se fusionan en una única versión base por licencia
+DIAS_HISTORIAL_DETALLADO = 730
+
+_CAMPOS_FECHA = {"fecha_inicio", "fecha_fin", "fecha_carga_gei"}
+
+
+def _decodificar(cambios: str) -> dict:
+    datos = json.loads(cambios)
+    for campo, valor in datos.items():
+        if valor is None:
+            continue
+        if campo in _CAMPOS_FECHA:
+            datos[campo] = dt.date.fromisoformat(valor)
+        elif campo == "fecha_creacion":
+            datos[campo] = dt.datetime.fromisoformat(valor)
+    return datos
+
+
+def _hasta(fecha: Union[dt.date, dt.datetime]) -> dt.datetime:
+    """Una fecha sin hora incluye todo ese día."""
+    if isinstance(fecha, dt.datetime):
+        return fecha
+    return dt.datetime.combine(fecha, dt.time.max)
+
+
+def _aplicar(estado: Optional[dict], cambio: CambioLicencia) -> Optional[dict]:
+    if cambio.operacion in ("alta", "base"):
+        return _decodificar(cambio.cambios)
+    if cambio.operacion == "baja":
+        return None
+    if estado is None:
+        return None
+    estado = dict(estado)
+    estado.update(_decodificar(cambio.cambios))
+    return estado
+
+
+def _a_licencia(id_: int, estado: dict) -> Licencia:
+    return Licencia(id=id_, **{c: estado.get(c) for c in CAMPOS_HISTORIAL if c in estado})
+
+
+def obtener_historial(id_: int) -> List[CambioLicencia]:
+    """Devuelve las entradas del historial de una licencia, de la más antigua a la más nueva."""
+    with Session(get_engine()) as s:
+        q = select(CambioLicencia).where(CambioLicencia.licencia_id == id_).order_by(CambioLicencia.fecha, CambioLicencia.id)
+        return s.exec(q).all()
+
+
+def describir_cambios(cambio: CambioLicencia) -> str:
+    datos = _decodificar(cambio.cambios)
+    if cambio.operacion != "modificacion":
+        return f"{datos.get('apellido', '')}, {datos.get('nombre', '')}".strip(", ")
+    return "; ".join(f"{campo}: {'—' if valor is None else valor}" for campo, valor in datos.items())
+
+
+def reconstruir_licencia(id_: int, fecha: Union[dt.date, dt.datetime]) -> Optional[Licencia]:
+    """Devuelve la licencia tal como estaba en `fecha`, o None si no existía (o ya estaba borrada)."""
+    with Session(get_engine()) as s:
+        q = (
+            select(CambioLicencia)
+            .where(CambioLicencia.licencia_id == id_)
+            .where(CambioLicencia.fecha <= _hasta(fecha))
+            .order_by(CambioLicencia.fecha, CambioLicencia.id)
+        )
+        estado = None
+        for cambio in s.exec(q):
+            estado = _aplicar(estado, cambio)
+    return _a_licencia(id_, estado) if estado else None
+
+
+def reconstruir_tabla(fecha: Union[dt.date, dt.datetime]) -> List[Licencia]:
+    """Devuelve todas las licencias vigentes en `fecha`, ordenadas por id descendente."""
+    estados: Dict[int, Optional[dict]] = {}
+    with Session(get_engine()) as s:
+        q = (
+            select(CambioLicencia)
+            .where(CambioLicencia.fecha <= _hasta(fecha))
+            .order_by(CambioLicencia.licencia_id, CambioLicencia.fecha, CambioLicencia.id)
+        )
+        for cambio in s.exec(q):
+            estados[cambio.licencia_id] = _aplicar(estados.get(cambio.licencia_id), cambio)
+    return [_a_licencia(id_, estado) for id_, estado in sorted(estados.items(), reverse=True) if estado]
+
+
+def restaurar_licencia(id_: int, fecha: Union[dt.date, dt.datetime]):
+    """Vuelve la licencia al estado que tenía en `fecha`; si fue eliminada, la recrea con el mismo id."""
+    lic = reconstruir_licencia(id_, fecha)
+    if lic is None:
+        return False, "La licencia no existía en esa fecha"
+
+    with Session(get_engine()) as s:
+        existe = s.get(Licencia, id_) is not None
+    datos = {c: getattr(lic, c) for c in CAMPOS_HISTORIAL}
+    if existe:
+        return actualizar_licencia(id_, **datos)
+
+    nueva, error = crear_licencia(id=id_, **datos)
+    if nueva:
+        return True, "Licencia restaurada correctamente"
+    return False, error
+
+
+def compactar_historial(antes_de: Optional[dt.datetime] = None) -> int:
+    """Fusiona los cambios anteriores a `antes_de` en una sola entrada "base" por licencia.
+
+    Las licencias eliminadas antes de esa fecha se quitan del historial. Después de
+    compactar, el historial tiene como máximo una entrada vieja por licencia más los
+    cambios recientes. Devuelve la cantidad de entradas eliminadas.
+    """
+    if antes_de is None:
+        antes_de = dt.datetime.now() - dt.timedelta(days=DIAS_HISTORIAL_DETALLADO)
+
+    with Session(get_engine()) as s:
+        q = (
+            select(CambioLicencia)
+            .where(CambioLicencia.fecha < antes_de)
+            .order_by(CambioLicencia.licencia_id, CambioLicencia.fecha, CambioLicencia.id)
+        )
+        grupos: Dict[int, List[CambioLicencia]] = {}
+        for cambio in s.exec(q):
+            grupos.setdefault(cambio.licencia_id, []).append(cambio)
+
+        eliminadas = 0
+        for licencia_id, cambios in grupos.items():
+            if len(cambios) == 1 and cambios[0].operacion in ("alta", "base"):
+                continue
+
+            estado = None
+            for cambio in cambios:
+                estado = _aplicar(estado, cambio)
+
+            ids = [c.id for c in cambios]
+            s.exec(delete(CambioLicencia).where(CambioLicencia.id.in_(ids)))
+            eliminadas += len(ids)
+            if estado is not None:
+                base = CambioLicencia(
+                    licencia_id=licencia_id,
+                    fecha=cambios[-1].fecha,
+                    operacion="base",
+                    cambios=serializar_cambios(estado),
+                )
+                s.add(base)
+                eliminadas -= 1
+        s.commit()
+    return eliminadas
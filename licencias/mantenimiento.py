@@ -0,0 +1,278 @@
+"""Mantenimiento de la base: espacio libre, estadísticas del planificador y retención.
+
+- Espacio: las bases usan auto_vacuum=INCREMENTAL (ver activar_auto_vacuum), así
+  las páginas que quedan libres al borrar van a una lista y liberar_espacio() las
+  devuelve al disco con incremental_vacuum, sin reescribir todo el archivo como VACUUM.
+  Después de una purga grande, compactar() sí corre VACUUM.
+- Estadísticas: optimizar() corre PRAGMA optimize, o ANALYZE completo después de
+  cambios grandes (purga, sincronización de muchas licencias).
+- Retención: purgar_licencias() borra las licencias terminadas hace más de N años.
+  Es opcional: se activa con la variable LICENCIAS_RETENCION_ANIOS o desde el panel
+  de mantenimiento. Las licencias purgadas se van con todo su historial (no se pueden
+  restaurar) y no generan una baja para el distrito: la copia del distrito las conserva.
+
+La app lo corre una vez por día y por base (ver mantenimiento_diario en app.py).
+También se puede correr desde un cron del servidor:
+    LICENCIAS_DATA_DIR=<datos> python -m licencias.mantenimiento [--retencion AÑOS] [--escuelas]
+Los lanzadores convierten las bases viejas a auto_vacuum incremental antes de
+arrancar la app (ver activar_auto_vacuum):
+    python -m licencias.mantenimiento --auto-vacuum [--escuelas]
+"""
+import datetime as dt
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import delete, func, insert, literal, or_, select, text
+
+from licencias import db
+from licencias.db import (
+    AUTO_VACUUM_INCREMENTAL,
+    AlertaLicencia,
+    CambioLicencia,
+    DiasLicencia,
+    Licencia,
+    buscar_licencias,
+    get_engine,
+    pendientes_gei,
+    resumen_mensual,
+)
+
+RETENCION_ANIOS: Optional[int] = int(os.environ["LICENCIAS_RETENCION_ANIOS"]) \
+    if os.environ.get("LICENCIAS_RETENCION_ANIOS") else None
+# Valor sugerido en el panel cuando no hay retención configurada
+RETENCION_SUGERIDA = 10
+FILAS_POR_LOTE = 500
+# Una purga de al menos esta parte de las licencias se compacta con VACUUM
+FRACCION_COMPACTAR = 0.1
+# Filas que mira ANALYZE por índice: estadísticas aproximadas en milisegundos aunque la tabla sea grande
+LIMITE_ANALISIS = 1000
+REPETICIONES_MEDICION = 3
+
+
+def _autocommit():
+    # PRAGMAs que no pueden correr dentro de una transacción (incremental_vacuum, wal_checkpoint)
+    return get_engine().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+
+def estado_base() -> dict:
+    """Tamaño del archivo y del WAL en bytes, páginas totales y libres, y modo de auto_vacuum."""
+    with get_engine().connect() as conn:
+        estado = {
+            "tamanio_pagina": conn.execute(text("PRAGMA page_size")).scalar(),
+            "paginas": conn.execute(text("PRAGMA page_count")).scalar(),
+            "libres": conn.execute(text("PRAGMA freelist_count")).scalar(),
+            "auto_vacuum": conn.execute(text("PRAGMA auto_vacuum")).scalar(),
+            "licencias": conn.execute(select(func.count()).select_from(Licencia)).scalar(),
+        }
+    ruta = get_engine().url.database
+    archivo, wal = Path(ruta or ""), Path(f"{ruta}-wal")
+    estado["archivo"] = archivo.stat().st_size if ruta and archivo.is_file() else 0
+    estado["wal"] = wal.stat().st_size if ruta and wal.is_file() else 0
+    return estado
+
+
+def _recorrido_completo(_hoy: dt.date):
+    # Sin índice que sirva: lee toda la tabla, como la revisión de calidad o una exportación completa
+    with get_engine().connect() as conn:
+        conn.execute(select(func.count()).select_from(Licencia).where(Licencia.observaciones.like("%#%"))).scalar()
+
+
+CONSULTAS_REFERENCIA: Dict[str, Callable[[dt.date], object]] = {
+    "Búsqueda por apellido": lambda hoy: buscar_licencias(apellido="m", limite=200),
+    "Resumen del mes": lambda hoy: resumen_mensual(hoy),
+    "Plazos GEI": lambda hoy: pendientes_gei(hoy),
+    "Recorrido de toda la tabla": _recorrido_completo,
+}
+
+
+def tiempos_consultas(repeticiones: int = REPETICIONES_MEDICION) -> Dict[str, float]:
+    """Mediana en milisegundos de cada consulta de CONSULTAS_REFERENCIA."""
+    hoy = dt.date.today()
+    tiempos = {}
+    for nombre, consulta in CONSULTAS_REFERENCIA.items():
+        medidas = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            consulta(hoy)
+            medidas.append((time.perf_counter() - inicio) * 1000)
+        tiempos[nombre] = statistics.median(medidas)
+    return tiempos
+
+
+def activar_auto_vacuum() -> bool:
+    """Convierte a auto_vacuum=INCREMENTAL una base creada antes de usarlo. Devuelve si hizo falta.
+
+    El cambio recién vale después de un VACUUM, que reescribe el archivo una sola vez
+    (unos segundos en una base grande); las bases nuevas ya nacen así (db.ensure_auto_vacuum).
+    Mientras dura, el VACUUM tiene tomada la escritura y frena a todas las demás
+    sesiones, así que no corre en el mantenimiento diario: solo al arrancar, antes
+    de que la app atienda (`--auto-vacuum`, lo usan INICIAR.bat, run.bat y run.sh),
+    o a pedido desde el panel de mantenimiento.
+    """
+    with _autocommit() as conn:
+        if conn.execute(text("PRAGMA auto_vacuum")).scalar() == AUTO_VACUUM_INCREMENTAL:
+            return False
+        conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).fetchall()
+    return True
+
+
+def liberar_espacio(paginas: Optional[int] = None) -> int:
+    """Devuelve al disco hasta `paginas` páginas libres (todas si es None) y achica el WAL.
+
+    En modo WAL el archivo recién se achica en el checkpoint. Devuelve las páginas liberadas.
+    """
+    with _autocommit() as conn:
+        libres = conn.execute(text("PRAGMA freelist_count")).scalar()
+        # Libera una página por paso; sqlite3 hace un solo paso en execute() y executescript() los hace todos
+        conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({int(paginas or 0)})")
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).fetchall()
+        return libres - conn.execute(text("PRAGMA freelist_count")).scalar()
+
+
+def compactar() -> int:
+    """Reescribe la base entera con VACUUM y achica el WAL. Devuelve las páginas que se ahorraron.
+
+    Un borrado salteado (como una purga por fecha) deja muchas páginas a medio llenar,
+    que incremental_vacuum no puede devolver: solo VACUUM las junta. Bloquea la base
+    mientras corre y necesita lugar libre en disco del tamaño de la base.
+    """
+    with _autocommit() as conn:
+        paginas = conn.execute(text("PRAGMA page_count")).scalar()
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)")).fetchall()
+        return paginas - conn.execute(text("PRAGMA page_count")).scalar()
+
+
+def optimizar(completo: bool = False):
+    """Actualiza las estadísticas que usa SQLite para elegir índices.
+
+    `completo` corre ANALYZE sobre todas las tablas (después de cambios grandes); si no,
+    PRAGMA optimize, que solo analiza lo que hace falta.
+    """
+    with _autocommit() as conn:
+        conn.execute(text(f"PRAGMA analysis_limit = {LIMITE_ANALISIS}"))
+        conn.execute(text("ANALYZE" if completo else "PRAGMA optimize"))
+
+
+def fecha_corte(anios: int, hoy: Optional[dt.date] = None) -> dt.date:
+    """Las licencias que terminaron antes de esta fecha superan la retención de `anios` años."""
+    return (hoy or dt.date.today()) - relativedelta(years=anios)
+
+
+def _purgables(anios: int, hoy: Optional[dt.date]):
+    # Las licencias sin fecha de fin siguen abiertas: nunca se purgan
+    return select(Licencia.id).where(Licencia.fecha_fin < fecha_corte(anios, hoy))
+
+
+def contar_purgables(anios: int, hoy: Optional[dt.date] = None) -> int:
+    with get_engine().connect() as conn:
+        return conn.execute(select(func.count()).select_from(_purgables(anios, hoy).subquery())).scalar()
+
+
+def purgar_licencias(anios: int, hoy: Optional[dt.date] = None) -> int:
+    """Borra las licencias terminadas hace más de `anios` años. Devuelve cuántas borró.
+
+    De cada una se borran también sus alertas, sus días por mes y su historial, que
+    queda reducido a una entrada de baja vacía: así version_datos sube sin que el
+    historial ocupe el lugar que se quiere recuperar. La entrada de baja se inserta
+    antes de borrar el resto del historial, para que tome un id mayor que todos los
+    existentes y no reutilice uno liberado. No se registra la baja para la
+    sincronización: el distrito conserva su copia.
+    """
+    with get_engine().connect() as conn:
+        ids = conn.execute(_purgables(anios, hoy).order_by(Licencia.id)).scalars().all()
+
+    ahora = dt.datetime.now()
+    for i in range(0, len(ids), FILAS_POR_LOTE):
+        lote = ids[i:i + FILAS_POR_LOTE]
+        with get_engine().begin() as conn:
+            ultimo = conn.execute(select(func.max(CambioLicencia.id))).scalar() or 0
+            conn.execute(insert(CambioLicencia).from_select(
+                ["licencia_id", "fecha", "operacion", "cambios"],
+                select(Licencia.id, literal(ahora), literal("baja"), literal("{}"))
+                .where(Licencia.id.in_(lote)),
+            ))
+            conn.execute(delete(CambioLicencia).where(CambioLicencia.licencia_id.in_(lote),
+                                                      CambioLicencia.id <= ultimo))
+            conn.execute(delete(AlertaLicencia).where(
+                or_(AlertaLicencia.licencia_id.in_(lote), AlertaLicencia.otra_id.in_(lote))))
+            conn.execute(delete(DiasLicencia).where(DiasLicencia.licencia_id.in_(lote)))
+            conn.execute(delete(Licencia).where(Licencia.id.in_(lote)))
+    if ids:
+        optimizar(completo=True)
+    return len(ids)
+
+
+def mantenimiento(retencion_anios: Optional[int] = RETENCION_ANIOS, medir: bool = True) -> dict:
+    """Purga (si hay retención), libera el espacio libre y actualiza las estadísticas.
+
+    No convierte a auto_vacuum incremental (ver activar_auto_vacuum): en una base
+    vieja, liberar_espacio no devuelve nada hasta la conversión.
+
+    Si la purga se llevó una parte grande de las licencias (FRACCION_COMPACTAR), la
+    base se compacta con VACUUM; si no, alcanza con incremental_vacuum.
+
+    Devuelve {"purgadas", "paginas_liberadas", "antes", "despues", "hecho"}; "antes" y
+    "despues" son estado_base() más, si `medir`, los tiempos de tiempos_consultas().
+    """
+    def foto() -> dict:
+        return {**estado_base(), **({"tiempos": tiempos_consultas()} if medir else {})}
+
+    antes = foto()
+    purgadas = purgar_licencias(retencion_anios) if retencion_anios else 0
+    if purgadas and purgadas >= FRACCION_COMPACTAR * antes["licencias"]:
+        liberadas = compactar()
+    else:
+        liberadas = liberar_espacio()
+    if not purgadas:
+        optimizar()
+    return {
+        "purgadas": purgadas,
+        "paginas_liberadas": liberadas,
+        "antes": antes,
+        "despues": foto(),
+        "hecho": dt.datetime.now(),
+    }
+
+
+def _informe(nombre: str, r: dict) -> str:
+    def mb(estado: dict) -> str:
+        return f"{(estado['archivo'] + estado['wal']) / 1e6:.1f} MB"
+
+    lineas = [f"{nombre}: {r['purgadas']} licencias purgadas, {r['paginas_liberadas']} páginas devueltas al disco, "
+              f"{mb(r['antes'])} -> {mb(r['despues'])}"]
+    for consulta, ms in r["antes"].get("tiempos", {}).items():
+        lineas.append(f"  {consulta}: {ms:.1f} ms -> {r['despues']['tiempos'][consulta]:.1f} ms")
+    return "\n".join(lineas)
+
+
+def main(argv: List[str]):
+    retencion = RETENCION_ANIOS
+    if "--retencion" in argv:
+        retencion = int(argv[argv.index("--retencion") + 1])
+
+    def tarea(nombre: str) -> str:
+        if "--auto-vacuum" in argv:
+            convertida = activar_auto_vacuum()
+            return f"{nombre}: {'convertida a' if convertida else 'ya usaba'} auto_vacuum incremental"
+        return _informe(nombre, mantenimiento(retencion))
+
+    db.init_db()
+    print(tarea("base principal"))
+    if "--escuelas" in argv:
+        # Import diferido: solo hace falta en un servidor con varias escuelas
+        from licencias.escuelas import engines, listar_escuelas
+        for codigo in listar_escuelas():
+            with db.usando_engine(engines.obtener(codigo)):
+                print(tarea(codigo))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,245 @@
+"""Métricas del proceso en el formato de texto de Prometheus.
+
+Histogramas en memoria, compartidos por todas las sesiones del proceso (la app de
+Streamlit o la API), más contadores que ya llevan otros módulos y se leen al
+momento de exportar (cache de compilación, búsquedas en vivo, exportaciones
+reutilizadas) y el tamaño de las bases:
+
+- licencias_pestania_segundos: tiempo de cada pestaña en cada ejecución del
+  script; su _count son las ejecuciones (reruns) por pestaña.
+- licencias_consulta_segundos / licencias_consulta_filas: latencia y filas
+  devueltas por consulta; en buscar_licencias, por forma (filtros usados).
+- licencias_exportacion_segundos / licencias_exportacion_bytes: trabajos de
+  exportación por tipo.
+- licencias_base_bytes: archivo y WAL de cada base.
+- licencias_cache_total y licencias_cache_aciertos_ratio: aciertos y fallos de
+  los caches.
+
+Se publican, según la configuración, en un puerto local
+(LICENCIAS_METRICAS_PUERTO, http://127.0.0.1:<puerto>/metrics) y/o en un archivo
+que se reescribe cada INTERVALO_ARCHIVO segundos (LICENCIAS_METRICAS_ARCHIVO, para
+el textfile collector de node_exporter). La API los sirve en GET /metrics.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+PUERTO_METRICAS: Optional[int] = int(os.environ["LICENCIAS_METRICAS_PUERTO"]) \
+    if os.environ.get("LICENCIAS_METRICAS_PUERTO") else None
+ARCHIVO_METRICAS: Optional[str] = os.environ.get("LICENCIAS_METRICAS_ARCHIVO") or None
+INTERVALO_ARCHIVO = 15
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_FILAS = (0, 1, 10, 50, 200, 1000, 5000, 20000, 100000)
+LIMITES_BYTES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+class Metrica(NamedTuple):
+    tipo: str  # "counter", "gauge" o "histogram"
+    ayuda: str
+    limites: Tuple[float, ...] = ()
+
+
+METRICAS: Dict[str, Metrica] = {
+    "licencias_pestania_segundos": Metrica(
+        "histogram", "Tiempo de cada pestaña por ejecución del script (el _count son las ejecuciones)",
+        LIMITES_SEGUNDOS),
+    "licencias_consulta_segundos": Metrica("histogram", "Latencia de las consultas por consulta y forma",
+                                           LIMITES_SEGUNDOS),
+    "licencias_consulta_filas": Metrica("histogram", "Filas devueltas por consulta y forma", LIMITES_FILAS),
+    "licencias_exportacion_segundos": Metrica(
+        "histogram", "Duración de los trabajos de exportación por tipo y resultado", LIMITES_SEGUNDOS),
+    "licencias_exportacion_bytes": Metrica("histogram", "Tamaño de los archivos exportados por tipo", LIMITES_BYTES),
+    "licencias_base_bytes": Metrica("gauge", "Tamaño en disco de cada base (archivo y WAL)"),
+    "licencias_cache_total": Metrica("counter", "Aciertos y fallos de cada cache"),
+    "licencias_cache_aciertos_ratio": Metrica("gauge", "Aciertos sobre el total de cada cache"),
+    "licencias_busqueda_en_vivo_total": Metrica("counter", "Búsquedas en vivo lanzadas y canceladas"),
+}
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+# (métrica, etiquetas) -> [cantidad por cubeta (la última es +Inf)..., suma, total]
+_histogramas: Dict[Tuple[str, Etiquetas], List[float]] = {}
+
+
+def _etiquetas(etiquetas: dict) -> Etiquetas:
+    return tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def observar(nombre: str, valor: float, **etiquetas):
+    """Agrega una observación al histograma `nombre` con esas etiquetas."""
+    limites = METRICAS[nombre].limites
+    clave = (nombre, _etiquetas(etiquetas))
+    with _lock:
+        cubetas = _histogramas.get(clave)
+        if cubetas is None:
+            cubetas = _histogramas[clave] = [0] * (len(limites) + 3)
+        # Cada observación cuenta solo en su cubeta; al exportar se acumulan
+        cubetas[bisect.bisect_left(limites, valor)] += 1
+        cubetas[-2] += valor
+        cubetas[-1] += 1
+
+
+@contextmanager
+def medir(nombre: str, **etiquetas):
+    """Observa en el histograma `nombre` los segundos que tarda el bloque (también si termina con excepción)."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+
+def observar_consulta(consulta: str, segundos: float, filas: Optional[int] = None, forma: str = ""):
+    observar("licencias_consulta_segundos", segundos, consulta=consulta, forma=forma)
+    if filas is not None:
+        observar("licencias_consulta_filas", filas, consulta=consulta, forma=forma)
+
+
+def consulta(funcion):
+    """Decorador: latencia de cada llamada y, si devuelve una lista, cantidad de filas."""
+    @wraps(funcion)
+    def medida(*args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = funcion(*args, **kwargs)
+        observar_consulta(funcion.__name__, time.perf_counter() - inicio,
+                          len(resultado) if isinstance(resultado, list) else None)
+        return resultado
+    return medida
+
+
+# ---------- Valores que se leen al exportar ----------
+def _cache(nombre: str, aciertos: int, fallos: int) -> Iterator[Tuple[str, dict, float]]:
+    yield "licencias_cache_total", {"cache": nombre, "resultado": "acierto"}, aciertos
+    yield "licencias_cache_total", {"cache": nombre, "resultado": "fallo"}, fallos
+    if aciertos + fallos:
+        yield "licencias_cache_aciertos_ratio", {"cache": nombre}, aciertos / (aciertos + fallos)
+
+
+def _recolectados() -> Iterator[Tuple[str, dict, float]]:
+    # Imports diferidos: estos módulos usan licencias.db, que registra sus consultas acá
+    from licencias.busqueda_en_vivo import estadisticas_busqueda
+    from licencias.db import estadisticas_consultas, get_engine
+    from licencias.escuelas import DIR_ESCUELAS
+    from licencias.trabajos import estadisticas_trabajos
+
+    cache = estadisticas_consultas()
+    yield from _cache("compilacion", cache["compilacion_aciertos"], cache["compilacion_fallos"])
+    yield from _cache("formas_busqueda", cache["formas_aciertos"], cache["formas_fallos"])
+    trabajos = estadisticas_trabajos()
+    yield from _cache("exportaciones", trabajos["reutilizadas"], trabajos["generadas"])
+    for resultado, cantidad in estadisticas_busqueda().items():
+        yield "licencias_busqueda_en_vivo_total", {"resultado": resultado}, cantidad
+
+    # Tamaño de los archivos, sin abrir las bases
+    bases = [("principal", Path(get_engine().url.database or ""))]
+    if DIR_ESCUELAS.is_dir():
+        bases += [(ruta.stem, ruta) for ruta in sorted(DIR_ESCUELAS.glob("*.db"))]
+    for base, ruta in bases:
+        for archivo, camino in (("db", ruta), ("wal", Path(f"{ruta}-wal"))):
+            if camino.is_file():
+                yield "licencias_base_bytes", {"base": base, "archivo": archivo}, camino.stat().st_size
+
+
+# ---------- Formato de texto ----------
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def _formatear(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    escapar = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+    return "{" + ",".join(f'{k}="{v.translate(escapar)}"' for k, v in etiquetas) + "}"
+
+
+def texto() -> str:
+    """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+    with _lock:
+        valores = {clave: list(cubetas) for clave, cubetas in _histogramas.items()}
+    for nombre, etiquetas, valor in _recolectados():
+        valores[(nombre, _etiquetas(etiquetas))] = valor
+
+    lineas: List[str] = []
+    for nombre, metrica in METRICAS.items():
+        series = sorted((etiquetas, v) for (n, etiquetas), v in valores.items() if n == nombre)
+        if not series:
+            continue
+        lineas.append(f"# HELP {nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {nombre} {metrica.tipo}")
+        for etiquetas, v in series:
+            if metrica.tipo != "histogram":
+                lineas.append(f"{nombre}{_formatear(etiquetas)} {_numero(v)}")
+                continue
+            acumulado = 0
+            for limite, cantidad in zip(metrica.limites + (float("inf"),), v[:-2]):
+                acumulado += cantidad
+                lineas.append(f"{nombre}_bucket{_formatear(etiquetas + (('le', _numero(limite)),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_formatear(etiquetas)} {_numero(v[-2])}")
+            lineas.append(f"{nombre}_count{_formatear(etiquetas)} {v[-1]}")
+    return "\n".join(lineas) + "\n"
+
+
+def escribir(ruta: str):
+    """Escribe texto() en `ruta`, reemplazándolo de una vez para que nunca se lea a medias."""
+    destino = Path(ruta)
+    temporal = destino.with_name(f".{destino.name}.tmp")
+    temporal.write_text(texto(), encoding="utf-8")
+    os.replace(temporal, destino)
+
+
+# ---------- Publicación ----------
+class _Pedido(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        cuerpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTENIDO)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def _escribir_cada(ruta: str, intervalo: float):
+    while True:
+        try:
+            escribir(ruta)
+        except Exception as e:
+            print(f"No se pudieron escribir las métricas en {ruta}: {e}", file=sys.stderr)
+        time.sleep(intervalo)
+
+
+def publicar(puerto: Optional[int] = PUERTO_METRICAS, archivo: Optional[str] = ARCHIVO_METRICAS,
+             intervalo: float = INTERVALO_ARCHIVO) -> Optional[ThreadingHTTPServer]:
+    """Arranca, en hilos del proceso, el servidor local de métricas y/o la escritura periódica del archivo.
+
+    Se llama una sola vez por proceso. Devuelve el servidor, o None si no se pidió
+    puerto o si estaba ocupado (por ejemplo, por otra instancia de la app).
+    """
+    servidor = None
+    if puerto:
+        try:
+            servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _Pedido)
+            threading.Thread(target=servidor.serve_forever, name="metricas", daemon=True).start()
+        except OSError as e:
+            print(f"No se pudo abrir el puerto de métricas {puerto}: {e}", file=sys.stderr)
+    if archivo:
+        threading.Thread(target=_escribir_cada, args=(archivo, intervalo), name="metricas-archivo",
+                         daemon=True).start()
+    return servidor
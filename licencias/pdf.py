@@ -0,0 +1,174 @@
+"""Escritor PDF mínimo en Python puro (sin dependencias): texto en Helvetica y rectángulos.
+
+Cada página se comprime y se escribe en la salida apenas se cierra; en memoria
+solo quedan las posiciones de los objetos, así que el uso de memoria no crece
+con la cantidad de páginas. Alcanza para reportes tabulares como el mensual.
+"""
+import unicodedata
+import zlib
+from typing import BinaryIO, List, Optional, Tuple
+
+# Páginas en puntos (1/72 de pulgada)
+A4_APAISADO = (842, 595)
+
+# Anchos de Helvetica (AFM estándar, en milésimas del tamaño de letra) para ASCII 32..126
+_ANCHOS_HELVETICA = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+# Helvetica-Bold es algo más ancha; se usa un factor en lugar de una segunda tabla
+_FACTOR_NEGRITA = 1.1
+
+Color = Tuple[float, float, float]
+
+
+def color_hex(valor: str) -> Color:
+    """'#d4edda' -> (r, g, b) entre 0 y 1."""
+    valor = valor.lstrip("#")
+    return tuple(int(valor[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+
+def _ancho_caracter(c: str) -> int:
+    codigo = ord(c)
+    if 32 <= codigo <= 126:
+        return _ANCHOS_HELVETICA[codigo - 32]
+    base = unicodedata.normalize("NFD", c)[0]
+    if 32 <= ord(base) <= 126:
+        return _ANCHOS_HELVETICA[ord(base) - 32]
+    return 556
+
+
+def ancho_texto(texto: str, tam: float, negrita: bool = False) -> float:
+    ancho = sum(_ancho_caracter(c) for c in texto) * tam / 1000
+    return ancho * _FACTOR_NEGRITA if negrita else ancho
+
+
+def recortar(texto: str, ancho_max: float, tam: float, negrita: bool = False) -> str:
+    """Recorta el texto con "…" para que entre en `ancho_max` puntos."""
+    if ancho_texto(texto, tam, negrita) <= ancho_max:
+        return texto
+    while texto and ancho_texto(texto + "…", tam, negrita) > ancho_max:
+        texto = texto[:-1]
+    return texto + "…" if texto else ""
+
+
+def _cadena(texto: str) -> bytes:
+    # WinAnsiEncoding ~ cp1252: cubre acentos y ñ; lo demás (emojis) se descarta
+    datos = texto.encode("cp1252", errors="ignore")
+    return b"(" + datos.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _num(valor: float) -> bytes:
+    return f"{valor:.2f}".rstrip("0").rstrip(".").encode("ascii")
+
+
+class DocumentoPDF:
+    """PDF que se escribe en `salida` (archivo binario) página por página.
+
+    Coordenadas con origen arriba a la izquierda (y crece hacia abajo), como en
+    pantalla; se convierten al sistema de PDF al escribir.
+
+        doc = DocumentoPDF(archivo)
+        doc.nueva_pagina()
+        doc.texto(40, 40, "Hola", tam=12)
+        doc.cerrar()
+    """
+
+    # Objetos fijos: 1 catálogo, 2 árbol de páginas, 3 Helvetica, 4 Helvetica-Bold
+    _PRIMER_OBJETO_LIBRE = 5
+
+    def __init__(self, salida: BinaryIO, tamanio: Tuple[float, float] = A4_APAISADO):
+        self.salida = salida
+        self.ancho, self.alto = tamanio
+        self._posiciones = {}
+        self._paginas: List[int] = []
+        self._siguiente = self._PRIMER_OBJETO_LIBRE
+        self._contenido: Optional[List[bytes]] = None
+        self._escrito = 0
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def paginas(self) -> int:
+        return len(self._paginas) + (1 if self._contenido is not None else 0)
+
+    def _escribir(self, datos: bytes):
+        self.salida.write(datos)
+        self._escrito += len(datos)
+
+    def _objeto(self, numero: int, cuerpo: bytes):
+        self._posiciones[numero] = self._escrito
+        self._escribir(b"%d 0 obj\n" % numero + cuerpo + b"\nendobj\n")
+
+    def _nuevo_numero(self) -> int:
+        numero = self._siguiente
+        self._siguiente += 1
+        return numero
+
+    # ---------- Páginas ----------
+    def nueva_pagina(self):
+        self._cerrar_pagina()
+        self._contenido = []
+
+    def _cerrar_pagina(self):
+        if self._contenido is None:
+            return
+        flujo = zlib.compress(b"\n".join(self._contenido))
+        n_contenido, n_pagina = self._nuevo_numero(), self._nuevo_numero()
+        self._objeto(n_contenido, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(flujo)
+                     + flujo + b"\nendstream")
+        self._objeto(n_pagina, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] "
+                               b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                     % (_num(self.ancho), _num(self.alto), n_contenido))
+        self._paginas.append(n_pagina)
+        self._contenido = None
+
+    # ---------- Dibujo ----------
+    def texto(self, x: float, y: float, texto: str, tam: float = 9, negrita: bool = False,
+              color: Color = (0, 0, 0)):
+        """Escribe `texto` con la línea base en (x, y)."""
+        fuente = b"/F2" if negrita else b"/F1"
+        self._contenido.append(
+            b"BT %s %s %s rg %s %s Tf %s %s Td %s Tj ET" % (
+                _num(color[0]), _num(color[1]), _num(color[2]), fuente, _num(tam),
+                _num(x), _num(self.alto - y), _cadena(texto))
+        )
+
+    def texto_centrado(self, y: float, texto: str, tam: float = 9, negrita: bool = False):
+        self.texto((self.ancho - ancho_texto(texto, tam, negrita)) / 2, y, texto, tam, negrita)
+
+    def rectangulo(self, x: float, y: float, ancho: float, alto: float,
+                   relleno: Optional[Color] = None, borde: Optional[Color] = (0, 0, 0), grosor: float = 0.5):
+        """Rectángulo con esquina superior izquierda en (x, y)."""
+        partes = []
+        if relleno is not None:
+            partes.append(b"%s %s %s rg" % tuple(_num(c) for c in relleno))
+        if borde is not None:
+            partes.append(b"%s w %s %s %s RG" % ((_num(grosor),) + tuple(_num(c) for c in borde)))
+        operador = b"B" if relleno is not None and borde is not None else b"f" if relleno is not None else b"S"
+        partes.append(b"%s %s %s %s re %s" % (_num(x), _num(self.alto - y - alto), _num(ancho), _num(alto), operador))
+        self._contenido.append(b" ".join(partes))
+
+    # ---------- Cierre ----------
+    def cerrar(self):
+        """Escribe la página en curso, el árbol de páginas y la tabla de referencias."""
+        if self._contenido is None and not self._paginas:
+            self.nueva_pagina()
+        self._cerrar_pagina()
+        self._objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        hijos = b" ".join(b"%d 0 R" % n for n in self._paginas)
+        self._objeto(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (hijos, len(self._paginas)))
+        for numero, nombre in ((3, b"Helvetica"), (4, b"Helvetica-Bold")):
+            self._objeto(numero, b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>"
+                         % nombre)
+
+        inicio_xref = self._escrito
+        total = self._siguiente
+        lineas = [b"xref", b"0 %d" % total, b"0000000000 65535 f "]
+        for numero in range(1, total):
+            lineas.append(b"%010d 00000 n " % self._posiciones[numero])
+        self._escribir(b"\n".join(lineas) + b"\n")
+        self._escribir(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (total, inicio_xref))
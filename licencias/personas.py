@@ -0,0 +1,69 @@
+"""Índice en memoria de las personas ya cargadas, para autocompletar el alta por apellido o DNI.
+
+Se arma una vez por versión de datos con las combinaciones distintas de
+(dni, apellido, nombre, rol) y guarda dos listas ordenadas de claves: apellido +
+nombre normalizados (sin acentos ni mayúsculas) y DNI. Buscar un prefijo es una
+búsqueda binaria (bisect) más recorrer las coincidencias contiguas.
+"""
+from bisect import bisect_left
+from typing import List, NamedTuple, Tuple
+
+from sqlmodel import select
+
+from licencias.db import Licencia, get_engine, normalizar_texto
+
+MIN_CARACTERES = 2
+MAX_SUGERENCIAS = 10
+
+
+class Persona(NamedTuple):
+    dni: str
+    apellido: str
+    nombre: str
+    rol: str
+
+
+def _prefijo(claves: List[str], posiciones: List[int], prefijo: str, limite: int) -> List[int]:
+    """Posiciones (en la lista de personas) de las claves que empiezan con `prefijo`."""
+    encontradas = []
+    i = bisect_left(claves, prefijo)
+    while i < len(claves) and claves[i].startswith(prefijo) and len(encontradas) < limite:
+        encontradas.append(posiciones[i])
+        i += 1
+    return encontradas
+
+
+def _ordenar(claves: List[Tuple[str, int]]) -> Tuple[List[str], List[int]]:
+    claves.sort()
+    return [c for c, _ in claves], [i for _, i in claves]
+
+
+class IndicePersonas:
+    """Búsqueda por prefijo de apellido (y nombre) o de DNI sobre listas ordenadas."""
+
+    def __init__(self, personas: List[Persona]):
+        self.personas = personas
+        self._nombres, self._pos_nombres = _ordenar(
+            [(normalizar_texto(f"{p.apellido} {p.nombre}"), i) for i, p in enumerate(personas)])
+        self._dnis, self._pos_dnis = _ordenar([(p.dni, i) for i, p in enumerate(personas) if p.dni])
+
+    def __len__(self):
+        return len(self.personas)
+
+    def buscar(self, texto: str, limite: int = MAX_SUGERENCIAS) -> List[Persona]:
+        """Personas cuyo DNI (si el texto son dígitos) o apellido empieza con `texto`."""
+        texto = texto.strip()
+        if len(texto) < MIN_CARACTERES:
+            return []
+        if texto.isdigit():
+            posiciones = _prefijo(self._dnis, self._pos_dnis, texto, limite)
+        else:
+            posiciones = _prefijo(self._nombres, self._pos_nombres, normalizar_texto(texto), limite)
+        return [self.personas[i] for i in posiciones]
+
+
+def armar_indice() -> IndicePersonas:
+    """Lee las combinaciones distintas de (dni, apellido, nombre, rol) y arma el índice."""
+    q = select(Licencia.dni, Licencia.apellido, Licencia.nombre, Licencia.rol).distinct()
+    with get_engine().connect() as conn:
+        return IndicePersonas([Persona(*fila) for fila in conn.execute(q)])
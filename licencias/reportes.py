@@ -0,0 +1,352 @@
+"""Armado de tablas y archivos de exportación (DataFrame, Excel, HTML para imprimir y PDF).
+
+No depende de Streamlit: lo usan tanto la app como los trabajos en segundo plano.
+"""
+import codecs
+import csv
+import datetime as dt
+import io
+import os
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+
+from licencias.db import Licencia
+
+COLUMNAS_ORDEN = [
+    "id", "apellido", "nombre", "dni", "dni_familiar", "rol", "fecha_inicio", "fecha_fin",
+    "articulo", "codigo_osep", "estado_carga", "fecha_carga_gei", "documentacion", "observaciones"
+]
+
+COLUMNAS_LEGIBLES = {
+    'id': 'ID',
+    'apellido': 'Apellido',
+    'nombre': 'Nombre',
+    'dni': 'DNI',
+    'dni_familiar': 'DNI familiar',
+    'rol': 'Rol',
+    'fecha_inicio': 'Inicio',
+    'fecha_fin': 'Fin',
+    'articulo': 'Artículo',
+    'codigo_osep': 'Código',
+    'estado_carga': 'Estado',
+    'fecha_carga_gei': 'Carga GEI',
+    'documentacion': 'Documentación',
+    'observaciones': 'Observaciones'
+}
+
+
+def conteos(rows: List[Licencia]) -> Dict[str, int]:
+    """Totales que muestran los reportes: pendientes, cargadas, docentes y celadores."""
+    return {
+        "pendientes": sum(1 for r in rows if r.estado_carga == "Pendiente"),
+        "cargadas": sum(1 for r in rows if r.estado_carga == "Cargada"),
+        "docentes": sum(1 for r in rows if r.rol == "Docente"),
+        "celadores": sum(1 for r in rows if r.rol == "Celador"),
+    }
+
+
+def to_df(rows: List[Licencia]) -> pd.DataFrame:
+    if not rows:
+        return pd.DataFrame()
+
+    data = [r.model_dump() for r in rows]
+    df = pd.DataFrame(data)
+
+    if 'fecha_inicio' in df.columns:
+        df['fecha_inicio'] = pd.to_datetime(df['fecha_inicio']).dt.strftime('%d/%m/%Y')
+    if 'fecha_fin' in df.columns:
+        df['fecha_fin'] = df['fecha_fin'].apply(
+            lambda x: pd.to_datetime(x).strftime('%d/%m/%Y') if pd.notna(x) else '(Sin definir)'
+        )
+    if 'fecha_carga_gei' in df.columns:
+        df['fecha_carga_gei'] = df['fecha_carga_gei'].apply(
+            lambda x: pd.to_datetime(x).strftime('%d/%m/%Y') if pd.notna(x) else ''
+        )
+    if 'articulo' in df.columns:
+        df['articulo'] = df['articulo'].fillna('(Pendiente)')
+    if 'documentacion' in df.columns:
+        df['documentacion'] = df['documentacion'].fillna('Pendiente')
+
+    columnas_disponibles = [col for col in COLUMNAS_ORDEN if col in df.columns]
+    df = df[columnas_disponibles]
+
+    return df
+
+
+def _fecha_corta(valor: Optional[dt.date], vacio: str = "") -> str:
+    return f"{valor:%d/%m/%Y}" if valor else vacio
+
+
+def fila_exportacion(fila) -> list:
+    """Valores de una licencia (objeto o fila con sus columnas) en el orden de COLUMNAS_ORDEN,
+    con el mismo formato que to_df."""
+    datos = fila._mapping if hasattr(fila, "_mapping") else fila.__dict__
+    valores = {
+        **datos,
+        "fecha_inicio": _fecha_corta(datos["fecha_inicio"]),
+        "fecha_fin": _fecha_corta(datos["fecha_fin"], "(Sin definir)"),
+        "fecha_carga_gei": _fecha_corta(datos["fecha_carga_gei"]),
+        "articulo": datos["articulo"] or "(Pendiente)",
+        "documentacion": datos["documentacion"] or "Pendiente",
+    }
+    return [valores[c] for c in COLUMNAS_ORDEN]
+
+
+def escribir_csv(salida: BinaryIO, lotes: Iterable[Iterable]) -> int:
+    """Escribe en `salida` el CSV de las licencias que llegan en `lotes` y devuelve cuántas fueron.
+
+    Da el mismo archivo que to_df(rows).to_csv(index=False).encode("utf-8-sig"), pero
+    el BOM se escribe una vez y cada lote se formatea y codifica por separado: la
+    memoria depende del tamaño del lote, no del total.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator=os.linesep)
+    salida.write(codecs.BOM_UTF8)
+    escritor.writerow(COLUMNAS_ORDEN)
+    total = 0
+    for lote in lotes:
+        for fila in lote:
+            escritor.writerow(fila_exportacion(fila))
+            total += 1
+        salida.write(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+    salida.write(buffer.getvalue().encode("utf-8"))
+    return total
+
+
+def generar_excel(hojas: Dict[str, pd.DataFrame]) -> bytes:
+    """Arma un .xlsx en memoria con una hoja por DataFrame (openpyxl se importa recién acá)."""
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        for nombre_hoja, hoja in hojas.items():
+            hoja.to_excel(writer, index=False, sheet_name=nombre_hoja)
+    return buffer.getvalue()
+
+
+def hojas_reporte_mensual(df_mes: pd.DataFrame, totales: Dict[str, int]) -> Dict[str, pd.DataFrame]:
+    return {
+        'Licencias': df_mes,
+        'Resumen': pd.DataFrame({
+            'Concepto': ['Total', 'Cargadas', 'Pendientes', 'Docentes', 'Celadores'],
+            'Cantidad': [len(df_mes), totales["cargadas"], totales["pendientes"],
+                         totales["docentes"], totales["celadores"]]
+        }),
+    }
+
+
+def df_to_html_table(df: pd.DataFrame) -> str:
+    """Genera tabla HTML para impresión con estilos inline y colores"""
+    if df.empty:
+        return "<p>No hay datos</p>"
+    
+    html = '<table class="print-table" style="width:100%; border-collapse:collapse; font-size:9pt;">'
+    html += '<thead><tr style="background-color:#f0f0f0;">'
+    
+    for col in df.columns:
+        col_name = COLUMNAS_LEGIBLES.get(col, col)
+        html += f'<th style="border:1px solid #ddd; padding:4px 6px; text-align:left; font-weight:bold;">{col_name}</th>'
+    
+    html += '</tr></thead><tbody>'
+    
+    for _, row in df.iterrows():
+        es_cargada = (
+            row.get('estado_carga') == 'Cargada' and
+            row.get('fecha_carga_gei') not in [None, '']
+        )
+        
+        if es_cargada:
+            row_style = 'background-color:#d4edda; color:#000000;'
+        else:
+            row_style = 'background-color:white;'
+        
+        html += f'<tr style="{row_style}">'
+        for col in df.columns:
+            val = row[col] if pd.notna(row[col]) else ''
+            html += f'<td style="border:1px solid #ddd; padding:4px 6px;">{val}</td>'
+        html += '</tr>'
+    
+    html += '</tbody></table>'
+    return html
+
+
+def html_reporte_mensual(df_mes: pd.DataFrame, primer_dia: dt.date, ultimo_dia: dt.date,
+                         totales: Dict[str, int]) -> str:
+    """Página HTML completa del reporte mensual, lista para abrir e imprimir."""
+    cargadas, pendientes = totales["cargadas"], totales["pendientes"]
+    docentes, celadores = totales["docentes"], totales["celadores"]
+    html_table_print = df_to_html_table(df_mes)
+
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Reporte de Licencias</title>
+    <style>
+        @page {{ size: landscape; margin: 1cm; }}
+        body {{
+            font-family: Arial, sans-serif;
+            margin: 20px;
+        }}
+        .title {{
+            font-size: 20pt;
+            font-weight: bold;
+            margin-bottom: 10px;
+            text-align: center;
+        }}
+        .subtitle {{
+            font-size: 14pt;
+            margin-bottom: 15px;
+            text-align: center;
+        }}
+        .metrics {{
+            display: flex;
+            justify-content: space-around;
+            margin: 20px 0;
+            padding: 10px;
+            background-color: #f5f5f5;
+            border: 1px solid #ddd;
+        }}
+        .metric {{
+            text-align: center;
+            font-size: 11pt;
+        }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            margin: 20px 0;
+            font-size: 9pt;
+        }}
+        th {{
+            border: 1px solid #000;
+            padding: 6px 8px;
+            text-align: left;
+            font-weight: bold;
+            background-color: #e0e0e0;
+        }}
+        td {{
+            border: 1px solid #000;
+            padding: 5px 8px;
+        }}
+        @media print {{
+            button {{ display: none; }}
+        }}
+    </style>
+</head>
+<body>
+    <div class="title">📋 Reporte de Licencias - Secretaría Escolar Mendoza</div>
+    <div class="subtitle">Período: {primer_dia:%d/%m/%Y} – {ultimo_dia:%d/%m/%Y}</div>
+    
+    <div class="metrics">
+        <div class="metric"><strong>Total:</strong> {len(df_mes)}</div>
+        <div class="metric"><strong>Cargadas:</strong> {cargadas} ({cargadas / len(df_mes) * 100:.0f}%)</div>
+        <div class="metric"><strong>Pendientes:</strong> {pendientes} ({pendientes / len(df_mes) * 100:.0f}%)</div>
+        <div class="metric"><strong>Docentes:</strong> {docentes} | <strong>Celadores:</strong> {celadores}</div>
+    </div>
+    
+    {html_table_print}
+    
+    <div style="text-align: center; margin-top: 20px;">
+        <button onclick="window.print()" style="padding: 10px 20px; font-size: 14px; background-color: #ff4b4b; color: white; border: none; border-radius: 5px; cursor: pointer;">
+            🖨️ Imprimir este reporte
+        </button>
+    </div>
+</body>
+</html>"""
+
+
+# ---------- PDF ----------
+# Ancho relativo de cada columna en el PDF (se reparte el ancho útil de la página)
+_PESOS_COLUMNAS_PDF = {
+    "id": 3, "apellido": 10, "nombre": 10, "dni": 6.5, "dni_familiar": 6.5, "rol": 5.5,
+    "fecha_inicio": 6, "fecha_fin": 6.5, "articulo": 7, "codigo_osep": 5, "estado_carga": 5.5,
+    "fecha_carga_gei": 6, "documentacion": 7.5, "observaciones": 13,
+}
+_MARGEN_PDF = 28
+_ALTO_FILA_PDF = 13
+_TAM_TABLA_PDF = 7
+
+
+def pdf_reporte_mensual(salida: BinaryIO, lotes: Iterable[Union[List[Licencia], pd.DataFrame]], primer_dia: dt.date,
+                        ultimo_dia: dt.date, totales: Dict[str, int],
+                        avance: Optional[Callable[[int], None]] = None) -> int:
+    """Escribe en `salida` el reporte mensual en PDF: título, período, totales y la tabla coloreada.
+
+    Las filas llegan en lotes (ver db.lotes_del_mes) y cada página se escribe apenas
+    se llena, así que la memoria no depende de la cantidad de licencias. Un lote
+    también puede ser una tabla ya armada con to_df (ver cierres). `totales` es el
+    dict de db.resumen_mensual. Devuelve la cantidad de páginas.
+    """
+    from licencias.pdf import DocumentoPDF, ancho_texto, color_hex, recortar  # solo hace falta al armar un PDF
+
+    doc = DocumentoPDF(salida)
+    x_tabla = _MARGEN_PDF
+    ancho_util = doc.ancho - 2 * _MARGEN_PDF
+    peso_total = sum(_PESOS_COLUMNAS_PDF.values())
+    anchos = {c: ancho_util * _PESOS_COLUMNAS_PDF[c] / peso_total for c in COLUMNAS_ORDEN}
+    limite = doc.alto - _MARGEN_PDF - 10
+    verde, gris, gris_claro = color_hex("#d4edda"), color_hex("#e0e0e0"), color_hex("#f5f5f5")
+
+    def pagina_nueva() -> float:
+        doc.nueva_pagina()
+        doc.texto_centrado(doc.alto - 15, f"Página {doc.paginas}", tam=7)
+        return _MARGEN_PDF
+
+    def encabezado_tabla(y: float) -> float:
+        x = x_tabla
+        for col in COLUMNAS_ORDEN:
+            doc.rectangulo(x, y, anchos[col], _ALTO_FILA_PDF + 3, relleno=gris)
+            titulo = recortar(COLUMNAS_LEGIBLES[col], anchos[col] - 4, _TAM_TABLA_PDF, negrita=True)
+            doc.texto(x + 2, y + 11, titulo, tam=_TAM_TABLA_PDF, negrita=True)
+            x += anchos[col]
+        return y + _ALTO_FILA_PDF + 3
+
+    # Primera página: título, período y bloque de totales
+    y = pagina_nueva()
+    total = totales["total"]
+    doc.texto_centrado(y + 12, "Reporte de Licencias - Secretaría Escolar Mendoza", tam=16, negrita=True)
+    doc.texto_centrado(y + 32, f"Período: {primer_dia:%d/%m/%Y} – {ultimo_dia:%d/%m/%Y}", tam=12)
+    y += 44
+    doc.rectangulo(x_tabla, y, ancho_util, 26, relleno=gris_claro, borde=color_hex("#dddddd"))
+    metricas = [f"Total: {total}"]
+    if total:
+        metricas += [
+            f"Cargadas: {totales['cargadas']} ({totales['cargadas'] / total * 100:.0f}%)",
+            f"Pendientes: {totales['pendientes']} ({totales['pendientes'] / total * 100:.0f}%)",
+            f"Docentes: {totales['docentes']} | Celadores: {totales['celadores']}",
+        ]
+    ancho_metrica = ancho_util / len(metricas)
+    for i, metrica in enumerate(metricas):
+        x = x_tabla + ancho_metrica * i + (ancho_metrica - ancho_texto(metrica, 10)) / 2
+        doc.texto(x, y + 17, metrica, tam=10)
+    y += 40
+
+    if not total:
+        doc.texto(x_tabla, y + 10, "No hay datos", tam=10)
+        doc.cerrar()
+        return doc.paginas
+
+    y = encabezado_tabla(y)
+    escritas = 0
+    for lote in lotes:
+        tabla = lote if isinstance(lote, pd.DataFrame) else to_df(lote)
+        for fila in tabla.to_dict("records"):
+            if y + _ALTO_FILA_PDF > limite:
+                y = encabezado_tabla(pagina_nueva())
+            es_cargada = fila.get("estado_carga") == "Cargada" and fila.get("fecha_carga_gei") not in (None, "")
+            x = x_tabla
+            for col in COLUMNAS_ORDEN:
+                doc.rectangulo(x, y, anchos[col], _ALTO_FILA_PDF, relleno=verde if es_cargada else None,
+                               borde=(0, 0, 0))
+                valor = fila.get(col)
+                texto = "" if valor is None or (isinstance(valor, float) and pd.isna(valor)) else str(valor)
+                doc.texto(x + 2, y + 9.5, recortar(texto, anchos[col] - 4, _TAM_TABLA_PDF), tam=_TAM_TABLA_PDF)
+                x += anchos[col]
+            y += _ALTO_FILA_PDF
+        escritas += len(lote)
+        if avance:
+            avance(min(90, 10 + int(80 * escritas / total)))
+    doc.cerrar()
+    return doc.paginas
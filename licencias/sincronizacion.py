@@ -0,0 +1,326 @@
+"""Sincronización diferencial entre la base de una escuela y su copia en el distrito.
+
+La escuela exporta solo las licencias dadas de alta o modificadas (columna
+`modificada`) y las bajas (tabla `bajalicencia`) posteriores a la última
+exportación, en un archivo JSON Lines comprimido con gzip. El distrito lo aplica
+sobre la base de esa escuela en el servidor (licencias.escuelas), con los mismos ids.
+
+Aplicar es idempotente y no depende del orden de los archivos: de cada licencia
+gana el dato más reciente (`modificada` de la fila o fecha de la baja), así que
+aplicar dos veces el mismo archivo, o uno viejo después de uno nuevo, no cambia
+nada. Por eso cada exportación puede repetir sin riesgo los cambios de los
+últimos MARGEN antes de la marca: cubre las escrituras que tomaron la hora antes
+de la exportación anterior pero se confirmaron después.
+
+Sin la app (dos archivos SQLite, sin red):
+    LICENCIAS_DATA_DIR=<escuela> python -m licencias.sincronizacion exportar cambios.jsonl.gz <codigo> [--completo]
+    LICENCIAS_DATA_DIR=<distrito> python -m licencias.sincronizacion aplicar cambios.jsonl.gz
+"""
+import datetime as dt
+import gzip
+import json
+import sys
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlmodel import select
+
+from licencias import db
+from licencias.db import (
+    CAMPOS_ALERTAS,
+    CAMPOS_DIAS,
+    CAMPOS_HISTORIAL,
+    BajaLicencia,
+    CambioLicencia,
+    Licencia,
+    MarcaSincronizacion,
+    columnas_busqueda,
+    get_engine,
+    get_engine_lectura,
+    serializar_cambios,
+)
+from licencias.dias import actualizar_dias, reconstruir_dias
+from licencias.escuelas import DIR_ESCUELAS, engines, ruta_escuela
+from licencias.mantenimiento import optimizar
+from licencias.solapamientos import revisar_licencia, revisar_todo
+
+FORMATO = "licencias-cambios"
+VERSION_FORMATO = 1
+# Cambios anteriores a la marca que se vuelven a mandar en cada exportación
+MARGEN = dt.timedelta(minutes=5)
+FILAS_POR_LOTE = 1000
+# Con más licencias afectadas, las alertas y los días se recalculan completos en lugar de uno por uno
+MAX_REVISION_INDIVIDUAL = 500
+
+CLAVE_EXPORTACION = "exportacion"
+CLAVE_RECEPCION = "recepcion"
+
+COLUMNAS = ["id", *CAMPOS_HISTORIAL, "version", "modificada"]
+_CAMPOS_FECHA = {"fecha_inicio", "fecha_fin", "fecha_carga_gei"}
+_CAMPOS_FECHA_HORA = {"fecha_creacion", "modificada"}
+
+
+def _linea(objeto: dict) -> bytes:
+    return json.dumps(objeto, ensure_ascii=False, separators=(",", ":"),
+                      default=lambda v: v.isoformat()).encode("utf-8") + b"\n"
+
+
+def _decodificar(campos: List[str], valores: list) -> dict:
+    fila = dict(zip(campos, valores))
+    for campo, valor in fila.items():
+        if valor is None:
+            continue
+        if campo in _CAMPOS_FECHA:
+            fila[campo] = dt.date.fromisoformat(valor)
+        elif campo in _CAMPOS_FECHA_HORA:
+            fila[campo] = dt.datetime.fromisoformat(valor)
+    return fila
+
+
+def leer_marca(clave: str) -> Optional[dt.datetime]:
+    with get_engine().connect() as conn:
+        return conn.execute(select(MarcaSincronizacion.marca).where(MarcaSincronizacion.clave == clave)).scalar()
+
+
+def _guardar_marca(conn, clave: str, marca: dt.datetime):
+    """Guarda la marca de `clave` si es posterior a la que había."""
+    q = insert_sqlite(MarcaSincronizacion).values(clave=clave, marca=marca, actualizada=dt.datetime.now())
+    conn.execute(q.on_conflict_do_update(
+        index_elements=[MarcaSincronizacion.clave],
+        set_={"marca": q.excluded.marca, "actualizada": q.excluded.actualizada},
+        where=MarcaSincronizacion.marca < q.excluded.marca,
+    ))
+
+
+# ---------- Escuela ----------
+def exportar_cambios(salida: BinaryIO, origen: str, completo: bool = False) -> dict:
+    """Escribe en `salida` las licencias y bajas posteriores a la última exportación y avanza la marca.
+
+    `origen` es el código de la escuela en el distrito. Con `completo` se exporta
+    todo (primer envío, o si se perdió un archivo). Devuelve {"licencias", "bajas",
+    "desde", "hasta"}.
+    """
+    ruta_escuela(origen)  # valida el código
+    with get_engine().begin() as conn:
+        # Filas de cargas masivas que no pasaron por crear_licencia: cuentan como modificadas ahora
+        conn.execute(update(Licencia).where(Licencia.modificada.is_(None)).values(modificada=dt.datetime.now()))
+
+    anterior = None if completo else leer_marca(CLAVE_EXPORTACION)
+    desde = anterior - MARGEN if anterior else None
+    q_licencias = select(*[getattr(Licencia, c) for c in COLUMNAS]).order_by(Licencia.modificada)
+    q_bajas = select(BajaLicencia.licencia_id, BajaLicencia.version, BajaLicencia.fecha)
+    if desde is not None:
+        q_licencias = q_licencias.where(Licencia.modificada > desde)
+        q_bajas = q_bajas.where(BajaLicencia.fecha > desde)
+
+    resumen = {"licencias": 0, "bajas": 0, "desde": desde, "hasta": anterior}
+    with gzip.GzipFile(fileobj=salida, mode="wb") as archivo, get_engine_lectura().connect() as conn:
+        archivo.write(_linea({"formato": FORMATO, "version": VERSION_FORMATO, "origen": origen, "desde": desde,
+                              "generado": dt.datetime.now(), "columnas": COLUMNAS}))
+        resultado = conn.execution_options(yield_per=FILAS_POR_LOTE).execute(q_licencias)
+        for lote in resultado.partitions(FILAS_POR_LOTE):
+            for fila in lote:
+                archivo.write(_linea({"licencia": list(fila)}))
+            resumen["licencias"] += len(lote)
+            resumen["hasta"] = max(resumen["hasta"] or lote[-1].modificada, lote[-1].modificada)
+        for licencia_id, version, fecha in conn.execute(q_bajas):
+            archivo.write(_linea({"baja": [licencia_id, version, fecha]}))
+            resumen["bajas"] += 1
+            resumen["hasta"] = max(resumen["hasta"] or fecha, fecha)
+        archivo.write(_linea({"fin": {"licencias": resumen["licencias"], "bajas": resumen["bajas"],
+                                      "hasta": resumen["hasta"]}}))
+
+    if resumen["hasta"] is not None:
+        with get_engine().begin() as conn:
+            _guardar_marca(conn, CLAVE_EXPORTACION, resumen["hasta"])
+    return resumen
+
+
+# ---------- Distrito ----------
+def _leer(entrada: BinaryIO) -> Iterator[dict]:
+    try:
+        with gzip.GzipFile(fileobj=entrada, mode="rb") as archivo:
+            for linea in archivo:
+                yield json.loads(linea)
+    except (OSError, EOFError, ValueError) as e:
+        raise ValueError(f"El archivo de cambios está dañado: {e}") from e
+
+
+def _validar_cabecera(cabecera) -> dict:
+    if not isinstance(cabecera, dict) or cabecera.get("formato") != FORMATO:
+        raise ValueError("No es un archivo de cambios de licencias")
+    if cabecera.get("version") != VERSION_FORMATO:
+        raise ValueError(f"Versión de archivo no soportada: {cabecera.get('version')}")
+    faltan = set(COLUMNAS) - set(cabecera.get("columnas", []))
+    if faltan:
+        raise ValueError(f"Faltan columnas en el archivo: {', '.join(sorted(faltan))}")
+    return cabecera
+
+
+def leer_cabecera(entrada: BinaryIO) -> dict:
+    """Primera línea del archivo (formato, origen, columnas). Lanza ValueError si no es un archivo de cambios."""
+    return _validar_cabecera(next(_leer(entrada), None))
+
+
+def _aplicar_licencias(conn, filas: List[dict], resumen: dict, afectadas: Dict[int, Optional[set]]):
+    """Inserta o actualiza las filas más nuevas que lo que hay (y que su baja, si la hay)."""
+    ids = [f["id"] for f in filas]
+    actuales = {f.id: f._mapping for f in conn.execute(
+        select(*[getattr(Licencia, c) for c in COLUMNAS]).where(Licencia.id.in_(ids)))}
+    bajas = dict(conn.execute(
+        select(BajaLicencia.licencia_id, BajaLicencia.fecha).where(BajaLicencia.licencia_id.in_(ids))).all())
+
+    nuevas, modificadas, historial = [], [], []
+    ahora = dt.datetime.now()
+    for fila in filas:
+        id_, modificada = fila["id"], fila["modificada"]
+        actual = actuales.get(id_)
+        if id_ in bajas and bajas[id_] >= modificada:
+            resumen["sin_cambios"] += 1
+        elif actual is None:
+            nuevas.append(fila | columnas_busqueda(fila))
+            historial.append({"licencia_id": id_, "fecha": ahora, "operacion": "alta",
+                              "cambios": serializar_cambios({c: fila[c] for c in CAMPOS_HISTORIAL})})
+            afectadas[id_] = None
+        elif (actual["modificada"] or dt.datetime.min) < modificada:
+            cambios = {c: fila[c] for c in CAMPOS_HISTORIAL if fila[c] != actual[c]}
+            modificadas.append({f"nuevo_{c}": v for c, v in (fila | columnas_busqueda(fila)).items() if c != "id"}
+                               | {"id_": id_})
+            if cambios:
+                historial.append({"licencia_id": id_, "fecha": ahora, "operacion": "modificacion",
+                                  "cambios": serializar_cambios(cambios)})
+            afectadas[id_] = set(cambios)
+        else:
+            resumen["sin_cambios"] += 1
+
+    if nuevas:
+        conn.execute(insert(Licencia), nuevas)
+    if modificadas:
+        columnas = [c for c in modificadas[0] if c != "id_"]
+        conn.execute(
+            update(Licencia).where(Licencia.id == bindparam("id_"))
+            .values({c.removeprefix("nuevo_"): bindparam(c) for c in columnas}),
+            modificadas,
+        )
+    if historial:
+        conn.execute(insert(CambioLicencia), historial)
+    resumen["altas"] += len(nuevas)
+    resumen["modificaciones"] += len(modificadas)
+
+
+def _aplicar_bajas(conn, bajas: List[list], resumen: dict, afectadas: Dict[int, Optional[set]]):
+    """Registra cada baja y borra la licencia si no se modificó después."""
+    for licencia_id, version, fecha in bajas:
+        fecha = dt.datetime.fromisoformat(fecha)
+        anterior = conn.execute(select(BajaLicencia.fecha).where(BajaLicencia.licencia_id == licencia_id)).scalar()
+        if anterior is not None and anterior >= fecha:
+            resumen["sin_cambios"] += 1
+            continue
+        q = insert_sqlite(BajaLicencia).values(licencia_id=licencia_id, version=version, fecha=fecha)
+        conn.execute(q.on_conflict_do_update(
+            index_elements=[BajaLicencia.licencia_id],
+            set_={"version": q.excluded.version, "fecha": q.excluded.fecha},
+        ))
+        lic = conn.execute(
+            select(*[getattr(Licencia, c) for c in CAMPOS_HISTORIAL], Licencia.modificada)
+            .where(Licencia.id == licencia_id)
+        ).first()
+        if lic is None or (lic.modificada or dt.datetime.min) > fecha:
+            resumen["sin_cambios"] += 1
+            continue
+        conn.execute(delete(Licencia).where(Licencia.id == licencia_id))
+        conn.execute(insert(CambioLicencia).values(
+            licencia_id=licencia_id, fecha=dt.datetime.now(), operacion="baja",
+            cambios=serializar_cambios({c: lic._mapping[c] for c in CAMPOS_HISTORIAL}),
+        ))
+        resumen["bajas"] += 1
+        afectadas[licencia_id] = None
+
+
+def _actualizar_derivadas(afectadas: Dict[int, Optional[set]]):
+    """Alertas y días acumulados de las licencias que cambiaron (como db._al_escribir).
+
+    `afectadas` va de id a columnas modificadas (None en altas y bajas).
+    """
+    for campos_derivados, una, todas in ((CAMPOS_ALERTAS, revisar_licencia, revisar_todo),
+                                         (CAMPOS_DIAS, actualizar_dias, reconstruir_dias)):
+        ids = [id_ for id_, campos in afectadas.items() if campos is None or campos_derivados & campos]
+        if len(ids) > MAX_REVISION_INDIVIDUAL:
+            todas()
+            continue
+        for id_ in ids:
+            una(id_)
+
+
+def aplicar_cambios(entrada: BinaryIO) -> dict:
+    """Aplica un archivo de exportar_cambios sobre la base actual (get_engine()).
+
+    Todo el archivo se aplica en una transacción: si está dañado o incompleto
+    (falta la línea final) lanza ValueError y no se aplica nada. Devuelve
+    {"origen", "altas", "modificaciones", "bajas", "sin_cambios", "hasta"}.
+    """
+    lineas = _leer(entrada)
+    cabecera = _validar_cabecera(next(lineas, None))
+    campos = cabecera["columnas"]
+
+    resumen = {"origen": cabecera["origen"], "altas": 0, "modificaciones": 0, "bajas": 0, "sin_cambios": 0,
+               "hasta": None}
+    afectadas: Dict[int, Optional[set]] = {}
+    licencias, bajas, fin = [], [], None
+    with get_engine().begin() as conn:
+        for linea in lineas:
+            if "licencia" in linea:
+                fila = _decodificar(campos, linea["licencia"])
+                licencias.append({c: fila[c] for c in COLUMNAS})
+                if len(licencias) >= FILAS_POR_LOTE:
+                    _aplicar_licencias(conn, licencias, resumen, afectadas)
+                    licencias = []
+            elif "baja" in linea:
+                bajas.append(linea["baja"])
+            elif "fin" in linea:
+                fin = linea["fin"]
+        if fin is None:
+            raise ValueError("El archivo de cambios está incompleto")
+        if licencias:
+            _aplicar_licencias(conn, licencias, resumen, afectadas)
+        _aplicar_bajas(conn, bajas, resumen, afectadas)
+        if fin["hasta"]:
+            resumen["hasta"] = dt.datetime.fromisoformat(fin["hasta"])
+            _guardar_marca(conn, CLAVE_RECEPCION, resumen["hasta"])
+
+    _actualizar_derivadas(afectadas)
+    if len(afectadas) > MAX_REVISION_INDIVIDUAL:
+        # Muchas filas nuevas o borradas: las estadísticas de los índices quedaron viejas
+        optimizar(completo=True)
+    return resumen
+
+
+def aplicar_en_escuela(entrada: BinaryIO) -> dict:
+    """Aplica el archivo sobre la base de su escuela en este servidor (la crea si todavía no existe)."""
+    origen = leer_cabecera(entrada)["origen"]
+    entrada.seek(0)
+    ruta_escuela(origen)
+    DIR_ESCUELAS.mkdir(parents=True, exist_ok=True)
+    with db.usando_engine(engines.obtener(origen, crear=True)):
+        return aplicar_cambios(entrada)
+
+
+def main(argv: List[str]):
+    if len(argv) >= 3 and argv[0] == "exportar":
+        db.init_db()
+        with open(argv[1], "wb") as salida:
+            resumen = exportar_cambios(salida, argv[2], completo="--completo" in argv)
+        print(f"{resumen['licencias']} licencias y {resumen['bajas']} bajas hasta {resumen['hasta']}")
+    elif len(argv) == 2 and argv[0] == "aplicar":
+        with open(argv[1], "rb") as entrada:
+            resumen = aplicar_en_escuela(entrada)
+        print(f"{resumen['origen']}: {resumen['altas']} altas, {resumen['modificaciones']} modificaciones, "
+              f"{resumen['bajas']} bajas, {resumen['sin_cambios']} sin cambios")
+    else:
+        print(__doc__)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,182 @@
+"""Detección de licencias superpuestas y de posibles duplicados.
+
+- Superposición: dos licencias del mismo DNI cuyos intervalos [fecha_inicio, fecha_fin]
+  se tocan. Una licencia sin fecha de fin se considera abierta.
+- Posible duplicado: mismo apellido y nombre normalizados (sin acentos ni mayúsculas)
+  y mismas fechas, aunque cambie el DNI o el código OSEP.
+
+Los pares encontrados se guardan en la tabla `alertalicencia`. La revisión es
+incremental en cada alta, modificación o baja (revisar_licencia, que llama
+licencias.db) y completa con revisar_todo(), que hace dos barridos en orden
+(por (dni, fecha_inicio) y por fecha_inicio) sin cargar la tabla entera en memoria.
+"""
+import datetime as dt
+import heapq
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, or_
+from sqlmodel import select
+
+from licencias.db import AlertaLicencia, Licencia, get_engine, mostrar_error, normalizar_texto
+
+# Fin que se usa para las licencias sin fecha de fin
+FIN_ABIERTO = dt.date.max
+FILAS_POR_LOTE = 5000
+
+Par = Tuple[int, int]
+
+
+def normalizar_nombre(apellido: Optional[str], nombre: Optional[str]) -> str:
+    """'Núñez ', 'josé  luis' -> 'nunez|jose luis'."""
+    return f"{normalizar_texto(apellido)}|{normalizar_texto(nombre)}"
+
+
+def _par(a: int, b: int) -> Par:
+    return (a, b) if a < b else (b, a)
+
+
+def barrer_solapamientos(filas: Iterable[Tuple[int, str, dt.date, Optional[dt.date]]]) -> Iterator[Tuple[Par, str]]:
+    """Recorre filas (id, dni, fecha_inicio, fecha_fin) ordenadas por (dni, fecha_inicio) y
+    devuelve cada par superpuesto con su DNI.
+
+    Por DNI se mantiene un heap con las licencias todavía abiertas (por fecha de fin):
+    al llegar una nueva, se descartan las que terminaron antes de su inicio y las que
+    quedan se superponen con ella.
+    """
+    dni_actual, activas = None, []
+    for id_, dni, inicio, fin in filas:
+        if not dni:
+            continue
+        if dni != dni_actual:
+            dni_actual, activas = dni, []
+        while activas and activas[0][0] < inicio:
+            heapq.heappop(activas)
+        for _, otra in activas:
+            yield _par(id_, otra), dni
+        heapq.heappush(activas, (fin or FIN_ABIERTO, id_))
+
+
+def _barrer_duplicados(filas: Iterable[Tuple[int, str, str, dt.date, Optional[dt.date]]]) -> Iterator[Par]:
+    """Recorre filas (id, apellido, nombre, fecha_inicio, fecha_fin) ordenadas por fecha_inicio.
+
+    Solo hace falta recordar las licencias del mismo día de inicio.
+    """
+    inicio_actual, vistas = None, {}
+    for id_, apellido, nombre, inicio, fin in filas:
+        if inicio != inicio_actual:
+            inicio_actual, vistas = inicio, {}
+        iguales = vistas.setdefault((normalizar_nombre(apellido, nombre), fin), [])
+        for otra in iguales:
+            yield _par(otra, id_)
+        iguales.append(id_)
+
+
+def _en_lotes(resultado) -> Iterator[tuple]:
+    for lote in resultado.partitions(FILAS_POR_LOTE):
+        yield from lote
+
+
+def _guardar(conn, duplicados: Set[Par], solapamientos: Dict[Par, str]):
+    filas = [{"tipo": "duplicado", "licencia_id": a, "otra_id": b} for a, b in duplicados]
+    filas += [{"tipo": "solapamiento", "licencia_id": a, "otra_id": b, "dni": dni}
+              for (a, b), dni in solapamientos.items() if (a, b) not in duplicados]
+    if filas:
+        ahora = dt.datetime.now()
+        conn.execute(insert(AlertaLicencia), [dict(f, detectada=ahora) for f in filas])
+    return len(filas)
+
+
+def revisar_todo() -> Dict[str, int]:
+    """Recalcula todas las alertas de la base. Devuelve cuántas hay de cada tipo."""
+    with get_engine().begin() as conn:
+        resultado = conn.execution_options(yield_per=FILAS_POR_LOTE).execute(
+            select(Licencia.id, Licencia.apellido, Licencia.nombre, Licencia.fecha_inicio, Licencia.fecha_fin)
+            .order_by(Licencia.fecha_inicio)
+        )
+        duplicados = set(_barrer_duplicados(_en_lotes(resultado)))
+
+        resultado = conn.execution_options(yield_per=FILAS_POR_LOTE).execute(
+            select(Licencia.id, Licencia.dni, Licencia.fecha_inicio, Licencia.fecha_fin)
+            .order_by(Licencia.dni, Licencia.fecha_inicio)
+        )
+        solapamientos = dict(barrer_solapamientos(_en_lotes(resultado)))
+
+        conn.execute(delete(AlertaLicencia))
+        _guardar(conn, duplicados, solapamientos)
+    return {
+        "duplicados": len(duplicados),
+        "solapamientos": len(set(solapamientos) - duplicados),
+    }
+
+
+def revisar_licencia(id_: int) -> int:
+    """Recalcula las alertas en las que participa una licencia (o las borra si ya no existe).
+
+    Usa los índices (dni, fecha_inicio) y (fecha_inicio): solo lee las licencias de
+    la misma persona que empiezan antes de que termine esta, y las del mismo día de
+    inicio. Devuelve la cantidad de alertas de la licencia.
+    """
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(delete(AlertaLicencia).where(
+                or_(AlertaLicencia.licencia_id == id_, AlertaLicencia.otra_id == id_)))
+            lic = conn.execute(
+                select(Licencia.apellido, Licencia.nombre, Licencia.dni, Licencia.fecha_inicio, Licencia.fecha_fin)
+                .where(Licencia.id == id_)
+            ).first()
+            if lic is None:
+                return 0
+            apellido, nombre, dni, inicio, fin = lic
+
+            clave = normalizar_nombre(apellido, nombre)
+            mismo_dia = conn.execute(
+                select(Licencia.id, Licencia.apellido, Licencia.nombre, Licencia.fecha_fin)
+                .where(Licencia.fecha_inicio == inicio, Licencia.id != id_)
+            )
+            duplicados = {_par(id_, otra) for otra, ap, nom, otra_fin in mismo_dia
+                          if otra_fin == fin and normalizar_nombre(ap, nom) == clave}
+
+            solapamientos = {}
+            if dni:
+                misma_persona = conn.execute(
+                    select(Licencia.id, Licencia.fecha_fin)
+                    .where(Licencia.dni == dni, Licencia.fecha_inicio <= (fin or FIN_ABIERTO), Licencia.id != id_)
+                )
+                solapamientos = {_par(id_, otra): dni for otra, otra_fin in misma_persona
+                                 if (otra_fin or FIN_ABIERTO) >= inicio}
+            return _guardar(conn, duplicados, solapamientos)
+    except Exception as e:
+        mostrar_error(f"Error revisando superposiciones: {e}")
+        return 0
+
+
+def alertas_de(id_: int) -> List[AlertaLicencia]:
+    """Alertas en las que participa una licencia."""
+    with get_engine().connect() as conn:
+        filas = conn.execute(
+            select(AlertaLicencia)
+            .where(or_(AlertaLicencia.licencia_id == id_, AlertaLicencia.otra_id == id_))
+            .order_by(AlertaLicencia.tipo, AlertaLicencia.licencia_id, AlertaLicencia.otra_id)
+        ).all()
+    return [AlertaLicencia(**f._mapping) for f in filas]
+
+
+def listar_alertas(limite: Optional[int] = None) -> List[dict]:
+    """Alertas de toda la base, con apellido, nombre y fechas de ambas licencias."""
+    a, b = Licencia.__table__.alias("a"), Licencia.__table__.alias("b")
+    q = (
+        select(
+            AlertaLicencia.tipo, AlertaLicencia.dni,
+            a.c.id.label("id_1"), a.c.apellido, a.c.nombre, a.c.fecha_inicio.label("inicio_1"),
+            a.c.fecha_fin.label("fin_1"),
+            b.c.id.label("id_2"), b.c.dni.label("dni_2"), b.c.fecha_inicio.label("inicio_2"),
+            b.c.fecha_fin.label("fin_2"),
+        )
+        .join(a, a.c.id == AlertaLicencia.licencia_id)
+        .join(b, b.c.id == AlertaLicencia.otra_id)
+        .order_by(AlertaLicencia.tipo, a.c.apellido, a.c.nombre, a.c.fecha_inicio)
+    )
+    if limite is not None:
+        q = q.limit(limite)
+    with get_engine().connect() as conn:
+        return [dict(f._mapping) for f in conn.execute(q)]
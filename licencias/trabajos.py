@@ -0,0 +1,306 @@
+"""Cola local de trabajos en segundo plano para las exportaciones pesadas (CSV, Excel, PDF, vista de impresión).
+
+Cada pedido queda registrado en la tabla `trabajo` de la base de la escuela y se
+ejecuta en un pool de hilos del servidor, así la sesión que lo pidió sigue
+respondiendo. El archivo resultante se guarda en disco con un nombre derivado de
+(tipo, parámetros, versión de datos): un pedido idéntico reutiliza el archivo ya
+generado, aunque lo haya pedido otra sesión o el servidor se haya reiniciado.
+"""
+import datetime as dt
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlmodel import SQLModel, Field, Session, select
+
+from licencias import metricas
+from licencias.cierres import Cierre, leer_cierre
+from licencias.db import (
+    buscar_licencias,
+    get_data_path,
+    get_engine,
+    licencias_del_mes,
+    lotes_busqueda,
+    lotes_del_mes,
+    rango_mes,
+    resumen_mensual,
+    usando_engine,
+    version_datos,
+)
+from licencias.reportes import (
+    conteos,
+    escribir_csv,
+    generar_excel,
+    hojas_reporte_mensual,
+    html_reporte_mensual,
+    pdf_reporte_mensual,
+    to_df,
+)
+
+DIR_EXPORTACIONES = get_data_path() / "exportaciones"
+DIAS_EXPORTACIONES = 7
+HILOS_TRABAJOS = 2
+
+ESTADOS_TRABAJO = ["Pendiente", "En curso", "Terminado", "Error"]
+MSG_INTERRUMPIDO = "El trabajo se interrumpió (se reinició el servidor). Volvé a generarlo."
+
+
+class Trabajo(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    tipo: str
+    clave: str = Field(index=True)
+    parametros: str = "{}"
+    estado: str = "Pendiente"
+    progreso: int = 0
+    archivo: Optional[str] = None
+    error: Optional[str] = None
+    creado: dt.datetime = Field(default_factory=dt.datetime.now)
+    terminado: Optional[dt.datetime] = None
+
+
+# ---------- Tipos de trabajo ----------
+# Cada función recibe los parámetros (ya decodificados del JSON), una función
+# avance(porcentaje) y el archivo binario donde escribir el resultado.
+def _fecha(valor: Optional[str]) -> Optional[dt.date]:
+    return dt.date.fromisoformat(valor) if valor else None
+
+
+def _filtros(p: dict) -> dict:
+    return dict(
+        apellido=p.get("apellido", ""),
+        nombre=p.get("nombre", ""),
+        rol=p.get("rol"),
+        estado=p.get("estado"),
+        estado_doc=p.get("estado_doc"),
+        f_ini=_fecha(p.get("f_ini")),
+        f_fin=_fecha(p.get("f_fin")),
+        articulo=p.get("articulo", ""),
+        dni=p.get("dni", ""),
+    )
+
+
+def _excel_listado(p: dict, avance: Callable[[int], None], salida: BinaryIO):
+    rows = buscar_licencias(**_filtros(p))
+    avance(30)
+    df = to_df(rows)
+    avance(50)
+    salida.write(generar_excel({'Licencias': df}))
+
+
+def _csv_listado(p: dict, avance: Callable[[int], None], salida: BinaryIO):
+    escribir_csv(salida, lotes_busqueda(**_filtros(p)))
+
+
+def _cierre(p: dict) -> Optional[Cierre]:
+    """El cierre con el que se pidió el reporte (parámetro "cierre": su huella), o None si es en vivo."""
+    if not p.get("cierre"):
+        return None
+    cierre = leer_cierre(_fecha(p["mes"]))
+    if cierre is None or cierre.hash != p["cierre"]:
+        raise ValueError("El mes se reabrió o se volvió a cerrar: generá el reporte de nuevo")
+    return cierre
+
+
+def _excel_reporte(p: dict, avance: Callable[[int], None], salida: BinaryIO):
+    cierre = _cierre(p)
+    if cierre:
+        df_mes, totales = cierre.tabla, cierre.resumen
+    else:
+        rows = licencias_del_mes(_fecha(p["mes"]))
+        avance(30)
+        df_mes, totales = to_df(rows), conteos(rows)
+    avance(50)
+    salida.write(generar_excel(hojas_reporte_mensual(df_mes, totales)))
+
+
+def _impresion_reporte(p: dict, avance: Callable[[int], None], salida: BinaryIO):
+    cierre = _cierre(p)
+    if cierre:
+        salida.write(cierre.html.encode("utf-8"))
+        return
+    primer_dia, ultimo_dia = rango_mes(_fecha(p["mes"]))
+    rows = licencias_del_mes(primer_dia)
+    avance(30)
+    df_mes = to_df(rows)
+    avance(50)
+    salida.write(html_reporte_mensual(df_mes, primer_dia, ultimo_dia, conteos(rows)).encode("utf-8"))
+
+
+def _pdf_reporte(p: dict, avance: Callable[[int], None], salida: BinaryIO):
+    primer_dia, ultimo_dia = rango_mes(_fecha(p["mes"]))
+    cierre = _cierre(p)
+    if cierre:
+        totales, lotes = cierre.resumen, [cierre.tabla]
+    else:
+        totales, lotes = resumen_mensual(primer_dia), lotes_del_mes(primer_dia)
+    avance(10)
+    pdf_reporte_mensual(salida, lotes, primer_dia, ultimo_dia, totales, avance)
+
+
+TIPOS: Dict[str, Tuple[Callable[[dict, Callable[[int], None], BinaryIO], None], str]] = {
+    "excel_listado": (_excel_listado, ".xlsx"),
+    "csv_listado": (_csv_listado, ".csv"),
+    "excel_reporte": (_excel_reporte, ".xlsx"),
+    "impresion_reporte": (_impresion_reporte, ".html"),
+    "pdf_reporte": (_pdf_reporte, ".pdf"),
+}
+
+
+# ---------- Ejecución ----------
+_pool = ThreadPoolExecutor(max_workers=HILOS_TRABAJOS, thread_name_prefix="trabajo")
+_lock = threading.Lock()
+_en_ejecucion = set()  # (url de la base, id) de los trabajos encolados por este proceso
+# Pedidos resueltos con un trabajo o archivo existente y pedidos que generan uno nuevo
+_contadores = Counter()
+
+
+def _serializar(parametros: dict) -> str:
+    return json.dumps(parametros, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def clave_trabajo(tipo: str, parametros: dict) -> str:
+    """Hash de (base, tipo, parámetros, versión de datos): identifica el archivo resultante."""
+    contenido = json.dumps([str(get_engine().url), tipo, _serializar(parametros), version_datos()])
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()[:32]
+
+
+def _ruta(clave: str, tipo: str) -> Path:
+    return DIR_EXPORTACIONES / f"{clave}{TIPOS[tipo][1]}"
+
+
+def _actualizar(id_: int, **valores):
+    with Session(get_engine()) as s:
+        s.exec(update(Trabajo).where(Trabajo.id == id_).values(**valores))
+        s.commit()
+
+
+def _ejecutar(engine, id_: int):
+    marca = (str(engine.url), id_)
+    try:
+        with usando_engine(engine):
+            with Session(engine) as s:
+                trabajo = s.get(Trabajo, id_)
+            _actualizar(id_, estado="En curso", progreso=5)
+            funcion, _ = TIPOS[trabajo.tipo]
+            ruta = _ruta(trabajo.clave, trabajo.tipo)
+            temporal = ruta.with_suffix(f".{id_}.tmp")
+            inicio = time.perf_counter()
+            try:
+                DIR_EXPORTACIONES.mkdir(parents=True, exist_ok=True)
+                with open(temporal, "wb") as salida:
+                    funcion(json.loads(trabajo.parametros), lambda p: _actualizar(id_, progreso=p), salida)
+                os.replace(temporal, ruta)
+                _actualizar(id_, estado="Terminado", progreso=100, archivo=str(ruta), terminado=dt.datetime.now())
+                metricas.observar("licencias_exportacion_segundos", time.perf_counter() - inicio,
+                                  tipo=trabajo.tipo, resultado="terminado")
+                metricas.observar("licencias_exportacion_bytes", ruta.stat().st_size, tipo=trabajo.tipo)
+            except Exception as e:
+                temporal.unlink(missing_ok=True)
+                _actualizar(id_, estado="Error", error=str(e), terminado=dt.datetime.now())
+                metricas.observar("licencias_exportacion_segundos", time.perf_counter() - inicio,
+                                  tipo=trabajo.tipo, resultado="error")
+    finally:
+        with _lock:
+            _en_ejecucion.discard(marca)
+
+
+def enviar_trabajo(tipo: str, parametros: dict) -> Trabajo:
+    """Encola una exportación y devuelve su trabajo.
+
+    Si ya hay uno idéntico en curso se devuelve ese; si el archivo ya existe en disco,
+    el trabajo nace terminado sin volver a consultar.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    engine = get_engine()
+    clave = clave_trabajo(tipo, parametros)
+    ruta = _ruta(clave, tipo)
+
+    with Session(engine) as s:
+        q = select(Trabajo).where(Trabajo.clave == clave).order_by(Trabajo.id.desc())
+        existente = s.exec(q).first()
+        if existente is not None:
+            existente = _revisar(s, existente)
+            if existente.estado in ("Pendiente", "En curso"):
+                _contadores["reutilizadas"] += 1
+                return existente
+            if existente.estado == "Terminado" and Path(existente.archivo).exists():
+                _contadores["reutilizadas"] += 1
+                return existente
+
+        trabajo = Trabajo(tipo=tipo, clave=clave, parametros=_serializar(parametros))
+        if ruta.exists():
+            trabajo.estado, trabajo.progreso, trabajo.archivo = "Terminado", 100, str(ruta)
+            trabajo.terminado = dt.datetime.now()
+        s.add(trabajo)
+        s.flush()
+        if trabajo.estado == "Pendiente":
+            # Se anota antes del commit para que otra sesión no lo vea pendiente y sin hilo
+            with _lock:
+                _en_ejecucion.add((str(engine.url), trabajo.id))
+        s.commit()
+        s.refresh(trabajo)
+
+    _contadores["generadas" if trabajo.estado == "Pendiente" else "reutilizadas"] += 1
+    if trabajo.estado == "Pendiente":
+        _pool.submit(_ejecutar, engine, trabajo.id)
+    return trabajo
+
+
+def _revisar(s: Session, trabajo: Trabajo) -> Trabajo:
+    """Marca como error los trabajos pendientes que ningún hilo de este proceso va a terminar."""
+    if trabajo.estado in ("Pendiente", "En curso"):
+        with _lock:
+            vivo = (str(s.get_bind().url), trabajo.id) in _en_ejecucion
+        if not vivo:
+            trabajo.estado, trabajo.error = "Error", MSG_INTERRUMPIDO
+            s.add(trabajo)
+            s.commit()
+            s.refresh(trabajo)
+    return trabajo
+
+
+def obtener_trabajo(id_: int) -> Optional[Trabajo]:
+    with Session(get_engine()) as s:
+        trabajo = s.get(Trabajo, id_)
+        return _revisar(s, trabajo) if trabajo else None
+
+
+def archivo_resultado(trabajo: Trabajo) -> Optional[Path]:
+    """Ruta del archivo de un trabajo terminado, o None si ya no está en disco.
+
+    No lo lee: el contenido se carga recién cuando alguien lo descarga.
+    """
+    if trabajo.estado != "Terminado" or not trabajo.archivo:
+        return None
+    ruta = Path(trabajo.archivo)
+    return ruta if ruta.is_file() else None
+
+
+def estadisticas_trabajos() -> dict:
+    """Exportaciones pedidas desde que arrancó el proceso: resueltas con un archivo o trabajo existente, o generadas."""
+    return {"reutilizadas": _contadores["reutilizadas"], "generadas": _contadores["generadas"]}
+
+
+def limpiar_trabajos(dias: int = DIAS_EXPORTACIONES) -> int:
+    """Borra los archivos y registros de trabajos con más de `dias` días. Devuelve los archivos borrados."""
+    limite = dt.datetime.now() - dt.timedelta(days=dias)
+    borrados = 0
+    if DIR_EXPORTACIONES.exists():
+        for ruta in DIR_EXPORTACIONES.iterdir():
+            if dt.datetime.fromtimestamp(ruta.stat().st_mtime) < limite:
+                ruta.unlink(missing_ok=True)
+                borrados += 1
+    with Session(get_engine()) as s:
+        s.exec(delete(Trabajo).where(Trabajo.creado < limite))
+        s.commit()
+    return borrados
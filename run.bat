@@ -48,6 +48,9 @@ echo Para CERRAR la aplicacion: Presiona Ctrl+C en esta ventana
 echo ========================================
 echo.
 
+REM Convertir bases viejas a auto_vacuum incremental antes de atender (VACUUM bloquea la base)
+python -m licencias.mantenimiento --auto-vacuum --escuelas
+
 streamlit run app.py --server.headless true --server.port 8501 --server.address localhost
 
 if errorlevel 1 (
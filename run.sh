@@ -52,6 +52,9 @@ echo "Para CERRAR la aplicación: Presiona Ctrl+C"
 echo "========================================"
 echo ""
 
+# Convertir bases viejas a auto_vacuum incremental antes de atender (VACUUM bloquea la base)
+python -m licencias.mantenimiento --auto-vacuum --escuelas
+
 streamlit run app.py --server.headless true --server.port 8501 --server.address localhost
 
 if [ $? -ne 0 ]; then